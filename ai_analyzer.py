@@ -1,25 +1,110 @@
 # novel_crawler/ai_analyzer.py
 
+import os
 import re
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from config import get_chat_completion
+from html_parser import parse_html
+from dom_skeleton import skeleton_and_fingerprint
+from compiled_source import compile_book_source
+from link_classifier import chapter_candidates
+from utils import extract_toc
+from config import LLM_CANDIDATE_MODELS, LLM_CANDIDATE_TEMPERATURES, get_chat_completion
+from metrics import get_metrics
 from logger import logger
 
+# 已验证通过的 AI 规则，按目录页与章节页的结构指纹缓存
+AI_CACHE_DIR = os.path.join("cache", "ai")
+
+# 每轮并行请求的候选规则套数（--ai-candidates）
+_candidates = 1
+
+
+def configure_ai_candidates(count):
+    global _candidates
+    _candidates = max(1, count or 1)
+
+
+def get_ai_candidates():
+    return _candidates
+
+
+def candidate_variants(count):
+    """为 count 套候选分配 (模型, 温度)，轮流取 LLM_CANDIDATE_MODELS 与 LLM_CANDIDATE_TEMPERATURES。"""
+    return [
+        (
+            LLM_CANDIDATE_MODELS[i % len(LLM_CANDIDATE_MODELS)],
+            LLM_CANDIDATE_TEMPERATURES[i % len(LLM_CANDIDATE_TEMPERATURES)],
+        )
+        for i in range(count)
+    ]
+
+
+class CandidateResult:
+    """一套候选规则的验证结果。score 越大越好，失败的候选也有得分，用于挑选修正对象。"""
+
+    __slots__ = ("book_source", "chapters", "score", "error", "label")
+
+    def __init__(self, book_source, chapters=(), score=(0, 0, 0), error=None, label=""):
+        self.book_source = book_source
+        self.chapters = list(chapters)
+        self.score = score
+        self.error = error
+        self.label = label
+
+    @property
+    def ok(self):
+        return self.book_source is not None and self.error is None
+
+
+def validate_rules(book_source, toc_html, toc_url, chapter_html, chapter_like=frozenset()):
+    """
+    用已下载的目录页与章节页验证规则，不重新请求。
+    得分依次比较：提取到的章节中“像章节”的链接数（link_classifier）、混入的其他链接数（越少越好）、
+    正文字数，避免把页面上所有链接都选中的规则排在前面。
+    """
+    chapters = extract_toc(toc_html, toc_url, book_source)
+    if not chapters:
+        return CandidateResult(
+            book_source,
+            error=f"验证失败: 'ruleToc' ({book_source.get('ruleToc', {}).get('chapterList')}) 无法提取任何章节。",
+        )
+    matched = sum(1 for ch in chapters if ch["url"] in chapter_like)
+
+    content_chars = 0
+    if book_source.get("ruleContent", {}).get("content", ""):
+        rules = compile_book_source(book_source)
+        if rules.content_selector is not None:
+            content_el = parse_html(chapter_html).select_one(rules.content_selector)
+            if content_el:
+                content_chars = len(content_el.text(strip=True))
+    score = (matched, matched - len(chapters), content_chars)
+    if not content_chars:
+        return CandidateResult(
+            book_source, chapters, score,
+            error=f"验证失败: 'ruleContent' ({book_source.get('ruleContent', {}).get('content')}) 无法在样本页面提取到正文。",
+        )
+    return CandidateResult(book_source, chapters, score)
+
+
 class AIAnalyzer:
-    def __init__(self, model=None):
+    def __init__(self, model=None, use_cache=True):
         self.model = model
+        self.use_cache = use_cache
+        # 同一次运行中每个页面只清理、压缩一次（修正重试时复用）
+        self._prepared = {}
 
     def _clean_html_for_ai(self, html: str) -> str:
         """
         在将 HTML 发送给 AI 之前进行预清理，移除噪音标签。
         返回清理后的 HTML 字符串（保留 DOM 结构）。
         """
-        soup = BeautifulSoup(html, "html.parser")
+        doc = parse_html(html)
 
         # 移除所有噪音标签
-        for tag in soup(
+        doc.remove_tags(
             [
                 "script",
                 "style",
@@ -34,17 +119,54 @@ class AIAnalyzer:
                 ".header",  # 移除顶部导航
                 ".readPopup" # 移除弹窗
             ]
-        ):
-            tag.decompose()
+        )
 
         # --- 核心修复：返回 HTML 字符串，而不是 get_text() ---
-        body = soup.find("body")
+        body = doc.body()
         if body:
-            return str(body)  # 返回 body 的 HTML 结构
+            return body.html()  # 返回 body 的 HTML 结构
         else:
-            return str(soup)  # 回退到整个 soup 的 HTML 结构
+            return doc.html()  # 回退到整个文档的 HTML 结构
         # --- 修复结束 ---
 
+    def _prepare(self, html: str):
+        """返回 (发送给 AI 的 DOM 骨架, 结构指纹)，按页面内容缓存在实例中。"""
+        prepared = self._prepared.get(html)
+        if prepared is None:
+            cleaned = self._clean_html_for_ai(html)
+            prepared = self._prepared[html] = skeleton_and_fingerprint(cleaned)
+        return prepared
+
+    def _cache_path(self, toc_html: str, chapter_html: str) -> str:
+        key = hashlib.sha256(
+            (self._prepare(toc_html)[1] + self._prepare(chapter_html)[1]).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(AI_CACHE_DIR, f"{key}.json")
+
+    def cached_rules(self, toc_html: str, chapter_html: str, domain: str):
+        """查找结构相同的页面上已验证通过的规则；命中时改写为当前站点的书源名与地址。"""
+        if not self.use_cache:
+            return None
+        try:
+            with open(self._cache_path(toc_html, chapter_html), "r", encoding="utf-8") as f:
+                book_source = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        book_source["bookSourceName"] = f"{domain}（AI生成）"
+        book_source["bookSourceUrl"] = f"https://{domain}"
+        return book_source
+
+    def remember(self, toc_html: str, chapter_html: str, book_source: dict):
+        """保存验证通过的规则，供结构相同的页面直接复用。"""
+        if not self.use_cache:
+            return
+        os.makedirs(AI_CACHE_DIR, exist_ok=True)
+        path = self._cache_path(toc_html, chapter_html)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(book_source, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
     def analyze_selectors(
         self,
         toc_html: str,
@@ -52,20 +174,22 @@ class AIAnalyzer:
         domain: str,
         failed_rules: dict = None,
         last_error: str = None,
+        model: str = None,
+        temperature: float = 0.7,
     ) -> dict:
         """
         使用 HTML 分析结构。
         如果提供了 failed_rules 和 last_error，则进入“修正模式”。
+        总是请求 AI；规则缓存由 analyze_candidates 在发起请求前查找。
         """
 
-        # --- 核心修改：先清理 HTML ---
+        # 清理噪音并压缩为 DOM 骨架：重复的章节链接/段落折叠，长文本截断
         logger.info("🧪 正在为 AI 清理 HTML 噪音...")
-        cleaned_toc_html = self._clean_html_for_ai(toc_html)
-        cleaned_chapter_html = self._clean_html_for_ai(chapter_html)
+        cleaned_toc_html = self._prepare(toc_html)[0]
+        cleaned_chapter_html = self._prepare(chapter_html)[0]
 
-        # 定义截断长度（清理后的文本可以更长）
+        # 骨架通常只有几 KB，截断只作为兜底
         MAX_LENGTH = 15000
-        # --- 修改结束 ---
 
         if failed_rules and last_error:
             # “修正模式”的提示词
@@ -79,7 +203,8 @@ class AIAnalyzer:
 【失败原因】
 {last_error}
 
-请你参考失败原因，重新分析下面的【清理后的 HTML】，并只输出修正后的 JSON（不要加解释）：
+请你参考失败原因，重新分析下面的【清理后的 HTML】，并只输出修正后的 JSON（不要加解释）。
+HTML 已压缩为骨架：<!-- 省略 N 个相同结构 --> 表示省略了 N 个与前后相同结构的兄弟节点，过长的文字已截断。
 
 --------------------
 【目录页 HTML】
@@ -93,6 +218,7 @@ class AIAnalyzer:
             # “初次分析”的提示词
             prompt = f"""
 你是小说网站结构分析专家，以下是两个【清理后的 HTML】，请分析其结构，并输出阅读器书源配置。
+HTML 已压缩为骨架：<!-- 省略 N 个相同结构 --> 表示省略了 N 个与前后相同结构的兄弟节点，过长的文字已截断。
 
 - 📘 第一部分：目录页 HTML（包含章节列表）
 - 📄 第二部分：章节页 HTML（包含章节正文）
@@ -123,9 +249,12 @@ class AIAnalyzer:
 {cleaned_chapter_html[:MAX_LENGTH]}
             """
 
-        response_text = get_chat_completion(
-            messages=[{"role": "user", "content": prompt}], model=self.model
-        )
+        with get_metrics().timed("ai", domain):
+            response_text = get_chat_completion(
+                messages=[{"role": "user", "content": prompt}],
+                model=model or self.model,
+                temperature=temperature,
+            )
 
         try:
             match = re.search(r"```json\s*(\{.*\})\s*```", response_text, re.DOTALL)
@@ -148,4 +277,67 @@ class AIAnalyzer:
         except Exception as e:
             logger.error(f"❌ JSON解析失败: {e}")
             logger.error(f"原始AI响应: {response_text[:500]}...")
-            return None
\ No newline at end of file
+            return None
+
+    def analyze_candidates(
+        self,
+        toc_html: str,
+        chapter_html: str,
+        toc_url: str,
+        domain: str,
+        count: int = 1,
+        failed_rules: dict = None,
+        last_error: str = None,
+    ) -> list:
+        """
+        并行请求 count 套候选规则（按 candidate_variants 分配模型与温度），
+        每套返回后立即在线程中验证，返回按得分从高到低排列的 CandidateResult 列表。
+        初次分析命中规则缓存时只验证缓存的规则。
+        """
+        chapter_like = frozenset(c.url for c in chapter_candidates(toc_html, toc_url))
+
+        if not (failed_rules and last_error):
+            cached = self.cached_rules(toc_html, chapter_html, domain)
+            if cached:
+                logger.info("♻️ 命中 AI 规则缓存（页面结构相同），跳过 AI 调用")
+                result = validate_rules(cached, toc_html, toc_url, chapter_html, chapter_like)
+                if result.ok:
+                    result.label = "缓存"
+                    return [result]
+
+        # 先在主线程准备骨架，各线程共用
+        self._prepare(toc_html)
+        self._prepare(chapter_html)
+
+        def generate_and_validate(model, temperature):
+            label = f"{model or '默认模型'} @ {temperature}"
+            try:
+                book_source = self.analyze_selectors(
+                    toc_html, chapter_html, domain, failed_rules, last_error,
+                    model=model, temperature=temperature,
+                )
+            except Exception as e:
+                logger.warning(f"🧪 候选 {label} 请求失败: {e}")
+                return CandidateResult(None, error=f"AI 请求失败: {e}", label=label)
+            if not book_source:
+                return CandidateResult(None, error="AI 未能生成有效的 JSON", label=label)
+            result = validate_rules(book_source, toc_html, toc_url, chapter_html, chapter_like)
+            result.label = label
+            return result
+
+        # 实例上指定了模型时所有候选都用它，只改变温度
+        variants = [(self.model or m, t) for m, t in candidate_variants(count)]
+        results = []
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            futures = [pool.submit(generate_and_validate, m, t) for m, t in variants]
+            for future in as_completed(futures):
+                result = future.result()
+                if result.ok:
+                    logger.info(
+                        f"🕵️ 候选 {result.label} 验证通过（目录 {len(result.chapters)} 章，得分 {result.score}）"
+                    )
+                elif result.book_source is not None:
+                    logger.warning(f"🧪 候选 {result.label} {result.error}")
+                results.append(result)
+        results.sort(key=lambda r: (r.ok, r.book_source is not None, r.score), reverse=True)
+        return results
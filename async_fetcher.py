@@ -0,0 +1,239 @@
+# novel_crawler/async_fetcher.py
+import asyncio
+import time
+
+from logger import logger
+from rate_limiter import get_limiter, parse_retry_after
+from http_cache import CHAPTER_TTL, TOC_TTL, decode_body, get_cache
+from decoding import detect_encoding, sniff_encoding
+from compiled_source import compile_book_source
+from parse_pool import get_parse_pool
+from metrics import get_metrics
+from utils import (
+    DEFAULT_HEADERS, get_domain, extract_chapter_page, extract_toc_page, merge_sub_pages,
+    TocPages,
+    clean_worker, discard_cached, parse_page_worker,
+)
+
+aiohttp = None
+
+
+def _import_aiohttp():
+    """aiohttp 只在 async 引擎真正启动时导入（导入耗时约 0.2 秒）。"""
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError:
+            raise ImportError("❌ async 引擎需要 aiohttp，请先执行 pip install aiohttp") from None
+        aiohttp = module
+    return aiohttp
+
+
+class AsyncFetcher:
+    """
+    基于 aiohttp 的异步抓取引擎。
+    所有请求共用一个带 keep-alive 连接池的 ClientSession，
+    单进程即可同时保持数百个章节请求在途。
+    """
+
+    def __init__(self, limit=200, limit_per_host=0, timeout=15, keepalive_timeout=30):
+        _import_aiohttp()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=DEFAULT_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch_html(self, url, retries=3, cache_ttl=CHAPTER_TTL):
+        """与 utils.fetch_html 相同的缓存与条件请求语义。"""
+        page = await self._fetch(url, retries, cache_ttl, detect=True)
+        if page is None:
+            return None
+        return decode_body(*page)
+
+    async def fetch_raw(self, url, retries=3, cache_ttl=CHAPTER_TTL):
+        """与 utils.fetch_raw 相同：返回 (正文字节, 编码)，快速路径无法确定编码时为 None。"""
+        return await self._fetch(url, retries, cache_ttl, detect=False)
+
+    async def _fetch(self, url, retries, cache_ttl, detect):
+        domain = get_domain(url)
+        metrics = get_metrics()
+        cache = get_cache()
+        entry = cache.get(url) if cache else None
+        if entry and entry.is_fresh(cache_ttl):
+            body = entry.body()
+            if body is not None:
+                metrics.inc("cache_hit", domain)
+                return body, entry.meta.get("encoding")
+            entry = None
+
+        headers = entry.validators() if entry else None
+
+        limiter = get_limiter(domain)
+        for attempt in range(retries):
+            started = await limiter.acquire_async()
+            begin = time.perf_counter()  # 不计限速器排队时间
+            status = None
+            retry_after = None
+            ok = False
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    status = response.status
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if status == 304 and entry:
+                        ok = True
+                        metrics.inc("not_modified", domain)
+                        cache.refresh(entry, response.headers)
+                        body = entry.body()
+                        return (body, entry.meta.get("encoding")) if body is not None else None
+                    response.raise_for_status()
+                    body = await response.read()
+                    ok = True
+                    metrics.inc("bytes", domain, len(body))
+                    encoding = (detect_encoding if detect else sniff_encoding)(
+                        body, response.headers.get("Content-Type"), domain
+                    )
+                    if cache:
+                        cache.put(url, body, encoding, response.headers)
+                    return body, encoding
+            except Exception as e:
+                logger.warning(f"[retry {attempt + 1}] 请求失败: {e!r}")
+            finally:
+                limiter.release(started, status, retry_after)
+                metrics.observe("fetch", domain, time.perf_counter() - begin, ok)
+            if attempt + 1 < retries:
+                await asyncio.sleep(limiter.retry_delay(attempt))
+        logger.error(f"❌ 多次请求失败：{url}")
+        return None
+
+
+async def _async_load_page(fetcher, page_url, rules, detect_pages=False):
+    """utils._load_page 的异步版本：启用解析进程池时在子进程中解码与解析，正文匹配失败的页面从缓存中删除。"""
+    pool = get_parse_pool()
+    if pool is None:
+        html = await fetcher.fetch_html(page_url)
+        if not html:
+            return None
+        begin = time.perf_counter()
+        page = extract_chapter_page(html, page_url, rules, detect_pages)
+    else:
+        raw = await fetcher.fetch_raw(page_url)
+        if raw is None:
+            return None
+        body, encoding = raw
+        begin = time.perf_counter()
+        page = await asyncio.get_running_loop().run_in_executor(
+            pool, parse_page_worker, body, encoding, page_url, rules.source, detect_pages
+        )
+    get_metrics().observe("parse", get_domain(page_url), time.perf_counter() - begin, page[0] is not None)
+    if page[0] is None:
+        discard_cached(page_url)
+    return page
+
+
+async def _async_clean_chapter(parts, rules, domain=None):
+    begin = time.perf_counter()
+    pool = get_parse_pool()
+    if pool is None:
+        content = rules.clean("\n".join(parts))
+    else:
+        content = await asyncio.get_running_loop().run_in_executor(
+            pool, clean_worker, parts, rules.source
+        )
+    get_metrics().observe("clean", domain, time.perf_counter() - begin)
+    return content
+
+
+async def _async_fetch_sub_page(fetcher, page_url, rules):
+    page = await _async_load_page(fetcher, page_url, rules)
+    if page is None:
+        return None, None
+    content, next_url, _ = page
+    return content, next_url
+
+
+async def async_scrape_chapter(fetcher, url, book_source, known_title: str, pagination="auto"):
+    rules = compile_book_source(book_source)
+
+    full_content = []
+    current_url = url
+
+    while current_url:
+        page = await _async_load_page(
+            fetcher, current_url, rules,
+            detect_pages=pagination == "auto" and current_url == url,
+        )
+        if page is None:
+            return None
+
+        content, next_url, page_urls = page
+        if content is None:
+            return None
+
+        full_content.append(content)
+
+        if page_urls:
+            results = await asyncio.gather(*(
+                _async_fetch_sub_page(fetcher, u, rules) for u in page_urls
+            ))
+            next_url = merge_sub_pages(full_content, page_urls, results, next_url)
+
+        current_url = next_url
+
+    cleaned_content = await _async_clean_chapter(full_content, rules, get_domain(url))
+
+    return {"title": known_title, "content": cleaned_content, "url": url}
+
+
+async def async_parse_toc(fetcher, toc_url, book_source, cache_ttl=TOC_TTL):
+    """与 utils.parse_toc 相同：跟随 nextTocUrl 分页，每批分页并发抓取，某一分页失败时停止。"""
+    rules = compile_book_source(book_source)
+    if rules.chapter_list_selector is None:
+        logger.error(f"❌ 书源 {rules.name} 缺少 'chapterList' 规则")
+        return []
+
+    html = await fetcher.fetch_html(toc_url, cache_ttl=cache_ttl)
+    if not html:
+        return []
+
+    pages = TocPages(toc_url)
+    chapters, page_urls = extract_toc_page(html, toc_url, rules)
+    if not chapters:
+        logger.warning(f"⚠️ 规则 {rules.chapter_list_css} 未匹配到任何章节节点")
+    result = pages.add(chapters, page_urls)
+
+    batch = pages.next_batch()
+    while batch:
+        logger.info(f"📑 并发抓取 {len(batch)} 个目录分页")
+        htmls = await asyncio.gather(*(fetcher.fetch_html(u, cache_ttl=cache_ttl) for u in batch))
+        for page_url, page_html in zip(batch, htmls):
+            if not page_html:
+                logger.error(f"❌ 目录分页获取失败：{page_url}，目录只解析到此前的 {pages.loaded} 页")
+                return result
+            pages.loaded += 1
+            result.extend(pages.add(*extract_toc_page(page_html, page_url, rules)))
+        batch = pages.next_batch()
+    return result
@@ -0,0 +1,104 @@
+# novel_crawler/benchmarks/bench_cleaner.py
+"""
+正文清洗微基准：对比原实现（## 规则逐页一次替换 + 全局 CLEAN_RULES 逐条替换整章）
+与合并后的 CleaningEngine（逐页一次扫描、批量接口），并校验三者输出一致。
+
+用法（在项目根目录）：
+    python benchmarks/bench_cleaner.py [--chapters 500] [--pages 3] [--ad-ratio 0.2] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cleaner import COMPILED_RULES  # noqa: E402
+from compiled_source import compile_book_source  # noqa: E402
+
+FILTERS = ["一秒记住.*", "笔趣阁.*?com", "(?:广告|推广)内容", "天才一秒.*"]
+ADS = ["本章未完，点击下一页继续阅读", "手机用户请浏览m.example.com阅读", "一秒记住【笔趣阁 www.example.com】",
+       "请收藏本站：https://www.example.com", "广告内容", "未完待续"]
+WORDS = "他抬头望向远方山峦起伏云雾缭绕心中不禁生出几分感慨这一路走来经历了太多风雨"
+
+
+def make_corpus(chapters, pages, ad_ratio, seed=7):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(chapters):
+        chapter = []
+        for _ in range(pages):
+            lines = []
+            for _ in range(30):
+                line = "".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+                if rng.random() < ad_ratio / 10:
+                    line += rng.choice(ADS)
+                lines.append(line)
+            chapter.append("\n".join(lines))
+        corpus.append(chapter)
+    return corpus
+
+
+def legacy_clean(pages, filter_re):
+    """原实现：## 规则合并为一个正则逐页替换，拼接后 CLEAN_RULES 每条规则再扫描一遍整章。"""
+    if filter_re is not None:
+        pages = [filter_re.sub("", p) for p in pages]
+    text = "\n".join(pages)
+    for rule in COMPILED_RULES:
+        text = rule.sub("", text)
+    return text.strip()
+
+
+def engine_clean(pages, rules):
+    return rules.clean("\n".join(rules.filter_content(p) for p in pages))
+
+
+def timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="正文清洗微基准")
+    parser.add_argument("--chapters", type=int, default=500)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--ad-ratio", type=float, default=0.2, help="每章约有多少比例的行带广告（×10）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.chapters, args.pages, args.ad_ratio)
+    rules = compile_book_source({
+        "bookSourceName": "bench",
+        "ruleContent": {"content": "#content@textNodes##" + "##".join(FILTERS)},
+    })
+    filter_re = re.compile("|".join(f"(?:{f})" for f in FILTERS))
+    total_mb = sum(len(p.encode("utf-8")) for ch in corpus for p in ch) / 1024 / 1024
+
+    legacy_time, legacy = timed(lambda: [legacy_clean(ch, filter_re) for ch in corpus], args.repeat)
+    engine_time, engine = timed(lambda: [engine_clean(ch, rules) for ch in corpus], args.repeat)
+    batch_time, batch = timed(
+        lambda: rules.clean_batch("\n".join(ch) for ch in corpus), args.repeat
+    )
+
+    ok = legacy == engine == batch
+    print(f"📚 {args.chapters} 章 × {args.pages} 页，共 {total_mb:.1f} MB")
+    for name, elapsed in (("原实现", legacy_time), ("合并引擎", engine_time), ("批量接口", batch_time)):
+        print(
+            f"⏱️ {name:<6} {elapsed * 1000:8.1f} ms  {total_mb / elapsed:7.1f} MB/s"
+            f"  ×{legacy_time / elapsed:.2f}"
+        )
+    print("✅ 三种实现输出一致" if ok else "❌ 输出不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
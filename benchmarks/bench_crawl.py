@@ -0,0 +1,286 @@
+# novel_crawler/benchmarks/bench_crawl.py
+"""
+端到端抓取基准：在本进程中启动模拟站点（mock_site.py），每个 (版式, 驱动) 组合在全新的子进程
+与临时目录中运行，互不共享缓存与模块状态，资源统计也不含模拟站点本身：
+- toc：反复调用 utils.parse_toc，延迟为单次目录解析（含目录分页抓取；启用缓存时第一次之后目录页来自磁盘缓存）；
+- chapter：多线程调用 utils.scrape_chapter 抓取前 --sample 章，延迟为单章（含分页）；
+- main：完整运行 main.main（目录解析、调度、写入），延迟为单次 HTTP 请求（metrics 的 fetch 阶段）。
+输出章/秒、延迟 p50/p99、子进程峰值 RSS 与 CPU 时间（含解析进程池），并校验抓取结果：
+章节齐全有序、每页的 〔章-页〕 标记都在、站点广告已被清洗。
+默认沿用爬虫的限速参数，吞吐主要由限速器决定；加 --rate 1000 --max-rate 1000 可测量流水线本身的上限。
+--save 保存结果作为基线，--compare 对比基线，速率下降或内存上涨超过 --tolerance 时以非零状态退出。
+
+用法（在项目根目录）：
+    python benchmarks/bench_crawl.py [--layouts sudugu,cuoceng,wulin] [--drivers toc,chapter,main]
+        [--chapters 300] [--pages 3] [--latency 0.02] [--error-rate 0.01] [--engine thread]
+        [--save baseline.json | --compare baseline.json]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import mock_site  # noqa: E402
+
+DRIVERS = ("toc", "chapter", "main")
+_MARKER = re.compile(r"〔(\d+)-(\d+)〕")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def check_text(text, chapters, pages, ad):
+    """校验正文中的分页标记与广告；返回问题描述，没有问题时返回 None。"""
+    markers = [f"〔{c}-{p}〕" for c, p in _MARKER.findall(text)]
+    expected = mock_site.expected_markers(chapters, pages)
+    if markers != expected:
+        missing = len(set(expected) - set(markers))
+        return f"分页标记不符：期望 {len(expected)} 个，得到 {len(markers)} 个（缺 {missing} 个）"
+    if ad and ad in text:
+        return "站点广告未被清洗"
+    return None
+
+
+# ---------- 子进程：驱动爬虫 ----------
+
+def drive_toc(spec, toc_url, source):
+    from utils import parse_toc
+
+    latencies = []
+    chapters = []
+    for _ in range(spec["repeat"]):
+        start = time.perf_counter()
+        chapters = parse_toc(toc_url, source)
+        latencies.append(time.perf_counter() - start)
+    expected = [f"第{i}章 标题{i}" for i in range(1, spec["chapters"] + 1)]
+    titles = [ch["title"] for ch in chapters]
+    problem = None if titles == expected else f"目录不符：期望 {len(expected)} 章，得到 {len(titles)} 章"
+    return len(chapters) * spec["repeat"], latencies, problem
+
+
+def drive_chapter(spec, toc_url, source):
+    from compiled_source import compile_book_source
+    from utils import scrape_chapter
+
+    rules = compile_book_source(source)
+    count = min(spec["sample"], spec["chapters"])
+
+    def scrape(i):
+        start = time.perf_counter()
+        chapter = scrape_chapter(f"{toc_url}{i}.html", rules, f"第{i}章", spec["pagination"])
+        return time.perf_counter() - start, chapter
+
+    with ThreadPoolExecutor(max_workers=spec["workers"]) as executor:
+        results = list(executor.map(scrape, range(1, count + 1)))
+    text = "\n".join(chapter["content"] if chapter else "" for _, chapter in results)
+    problem = check_text(text, count, spec["pages"], spec["ad"])
+    return count, [elapsed for elapsed, _ in results], problem
+
+
+def drive_main(spec, toc_url, source):
+    import main
+    from metrics import get_metrics
+
+    main.main(
+        toc_url, engine=spec["engine"], concurrency=spec["concurrency"],
+        pagination=spec["pagination"],
+    )
+    files = glob.glob(os.path.join("novels", "*.txt"))
+    if not files:
+        return 0, [], "没有生成小说文件"
+    with open(files[0], encoding="utf-8") as f:
+        text = f.read()
+    fetch = get_metrics().stage("fetch")
+    # main 内部没有逐章计时，用 HTTP 请求的直方图分位数代替
+    latencies = {"p50": fetch.quantile(0.5), "p99": fetch.quantile(0.99)}
+    return spec["chapters"], latencies, check_text(text, spec["chapters"], spec["pages"], spec["ad"])
+
+
+def run_worker(spec):
+    from html_parser import set_parser
+    from http_cache import configure_cache
+    from parse_pool import configure_parse_workers, shutdown_parse_pool
+    from rate_limiter import configure_limits
+
+    with open("shuyuan.json", "w", encoding="utf-8") as f:
+        json.dump([spec["source"]], f, ensure_ascii=False)
+    set_parser(spec["parser"])
+    configure_cache(enabled=spec["cache"])
+    configure_parse_workers(spec["parse_workers"])
+    configure_limits(rate=spec["rate"], max_rate=spec["max_rate"])
+    driver = {"toc": drive_toc, "chapter": drive_chapter, "main": drive_main}[spec["driver"]]
+    if spec["driver"] == "main":
+        import main  # noqa: F401  导入耗时不计入
+
+    before = os.times()
+    start = time.perf_counter()
+    items, latencies, problem = driver(spec, spec["toc_url"], spec["source"])
+    wall = time.perf_counter() - start
+    shutdown_parse_pool()
+    after = os.times()
+
+    if isinstance(latencies, dict):
+        p50, p99 = latencies["p50"], latencies["p99"]
+    else:
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    cpu = sum(after[i] - before[i] for i in range(4))  # user、system 及子进程的 user、system
+    try:
+        import resource
+
+        scale = 1 if sys.platform == "darwin" else 1024  # macOS 以字节为单位，Linux 以 KB 为单位
+        rss = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        ) * scale
+    except ImportError:
+        rss = None
+    print(json.dumps({
+        "items": items, "wall": wall, "rate": items / wall if wall else 0.0,
+        "p50": p50, "p99": p99, "rss": rss, "cpu": cpu, "problem": problem,
+    }))
+
+
+# ---------- 主进程：模拟站点与汇总 ----------
+
+def run_case(layout, driver, port, args):
+    spec = {
+        "driver": driver,
+        "toc_url": f"http://127.0.0.1:{port}{mock_site.BOOK_PATH}",
+        "source": mock_site.book_source(layout, port),
+        "ad": mock_site.LAYOUTS[layout]["ad"],
+        "chapters": args.chapters, "pages": args.pages,
+        "repeat": args.repeat, "sample": args.sample, "workers": args.workers,
+        "engine": args.engine, "concurrency": args.concurrency, "pagination": args.pagination,
+        "parser": args.parser, "parse_workers": args.parse_workers, "cache": not args.no_cache,
+        "rate": args.rate, "max_rate": args.max_rate,
+    }
+    env = dict(os.environ)
+    env.pop("LLM_API_KEY", None)
+    env.pop("LLM_BASE_URL", None)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(spec)],
+            cwd=cwd, env=env, capture_output=True, text=True, timeout=args.timeout,
+        )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {"problem": f"子进程失败（{proc.returncode}）：{proc.stderr[-1500:]}"}
+    return json.loads(lines[-1])
+
+
+def _fmt_ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def compare(results, baseline, tolerance):
+    """返回回退描述列表：速率下降或峰值内存上涨超过 tolerance。"""
+    regressions = []
+    for key, current in results.items():
+        old = baseline.get(key)
+        if not old or current.get("problem") or old.get("problem"):
+            continue
+        if current["rate"] < old["rate"] * (1 - tolerance):
+            regressions.append(f"{key}：{old['rate']:.1f} → {current['rate']:.1f} 章/秒")
+        if current.get("rss") and old.get("rss") and current["rss"] > old["rss"] * (1 + tolerance):
+            regressions.append(
+                f"{key}：峰值 RSS {old['rss'] / 2 ** 20:.1f} → {current['rss'] / 2 ** 20:.1f} MB"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端抓取基准")
+    mock_site.add_site_arguments(parser)
+    parser.add_argument("--drivers", default=",".join(DRIVERS), help="逗号分隔：" + ",".join(DRIVERS))
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--pagination", choices=["auto", "sequential"], default="auto")
+    parser.add_argument("--parser", choices=["auto", "bs4", "lxml"], default="auto")
+    parser.add_argument("--parse-workers", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true", help="禁用磁盘响应缓存")
+    parser.add_argument(
+        "--rate", type=float, default=None,
+        help="每个域名的初始请求速率（默认同爬虫，10 次/秒）；调高可测量流水线本身的上限",
+    )
+    parser.add_argument("--max-rate", type=float, default=None, help="每个域名的最高请求速率")
+    parser.add_argument("--repeat", type=int, default=5, help="toc 驱动的目录解析次数")
+    parser.add_argument("--sample", type=int, default=100, help="chapter 驱动抓取的章节数")
+    parser.add_argument("--workers", type=int, default=8, help="chapter 驱动的线程数")
+    parser.add_argument("--timeout", type=float, default=600, help="单个组合的超时（秒）")
+    parser.add_argument("--save", metavar="FILE", help="把结果保存为基线 JSON")
+    parser.add_argument("--compare", metavar="FILE", help="与基线 JSON 对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="判定回退的相对变化，默认 0.2")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        return
+
+    layouts = [name for name in args.layouts.split(",") if name]
+    drivers = [name for name in args.drivers.split(",") if name]
+    unknown = (set(layouts) - set(mock_site.LAYOUTS)) | (set(drivers) - set(DRIVERS))
+    if unknown:
+        parser.error(f"未知版式或驱动：{', '.join(sorted(unknown))}")
+
+    servers = mock_site.serve(layouts, mock_site.site_options(args))
+    print(
+        f"📚 {args.chapters} 章 × {args.pages} 页，延迟 {args.latency * 1000:.0f} ms ±{args.jitter:.0%}，"
+        f"错误率 {args.error_rate:.1%}，引擎 {args.engine}"
+    )
+    print(f"{'组合':<16}{'章/秒':>9}{'p50 ms':>9}{'p99 ms':>9}{'峰值RSS':>10}{'CPU s':>8}{'CPU%':>7}  校验")
+    results = {}
+    ok = True
+    try:
+        for layout in layouts:
+            port = servers[layout].server_address[1]
+            for driver in drivers:
+                key = f"{layout}/{driver}"
+                result = run_case(layout, driver, port, args)
+                results[key] = result
+                if "rate" not in result:
+                    ok = False
+                    print(f"{key:<16}❌ {result['problem']}")
+                    continue
+                rss = "-" if result["rss"] is None else f"{result['rss'] / 2 ** 20:.1f}MB"
+                print(
+                    f"{key:<16}{result['rate']:9.1f}{_fmt_ms(result['p50']):>9}{_fmt_ms(result['p99']):>9}"
+                    f"{rss:>10}{result['cpu']:8.2f}{result['cpu'] / result['wall']:7.0%}"
+                    f"  {'✅' if not result['problem'] else '❌ ' + result['problem']}"
+                )
+                ok = ok and not result["problem"]
+    finally:
+        for server in servers.values():
+            server.shutdown()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"📉 {line}")
+        print("✅ 未发现性能回退" if not regressions else f"❌ 发现 {len(regressions)} 项性能回退")
+        ok = ok and not regressions
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
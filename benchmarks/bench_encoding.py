@@ -0,0 +1,90 @@
+# novel_crawler/benchmarks/bench_encoding.py
+"""
+编码识别基准：在 GBK 与 UTF-8 样本页面上对比整页字符集检测（原先 apparent_encoding 的做法）
+与 decoding 模块的快速路径（响应头 charset、<meta charset>、按站点记忆、UTF-8 试解码），
+并确认快速路径解码出的文字与原文一致（包括响应头误声明为 iso-8859-1 的页面）。
+
+用法（在项目根目录）：
+    python benchmarks/bench_encoding.py [--pages 200] [--size 30]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import decoding  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "chapter_paragraphs.html")
+_META = re.compile(r"<meta charset=\"utf-8\">")
+
+
+def make_page(size_kb, charset, with_meta):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    head, body = html.split("<body>", 1)
+    meta = f'<meta charset="{charset}">' if with_meta else ""
+    head = _META.sub(meta, head)
+    body = body.replace("</body></html>", "")
+    text = body
+    while len(text.encode(charset)) < size_kb * 1024:
+        text += body
+    return f"{head}<body>{text}</body></html>"
+
+
+def scenarios(size_kb):
+    """(名称, 原文, 正文字节, Content-Type, 是否按站点记忆)"""
+    for charset in ("gbk", "utf-8"):
+        page = make_page(size_kb, charset, with_meta=False)
+        body = page.encode(charset)
+        yield f"{charset} 响应头", page, body, f"text/html; charset={charset}", False
+        meta_page = make_page(size_kb, charset, with_meta=True)
+        yield f"{charset} meta", meta_page, meta_page.encode(charset), "text/html", False
+        yield f"{charset} 站点记忆", page, body, "text/html", True
+        # 站点把页面误声明为单字节编码
+        yield f"{charset} 误标 latin-1", page, body, "text/html; charset=iso-8859-1", False
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编码识别基准")
+    parser.add_argument("--pages", type=int, default=200, help="每个场景重复解码的页数")
+    parser.add_argument("--size", type=int, default=30, help="样本页面大小（KB）")
+    args = parser.parse_args()
+
+    decoding.full_detect(b"warm up")  # 预先导入 charset_normalizer，不计入耗时
+    ok = True
+    print(f"{'场景':<14}{'整页检测':>12}{'快速路径':>12}{'加速':>8}  编码")
+    for name, page, body, content_type, remembered in scenarios(args.size):
+        domain = None
+        if remembered:
+            domain = f"bench-{name}"
+            decoding.detect_encoding(body, content_type, domain)  # 第一页整页检测并记住
+
+        full_time, full_encoding = timed(lambda: decoding.full_detect(body), max(1, args.pages // 20))
+        fast_time, fast_encoding = timed(
+            lambda: decoding.detect_encoding(body, content_type, domain), args.pages
+        )
+        full_ok = body.decode(full_encoding, errors="replace") == page
+        fast_ok = body.decode(fast_encoding) == page
+        ok = ok and fast_ok
+        print(
+            f"{name:<14}{full_time * 1000:10.2f}ms{fast_time * 1000:10.3f}ms"
+            f"{full_time / fast_time:7.0f}x  {full_encoding}{'' if full_ok else '(有误)'}"
+            f" → {fast_encoding}{'' if fast_ok else '(有误)'}"
+        )
+    print("✅ 快速路径解码结果与原文一致" if ok else "❌ 快速路径解码结果与原文不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
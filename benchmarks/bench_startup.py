@@ -0,0 +1,89 @@
+# novel_crawler/benchmarks/bench_startup.py
+"""
+启动耗时基准：在全新的解释器中导入各入口模块，统计耗时（已扣除空解释器的启动时间），
+并列出导入最慢的模块。运行时会清除 LLM_API_KEY / LLM_BASE_URL，
+确认书源已存在的抓取不依赖 AI 配置即可启动。
+
+用法（在项目根目录）：
+    python benchmarks/bench_startup.py [--repeat 10] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["main", "follow", "pipeline", "utils", "ai_analyzer"]
+
+
+def _env():
+    env = dict(os.environ)
+    env.pop("LLM_API_KEY", None)
+    env.pop("LLM_BASE_URL", None)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def run(code, cwd, extra_args=()):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=cwd, env=_env(), capture_output=True, text=True,
+    )
+    return time.perf_counter() - start, proc
+
+
+def measure(code, cwd, repeat):
+    samples = []
+    for _ in range(repeat):
+        elapsed, proc = run(code, cwd)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{code!r} 失败：\n{proc.stderr[-2000:]}")
+        samples.append(elapsed)
+    return min(samples), statistics.median(samples)
+
+
+def slowest_imports(module, cwd, top):
+    """解析 -X importtime 的输出，返回 [(累计微秒, 模块名)]。"""
+    _, proc = run(f"import {module}", cwd, extra_args=("-X", "importtime"))
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    # 只看顶层导入链上的第三方模块与项目模块
+    rows = [r for r in rows if "." not in r[1]]
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # 在临时目录中运行，确认导入时不会创建 novels/、checkpoints/ 等目录
+    with tempfile.TemporaryDirectory() as cwd:
+        base_min, base_median = measure("pass", cwd, args.repeat)
+        print(f"🐍 空解释器：{base_min * 1000:.1f} ms（中位数 {base_median * 1000:.1f} ms）")
+        for module in MODULES:
+            best, median = measure(f"import {module}", cwd, args.repeat)
+            print(
+                f"⏱️ import {module:<12} {(best - base_min) * 1000:7.1f} ms"
+                f"（中位数 {(median - base_median) * 1000:.1f} ms）"
+            )
+        created = sorted(set(os.listdir(cwd)) - {"novel_crawler.log"})
+        print(f"📁 导入后新建的目录/文件：{created or '无'}")
+
+        print(f"\n🐢 import main 最慢的 {args.top} 个顶层模块（累计）：")
+        for cumulative, name in slowest_imports("main", cwd, args.top):
+            print(f"   {cumulative / 1000:7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# novel_crawler/benchmarks/check_parser_equivalence.py
+"""
+在 fixtures/ 中保存的页面上对比各 HTML 解析引擎与 bs4 参考实现的输出，
+并给出每个引擎的解析耗时。任何不一致都会打印差异并以非零状态退出。
+样本带 content_excludes 时，还要求清洗后的正文不再含有其中的文字；
+带 page_urls 时，要求推断出的剩余分页地址与之相同。
+
+用法（在项目根目录）：
+    python benchmarks/check_parser_equivalence.py [--repeat 20]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import html_parser  # noqa: E402
+from logger import logger  # noqa: E402
+from compiled_source import compile_book_source  # noqa: E402
+from utils import extract_chapter_page, extract_toc, verify_content_rule  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_cases():
+    with open(os.path.join(FIXTURES_DIR, "cases.json"), encoding="utf-8") as f:
+        cases = json.load(f)
+    for case in cases:
+        with open(os.path.join(FIXTURES_DIR, case["fixture"]), encoding="utf-8") as f:
+            case["html"] = f.read()
+    return cases
+
+
+def snapshot(case):
+    """收集抓取流程实际依赖的全部解析结果。"""
+    html, url, source = case["html"], case["url"], case["book_source"]
+    doc = html_parser.parse_html(html)
+    rules = compile_book_source(source)
+    return {
+        "title": doc.title(),
+        "links": [(a.get("href"), a.text(strip=True)) for a in doc.links()],
+        "text": doc.text(separator="\n", strip=True),
+        "toc": extract_toc(html, url, rules),
+        "content_ok": verify_content_rule(html, source),
+        "chapter_page": extract_chapter_page(html, url, rules, detect_pages=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20, help="计时时每个页面的解析次数")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)  # 样本中故意包含不匹配的规则
+    cases = load_cases()
+    engines = [name for name in html_parser.ENGINES if name == "bs4" or html_parser.lxml]
+
+    html_parser.set_parser("bs4")
+    reference = [snapshot(case) for case in cases]
+
+    failed = False
+    for case, expected in zip(cases, reference):
+        content = expected["chapter_page"][0] or ""
+        for text in case.get("content_excludes", []):
+            if text in content:
+                failed = True
+                print(f"❌ {case['fixture']} / {case['book_source']['bookSourceName']}: 正文未清除 {text!r}")
+        if "page_urls" in case and expected["chapter_page"][2] != case["page_urls"]:
+            failed = True
+            print(f"❌ {case['fixture']} / {case['book_source']['bookSourceName']}: "
+                  f"分页推断为 {expected['chapter_page'][2]}，应为 {case['page_urls']}")
+    for name in engines:
+        html_parser.set_parser(name)
+        for case, expected in zip(cases, reference):
+            actual = snapshot(case)
+            for key in expected:
+                if actual[key] != expected[key]:
+                    failed = True
+                    print(f"❌ [{name}] {case['fixture']} / {case['book_source']['bookSourceName']}: {key} 不一致")
+                    print(f"   bs4 : {str(expected[key])[:300]}")
+                    print(f"   {name}: {str(actual[key])[:300]}")
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for case in cases:
+                snapshot(case)
+        elapsed = (time.perf_counter() - started) / args.repeat * 1000
+        print(f"⏱️ {name:5s} 每轮 {len(cases)} 个页面：{elapsed:.1f} ms")
+
+    if failed:
+        sys.exit(1)
+    print(f"✅ {len(engines)} 个引擎在 {len(cases)} 个样本上输出一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# novel_crawler/benchmarks/mock_site.py
+"""
+本地模拟小说站点，供 bench_crawl.py 离线测量抓取吞吐，也可单独运行后手动抓取。
+
+每种版式在独立端口上提供一本书（书源按 host:port 精确匹配），结构与 shuyuan.json 中的书源一致：
+- sudugu：#list ul li a 目录、.con 正文、“下一页”链接（www.sudugu.org 书源）；
+- cuoceng：.dirList ul li a 目录、#readcontent .txtwrap .readBox 正文（www.cuoceng.com 书源）；
+- wulin：GBK 编码，目录按 <select class="form-control"> 分页（仿武林中文网书源，
+  原书源的 class.x.0@tag.a 写法改为等价的 CSS），正文夹带站点广告。
+目录页另有一组“最新章节”链接，考验选择器只取章节列表。
+章节按 {章}_{页}.html 分页，带“尾页”链接与“第 1/3 页”提示；正文确定性生成，
+每页以 〔章-页〕 标记开头，便于校验抓取结果是否完整、有序。
+可注入固定延迟 + 抖动与按比例随机返回的 503。
+
+用法（在项目根目录）：
+    python benchmarks/mock_site.py [--layouts sudugu,wulin] [--chapters 300] [--pages 3] [--latency 0.02]
+启动后第一行输出 {"版式": 端口} 的 JSON，目录页为 http://127.0.0.1:{端口}/book/1/
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOOK_PATH = "/book/1/"
+WORDS = "他抬头望向远方山峦起伏云雾缭绕心中不禁生出几分感慨这一路走来经历了太多风雨却始终没有停下脚步"
+
+LAYOUTS = {
+    "sudugu": {
+        "encoding": "utf-8",
+        "source": {
+            "bookSourceName": "模拟站点 sudugu",
+            "ruleToc": {"chapterList": "#list ul li a", "chapterName": "text", "chapterUrl": "href"},
+            "ruleContent": {"content": ".con@textNodes##下一页"},
+        },
+        "ad": None,
+    },
+    "cuoceng": {
+        "encoding": "utf-8",
+        "source": {
+            "bookSourceName": "模拟站点 cuoceng",
+            "ruleToc": {"chapterList": ".dirList ul li a", "chapterName": "text", "chapterUrl": "href"},
+            "ruleContent": {"content": "#readcontent .txtwrap .readBox@textNodes##清理广告、脚本和无关元素"},
+        },
+        "ad": None,
+    },
+    "wulin": {
+        "encoding": "gbk",
+        "source": {
+            "bookSourceName": "模拟站点 wulin",
+            "ruleToc": {
+                "chapterList": ".zjlist a", "chapterName": "text", "chapterUrl": "href",
+                "nextTocUrl": ".form-control option@value",
+            },
+            "ruleContent": {"content": "#content@textNodes##武林中文网.+|最新章节！"},
+        },
+        "ad": "武林中文网 www.50zw.so 最新章节！",
+    },
+}
+
+
+def book_source(layout, port):
+    """该版式对应的书源（bookSourceUrl 指向本地端口）。"""
+    return dict(LAYOUTS[layout]["source"], bookSourceUrl=f"http://127.0.0.1:{port}")
+
+
+def page_text(chapter, page, size):
+    """确定性生成的一页正文，以 〔章-页〕 标记开头。"""
+    rng = random.Random(chapter * 1000 + page)
+    lines = [f"〔{chapter}-{page}〕"]
+    length = 0
+    while length < size:
+        line = "".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+        lines.append(line)
+        length += len(line) * 3
+    return lines
+
+
+def expected_markers(chapters, pages):
+    return [f"〔{c}-{p}〕" for c in range(1, chapters + 1) for p in range(1, pages + 1)]
+
+
+class SiteOptions:
+    def __init__(
+        self, chapters=300, pages=3, toc_page_size=100, page_kb=4, encoding=None,
+        declare="header", latency=0.0, jitter=0.0, error_rate=0.0, seed=7,
+    ):
+        self.chapters = chapters
+        self.pages = pages
+        self.toc_page_size = toc_page_size
+        self.page_size = page_kb * 1024
+        self.encoding = encoding
+        self.declare = declare
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+
+class MockBook:
+    """一种版式的页面渲染。"""
+
+    def __init__(self, layout, options):
+        self.layout = layout
+        self.options = options
+        self.encoding = options.encoding or LAYOUTS[layout]["encoding"]
+        self.ad = LAYOUTS[layout]["ad"]
+        # 生成正文比发送更耗 CPU，缓存渲染结果，避免模拟站点本身成为瓶颈
+        self.render = lru_cache(maxsize=4096)(self._render)
+
+    def _head(self, title):
+        meta = f'<meta charset="{self.encoding}">' if self.options.declare == "meta" else ""
+        return f"<!DOCTYPE html><html><head>{meta}<title>{title}</title></head><body>"
+
+    def toc_pages(self):
+        if self.layout != "wulin":
+            return 1
+        size = self.options.toc_page_size
+        return max(1, (self.options.chapters + size - 1) // size)
+
+    def toc(self, number):
+        chapters = self.options.chapters
+        if self.layout == "wulin":
+            size = self.options.toc_page_size
+            indexes = range((number - 1) * size + 1, min(chapters, number * size) + 1)
+        else:
+            indexes = range(1, chapters + 1)
+        items = "".join(f'<li><a href="{BOOK_PATH}{i}.html">第{i}章 标题{i}</a></li>' for i in indexes)
+        latest = "".join(
+            f'<li><a href="{BOOK_PATH}{i}.html">第{i}章 标题{i}</a></li>'
+            for i in range(chapters, max(0, chapters - 9), -1)
+        )
+        head = self._head("模拟小说_最新章节_目录")
+        nav = '<div class="nav"><a href="/">首页</a><a href="/top/">排行榜</a></div>'
+        if self.layout == "sudugu":
+            return (f'{head}{nav}<div class="latest"><ul>{latest}</ul></div>'
+                    f'<div id="list"><ul>{items}</ul></div></body></html>')
+        if self.layout == "cuoceng":
+            return (f'{head}{nav}<div class="newList"><ul>{latest}</ul></div>'
+                    f'<div class="dirList"><ul>{items}</ul></div></body></html>')
+        options = "".join(
+            f'<option value="{BOOK_PATH if k == 1 else f"{BOOK_PATH}index_{k}.html"}"'
+            f'{" selected" if k == number else ""}>第{k}页</option>'
+            for k in range(1, self.toc_pages() + 1)
+        )
+        return (f'{head}{nav}<ul class="newest">{latest}</ul><ul class="zjlist">{items}</ul>'
+                f'<select class="form-control">{options}</select></body></html>')
+
+    def chapter(self, chapter, page):
+        pages = self.options.pages
+        lines = page_text(chapter, page, self.options.page_size)
+        if self.ad and chapter % 3 == 0:
+            lines.append(self.ad)
+        body = "<br/>".join(lines)
+        if page < pages:
+            links = (f'<a href="{BOOK_PATH}{chapter}_{page + 1}.html">下一页</a>'
+                     f'<a href="{BOOK_PATH}{chapter}_{pages}.html">尾页</a>')
+        else:
+            links = f'<a href="{BOOK_PATH}{chapter + 1}.html">下一章</a>'
+        hint = f"<span>第{page}/{pages}页</span>" if pages > 1 else ""
+        head = self._head(f"第{chapter}章 标题{chapter}")
+        if self.layout == "sudugu":
+            return (f'{head}<h1>第{chapter}章</h1><div class="con">{body}</div>'
+                    f'<div class="prenext">{hint}{links}</div></body></html>')
+        if self.layout == "cuoceng":
+            return (f'{head}<div id="readcontent"><div class="txtwrap">'
+                    f'<div class="readBox">{body}</div></div>'
+                    f'<div class="pager">{hint}{links}</div></div></body></html>')
+        return (f'{head}<div class="bookname"><h1>第{chapter}章</h1></div><div id="content">{body}</div>'
+                f'<div class="page_chapter">{hint}{links}</div></body></html>')
+
+    def _render(self, path):
+        """返回页面 HTML；不存在的路径返回 None。"""
+        if not path.startswith(BOOK_PATH):
+            return None
+        name = path[len(BOOK_PATH):]
+        if name == "":
+            return self.toc(1)
+        if name.startswith("index_") and name.endswith(".html"):
+            number = int(name[len("index_"):-5])
+            return self.toc(number) if 1 <= number <= self.toc_pages() else None
+        if not name.endswith(".html"):
+            return None
+        stem = name[:-5]
+        chapter, _, page = stem.partition("_")
+        if not chapter.isdigit() or (page and not page.isdigit()):
+            return None
+        chapter, page = int(chapter), int(page or 1)
+        if not (1 <= chapter <= self.options.chapters and 1 <= page <= self.options.pages):
+            return None
+        return self.chapter(chapter, page)
+
+
+def make_handler(book):
+    options = book.options
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 保持连接，与真实站点一样复用连接池
+
+        def do_GET(self):
+            if options.latency:
+                time.sleep(max(0.0, options.latency * (1 + options.jitter * (2 * options.random() - 1))))
+            if options.error_rate and options.random() < options.error_rate:
+                self._send(503, b"")
+                return
+            html = book.render(self.path)
+            if html is None:
+                self._send(404, b"")
+                return
+            content_type = "text/html"
+            if options.declare == "header":
+                content_type += f"; charset={book.encoding}"
+            self._send(200, html.encode(book.encoding), content_type)
+
+        def _send(self, status, body, content_type="text/html"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(layouts, options):
+    """为每种版式在随机端口上启动服务器（后台线程），返回 {版式: 服务器}。"""
+    servers = {}
+    for layout in layouts:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(MockBook(layout, options)))
+        server.daemon_threads = True
+        server.request_queue_size = 512
+        threading.Thread(target=server.serve_forever, name=f"mock-{layout}", daemon=True).start()
+        servers[layout] = server
+    return servers
+
+
+def add_site_arguments(parser):
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="逗号分隔的版式：" + ",".join(LAYOUTS))
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=3, help="每章分页数")
+    parser.add_argument("--toc-page-size", type=int, default=100, help="wulin 版式每个目录分页的章节数")
+    parser.add_argument("--page-kb", type=int, default=4, help="每页正文大小（KB，按 UTF-8 估算）")
+    parser.add_argument("--encoding", choices=["gbk", "utf-8"], default=None, help="覆盖各版式的默认编码")
+    parser.add_argument(
+        "--declare", choices=["header", "meta", "none"], default="header",
+        help="编码声明方式：响应头 charset、<meta charset> 或不声明（走编码检测）",
+    )
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.5, help="延迟抖动比例，0.5 表示 ±50%%")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 503 的请求比例")
+
+
+def site_options(args):
+    return SiteOptions(
+        chapters=args.chapters, pages=args.pages, toc_page_size=args.toc_page_size,
+        page_kb=args.page_kb, encoding=args.encoding, declare=args.declare,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟小说站点")
+    add_site_arguments(parser)
+    args = parser.parse_args()
+    layouts = [name for name in args.layouts.split(",") if name]
+    unknown = set(layouts) - set(LAYOUTS)
+    if unknown:
+        parser.error(f"未知版式：{', '.join(sorted(unknown))}")
+
+    servers = serve(layouts, site_options(args))
+    print(json.dumps({layout: s.server_address[1] for layout, s in servers.items()}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    for server in servers.values():
+        server.shutdown()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,192 @@
 # novel_crawler/booksource_loader.py
 import json
 import os
+import re
+import stat
+import tempfile
+import threading
 from urllib.parse import urlparse
 
 BOOKSOURCE_FILE = "shuyuan.json"
 
+# 查找时忽略的常见子域名前缀，使 www.a.com / m.a.com / a.com 互相匹配
+HOST_PREFIXES = ("www.", "m.", "wap.")
+_PATTERN_HOST = re.compile(r"^\^?https?\??://([^/]+)")
+
+
+def normalize_host(host):
+    host = host.lower().strip().rstrip(".")
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+def _hosts_from_url(url):
+    """bookSourceUrl 可能带有 ##注释 或多个地址，这里提取所有 netloc。"""
+    hosts = []
+    for part in re.split(r"[\s,]+", url.split("##")[0]):
+        netloc = urlparse(part.strip()).netloc.lower()
+        if netloc:
+            hosts.append(netloc)
+    return hosts
+
+
+def _host_from_pattern(pattern):
+    """从 bookUrlPattern 正则中提取字面主机名，包含其他正则语法时放弃。"""
+    match = _PATTERN_HOST.match(pattern or "")
+    if not match:
+        return None
+    host = match.group(1).replace("\\.", ".").replace("\\-", "-")
+    if re.search(r"[\\()\[\]|*+?{}^$]", host):
+        return None
+    return host.lower()
+
+
+class BookSourceRegistry:
+    """
+    书源注册表：只在文件 mtime 变化时重新加载 shuyuan.json，
+    并按主机名建立索引，查找时先精确匹配，再按去前缀/父域名匹配。
+    """
+
+    def __init__(self, path=BOOKSOURCE_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._sources = []
+        self._exact = {}
+        self._base = {}
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _reload_if_changed(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            self._sources = []
+        else:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._sources = json.load(f)
+        self._stamp = stamp
+        self._build_index()
+
+    def _build_index(self):
+        self._exact = {}
+        self._base = {}
+        for source in self._sources:
+            self._index_source(source)
+
+    def _index_source(self, source):
+        if not source.get("enabled", True):
+            return
+        hosts = _hosts_from_url(source.get("bookSourceUrl", ""))
+        pattern_host = _host_from_pattern(source.get("bookUrlPattern"))
+        if pattern_host:
+            hosts.append(pattern_host)
+        for netloc in hosts:
+            # 按文件顺序，先出现的书源优先
+            self._exact.setdefault(netloc, source)
+            self._base.setdefault(normalize_host(netloc.split(":")[0]), source)
+
+    def all(self):
+        with self._lock:
+            self._reload_if_changed()
+            return list(self._sources)
+
+    def find(self, url):
+        parsed = urlparse(url)
+        netloc = parsed.netloc.lower()
+        if not netloc:
+            return None
+        with self._lock:
+            self._reload_if_changed()
+            source = self._exact.get(netloc)
+            if source is not None:
+                return source
+
+            host = normalize_host(parsed.hostname or "")
+            if host.replace(".", "").isdigit():  # IP 地址只做精确匹配
+                return self._base.get(host)
+            labels = host.split(".")
+            # book.a.com -> a.com，至少保留两级域名
+            for i in range(max(1, len(labels) - 1)):
+                source = self._base.get(".".join(labels[i:]))
+                if source is not None:
+                    return source
+        return None
+
+    def append(self, new_source):
+        with self._lock:
+            self._reload_if_changed()
+            self._save(self._sources + [new_source])
+
+    def remove(self, source):
+        """删除与 source 同名同站点的书源，返回是否删除了书源。"""
+        key = (source.get("bookSourceName"), source.get("bookSourceUrl"))
+        with self._lock:
+            self._reload_if_changed()
+            sources = [
+                s for s in self._sources
+                if (s.get("bookSourceName"), s.get("bookSourceUrl")) != key
+            ]
+            if len(sources) == len(self._sources):
+                return False
+            self._save(sources)
+            return True
+
+    def _save(self, sources):
+        """
+        经临时文件原子替换书源文件并重建索引，调用方需持有锁。
+        mkstemp 创建的临时文件权限为 0600，替换前改为原文件的权限（新文件为 0644）。
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        fd, tmp_path = tempfile.mkstemp(prefix=".shuyuan-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(sources, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._sources = sources
+        self._stamp = self._file_stamp()
+        self._build_index()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.path != BOOKSOURCE_FILE:
+            _registry = BookSourceRegistry(BOOKSOURCE_FILE)
+        return _registry
+
+
 def load_all_book_sources():
-    with open(BOOKSOURCE_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return get_registry().all()
 
 def find_book_source(url):
-    domain = urlparse(url).netloc
-    all_sources = load_all_book_sources()
-    for source in all_sources:
-        if not source.get("enabled", True):
-            continue
-        src_url = source.get("bookSourceUrl", "")
-        if domain in src_url:
-            return source
-    return None
+    return get_registry().find(url)
 
 def append_book_source(new_source):
-    all_sources = load_all_book_sources()
-    all_sources.append(new_source)
-    with open(BOOKSOURCE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(all_sources, f, ensure_ascii=False, indent=2)
+    get_registry().append(new_source)
     print(f"✅ 新书源已追加保存到 {BOOKSOURCE_FILE}")
+
+def remove_book_source(source):
+    return get_registry().remove(source)
@@ -0,0 +1,365 @@
+# novel_crawler/chapter_store.py
+"""
+按章压缩存储的章节库（library/{book_key}/）。
+
+- chapters.blob：依次追加的章节记录，每条为 zlib 压缩的 {"title", "url", "content"}；
+- chapters.idx：定长索引，第 n 条（12 字节）为第 n 章记录在 blob 中的偏移与长度；
+- meta.json：书名、目录页 URL 等元数据。
+
+读取任意一章只需一次索引定位与一次 blob 读取（O(1)）；修补某章时追加新记录并
+原地改写索引，旧记录留作空洞，由 compact() 回收。TXT 与 EPUB 导出逐章流式生成，
+内存占用与书的长度无关。
+"""
+import html
+import json
+import os
+import struct
+import threading
+import time
+import zipfile
+import zlib
+
+from logger import logger
+
+LIBRARY_DIR = "library"
+EXPORTS_DIR = "exports"
+
+_INDEX_ENTRY = struct.Struct("<QI")
+COMPRESS_LEVEL = 6
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _open_rw(path):
+    """以读写方式打开（不存在时创建）；追加 (a+b) 模式无法原地改写索引条目。"""
+    if not os.path.exists(path):
+        open(path, "wb").close()
+    return open(path, "r+b")
+
+
+class ChapterStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.blob_path = os.path.join(directory, "chapters.blob")
+        self.index_path = os.path.join(directory, "chapters.idx")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self._lock = threading.Lock()
+        self._finish_compaction()
+        self._blob = _open_rw(self.blob_path)
+        self._index = _open_rw(self.index_path)
+        self._count = self._recover()
+
+    def _compaction_files(self):
+        return (
+            os.path.join(self.directory, "compact.commit"),
+            [(self.blob_path + ".tmp", self.blob_path), (self.index_path + ".tmp", self.index_path)],
+        )
+
+    def _finish_compaction(self):
+        """
+        compact() 写好新文件后先创建提交标记再替换。崩溃恢复时：有标记则继续完成替换，
+        没有标记说明新文件尚未写完，直接丢弃。
+        """
+        marker, pairs = self._compaction_files()
+        committed = os.path.exists(marker)
+        for tmp_path, path in pairs:
+            if os.path.exists(tmp_path):
+                if committed:
+                    os.replace(tmp_path, path)
+                else:
+                    os.remove(tmp_path)
+        if committed:
+            os.remove(marker)
+
+    def _recover(self):
+        """丢弃索引末尾不完整的条目，以及指向 blob 之外（未落盘）的条目。"""
+        blob_size = self._blob.seek(0, os.SEEK_END)
+        index_size = self._index.seek(0, os.SEEK_END)
+        count = index_size // _INDEX_ENTRY.size
+        while count:
+            offset, length = self._entry(count - 1)
+            if offset + length <= blob_size:
+                break
+            count -= 1
+        if count * _INDEX_ENTRY.size != index_size:
+            self._index.truncate(count * _INDEX_ENTRY.size)
+        return count
+
+    def _entry(self, slot):
+        self._index.seek(slot * _INDEX_ENTRY.size)
+        return _INDEX_ENTRY.unpack(self._index.read(_INDEX_ENTRY.size))
+
+    def __len__(self):
+        return self._count
+
+    def load_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_meta(self, **meta):
+        merged = {**self.load_meta(), **meta}
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(merged, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    def _write_record(self, chapter):
+        record = {"title": chapter["title"], "url": chapter["url"], "content": chapter["content"]}
+        data = zlib.compress(json.dumps(record, ensure_ascii=False).encode("utf-8"), COMPRESS_LEVEL)
+        offset = self._blob.seek(0, os.SEEK_END)
+        self._blob.write(data)
+        return offset, len(data)
+
+    def put(self, slot, chapter):
+        """写入第 slot 章：slot 等于当前章数时追加，小于时替换（修补）该章。"""
+        with self._lock:
+            if slot > self._count:
+                raise IndexError(f"章节序号 {slot} 超出范围（共 {self._count} 章）")
+            entry = _INDEX_ENTRY.pack(*self._write_record(chapter))
+            if slot == self._count:
+                self._index.seek(0, os.SEEK_END)
+                self._count += 1
+            else:
+                self._index.seek(slot * _INDEX_ENTRY.size)
+            self._index.write(entry)
+        return slot
+
+    def append(self, chapter):
+        return self.put(self._count, chapter)
+
+    def get(self, slot):
+        with self._lock:
+            if not 0 <= slot < self._count:
+                raise IndexError(f"章节序号 {slot} 超出范围（共 {self._count} 章）")
+            self._blob.flush()
+            offset, length = self._entry(slot)
+            self._blob.seek(offset)
+            data = self._blob.read(length)
+        return json.loads(zlib.decompress(data))
+
+    def __iter__(self):
+        for slot in range(len(self)):
+            yield self.get(slot)
+
+    def truncate(self, count):
+        """只保留前 count 章（与断点日志对齐时使用）。"""
+        with self._lock:
+            if count >= self._count:
+                return
+            self._index.truncate(count * _INDEX_ENTRY.size)
+            self._count = count
+            # 同时回收 blob 末尾不再被引用的记录
+            self._index.seek(0)
+            entries = _INDEX_ENTRY.iter_unpack(self._index.read(count * _INDEX_ENTRY.size))
+            self._blob.truncate(max((offset + length for offset, length in entries), default=0))
+
+    def flush(self):
+        """先落盘 blob 再落盘索引，索引中的条目总是指向已持久化的记录。"""
+        with self._lock:
+            _fsync(self._blob)
+            _fsync(self._index)
+
+    def close(self):
+        self.flush()
+        self._blob.close()
+        self._index.close()
+
+    def disk_usage(self):
+        return os.path.getsize(self.blob_path) + os.path.getsize(self.index_path)
+
+    def compact(self):
+        """重写 blob，回收修补与截断留下的空洞。"""
+        with self._lock:
+            self._blob.flush()
+            marker, pairs = self._compaction_files()
+            (tmp_blob, _), (tmp_index, _) = pairs
+            with open(tmp_blob, "wb") as blob, open(tmp_index, "wb") as index:
+                position = 0
+                for slot in range(self._count):
+                    offset, length = self._entry(slot)
+                    self._blob.seek(offset)
+                    blob.write(self._blob.read(length))
+                    index.write(_INDEX_ENTRY.pack(position, length))
+                    position += length
+                _fsync(blob)
+                _fsync(index)
+            with open(marker, "wb") as f:
+                _fsync(f)
+            self._blob.close()
+            self._index.close()
+            self._finish_compaction()
+            self._blob = _open_rw(self.blob_path)
+            self._index = _open_rw(self.index_path)
+
+    def export_txt(self, path):
+        """逐章导出为与爬取输出相同格式的 TXT。"""
+        with open(path, "w", encoding="utf-8") as f:
+            for chapter in self:
+                f.write(f"{chapter['title']}\n\n{chapter['content']}\n\n\n")
+        return path
+
+    def export_epub(self, path, title=None, author=None):
+        """逐章导出为 EPUB 3（每章一个 XHTML，附带 nav 与 NCX 目录）。"""
+        meta = self.load_meta()
+        title = title or meta.get("title") or "Untitled"
+        author = author or meta.get("author") or ""
+        book_id = meta.get("book_key") or title
+
+        titles = []
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as epub:
+            epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            epub.writestr("META-INF/container.xml", _CONTAINER_XML)
+            for slot, chapter in enumerate(self):
+                titles.append(chapter["title"])
+                paragraphs = "\n".join(
+                    f"<p>{html.escape(line)}</p>"
+                    for line in chapter["content"].split("\n") if line.strip()
+                )
+                epub.writestr(f"OEBPS/chapter{slot:05d}.xhtml", _CHAPTER_XHTML.format(
+                    title=html.escape(chapter["title"]), body=paragraphs,
+                ))
+            epub.writestr("OEBPS/content.opf", _build_opf(book_id, title, author, len(titles)))
+            epub.writestr("OEBPS/nav.xhtml", _build_nav(title, titles))
+            epub.writestr("OEBPS/toc.ncx", _build_ncx(book_id, title, titles))
+        return path
+
+
+_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+_CHAPTER_XHTML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="zh">
+<head><meta charset="UTF-8"/><title>{title}</title></head>
+<body>
+<h2>{title}</h2>
+{body}
+</body>
+</html>
+"""
+
+
+def _build_opf(book_id, title, author, count):
+    items = "\n".join(
+        f'    <item id="c{i}" href="chapter{i:05d}.xhtml" media-type="application/xhtml+xml"/>'
+        for i in range(count)
+    )
+    spine = "\n".join(f'    <itemref idref="c{i}"/>' for i in range(count))
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">{html.escape(book_id)}</dc:identifier>
+    <dc:title>{html.escape(title)}</dc:title>
+    <dc:creator>{html.escape(author)}</dc:creator>
+    <dc:language>zh</dc:language>
+    <meta property="dcterms:modified">{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
+{items}
+  </manifest>
+  <spine toc="ncx">
+{spine}
+  </spine>
+</package>
+"""
+
+
+def _build_nav(title, titles):
+    links = "\n".join(
+        f'      <li><a href="chapter{i:05d}.xhtml">{html.escape(t)}</a></li>'
+        for i, t in enumerate(titles)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="zh">
+<head><meta charset="UTF-8"/><title>{html.escape(title)}</title></head>
+<body>
+  <nav epub:type="toc">
+    <ol>
+{links}
+    </ol>
+  </nav>
+</body>
+</html>
+"""
+
+
+def _build_ncx(book_id, title, titles):
+    points = "\n".join(
+        f'    <navPoint id="p{i}" playOrder="{i + 1}"><navLabel><text>{html.escape(t)}</text></navLabel>'
+        f'<content src="chapter{i:05d}.xhtml"/></navPoint>'
+        for i, t in enumerate(titles)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head><meta name="dtb:uid" content="{html.escape(book_id)}"/></head>
+  <docTitle><text>{html.escape(title)}</text></docTitle>
+  <navMap>
+{points}
+  </navMap>
+</ncx>
+"""
+
+
+_enabled = False
+_library_dir = LIBRARY_DIR
+
+
+def configure_chapter_store(enabled=True, directory=None):
+    """启用后，每本书在写入 TXT 的同时写入 library/{book_key}/ 章节库。"""
+    global _enabled, _library_dir
+    _enabled = enabled
+    if directory is not None:
+        _library_dir = directory
+
+
+def store_path(book_key):
+    return os.path.join(_library_dir, book_key)
+
+
+def open_store(book_key, create=None):
+    """
+    打开一本书的章节库。create 为 None 时按 configure_chapter_store 的设置决定；
+    未启用且不存在时返回 None。
+    """
+    directory = store_path(book_key)
+    if create is None:
+        create = _enabled
+    if not create and not os.path.isdir(directory):
+        return None
+    return ChapterStore(directory)
+
+
+def export_book(book_key, fmt="txt", path=None):
+    """把章节库导出为 TXT 或 EPUB，默认保存到 exports/{书名}.{格式}。"""
+    store = open_store(book_key, create=False)
+    if store is None:
+        logger.error(f"❌ 未找到章节库：{store_path(book_key)}（抓取时需使用 --store）")
+        return None
+    try:
+        title = store.load_meta().get("title") or book_key
+        if path is None:
+            os.makedirs(EXPORTS_DIR, exist_ok=True)
+            path = os.path.join(EXPORTS_DIR, f"{title}.{fmt}")
+        if fmt == "epub":
+            store.export_epub(path)
+        else:
+            store.export_txt(path)
+        logger.info(f"📦 已导出 {len(store)} 章到 {path}")
+        return path
+    finally:
+        store.close()
@@ -1,32 +1,402 @@
 # novel_crawler/chapter_writer.py
 import os
+import json
+import time
+
+from logger import logger
 
 CHECKPOINTS_DIR = "checkpoints"
 NOVELS_DIR = "novels"
 
-os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
-os.makedirs(NOVELS_DIR, exist_ok=True)
+# 日志批量落盘：累计这么多章或距上次落盘超过这么多秒时 flush + fsync
+JOURNAL_FLUSH_EVERY = 32
+JOURNAL_FLUSH_INTERVAL = 2.0
+
+# 重试耗尽的章节写入小说文件的占位正文（单独一行），补抓成功后原地替换
+FAILED_PLACEHOLDER = "【本章抓取失败，请稍后补抓：{url}】"
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
 
 class ChapterWriter:
-    def __init__(self, domain, novel_title):
+    """
+    小说文件写入器，带预写日志（{book_key}.journal；未指定 book_key 时按域名命名）。
+
+    小说文件与日志各保持一个打开的句柄。每写完一章，向日志追加一行
+    {"index", "offset", "url", "time"}，offset 为该章写完后小说文件的字节长度。
+    新建日志时先写入一条只含 offset 的基准记录（当时小说文件的长度）并立即落盘，
+    第一批章节落盘前崩溃也能截断回去。
+    日志按章数或时间批量落盘，且总是先 fsync 小说文件再 fsync 日志，
+    因此日志中的每条记录都指向已经持久化的内容。
+    恢复时取日志中最后一条完整记录，把小说文件截断到它的 offset，
+    丢弃崩溃前写了一半或尚未记入日志的章节，从下一章继续。
+
+    state 为 state_store.BookState 时，同时维护每章的状态与正文哈希，
+    其事务在日志落盘后提交；恢复时按日志中的全部记录补记状态，两者不会不一致。
+    失败占位的日志记录带 failed 标记；补抓成功后由 patch_chapters 原地替换占位。store 为 chapter_store.ChapterStore 时，每章同时写入
+    压缩章节库，日志记录该章的库内序号（slot），恢复时章节库与小说文件一起截断，补抓时一起修补。
+    """
+
+    def __init__(
+        self, domain, novel_title, book_key=None, state=None, store=None,
+        flush_every=JOURNAL_FLUSH_EVERY, flush_interval=JOURNAL_FLUSH_INTERVAL,
+    ):
         self.domain = domain
         self.novel_title = novel_title
+        self.book_key = book_key or domain
+        self.state = state
+        self.store = store
         self.filepath = os.path.join(NOVELS_DIR, f"{novel_title}.txt")
-        self.checkpoint_file = os.path.join(CHECKPOINTS_DIR, f"{domain}.last_url")
+        self.checkpoint_file = os.path.join(CHECKPOINTS_DIR, f"{self.book_key}.journal")
+        # 旧版本按域名记录的断点，只读取其中的 URL，由调用方确认属于本书
+        self.legacy_checkpoint_files = [
+            os.path.join(CHECKPOINTS_DIR, f"{domain}.journal"),
+            os.path.join(CHECKPOINTS_DIR, f"{domain}.last_url"),
+        ]
+        self.failures_file = os.path.join(CHECKPOINTS_DIR, f"{self.book_key}.failures.jsonl")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self._novel = None
+        self._journal = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._last_record = self._recover()
+        self._offset = self._last_record["offset"] if self._last_record else None
+
+    def _read_journal(self, path=None, records=None):
+        """返回日志中最后一条完整记录；末尾写了一半的行会被忽略。records 为列表时收集全部完整记录。"""
+        last = None
+        try:
+            with open(path or self.checkpoint_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    last = record
+                    if records is not None:
+                        records.append(record)
+        except FileNotFoundError:
+            return None
+        return last
+
+    def _patch_files(self):
+        return (
+            self.checkpoint_file + ".patch.commit",
+            [(self.filepath + ".patch", self.filepath), (self.checkpoint_file + ".patch", self.checkpoint_file)],
+        )
+
+    def _finish_patch(self):
+        """
+        patch_chapters 写好新的小说文件与日志后先创建提交标记再替换。崩溃恢复时：
+        有标记则继续完成替换，没有标记说明新文件尚未写完，直接丢弃。
+        """
+        marker, pairs = self._patch_files()
+        committed = os.path.exists(marker)
+        for tmp_path, path in pairs:
+            if os.path.exists(tmp_path):
+                if committed:
+                    os.replace(tmp_path, path)
+                else:
+                    os.remove(tmp_path)
+        if committed:
+            os.remove(marker)
+
+    def _recover(self):
+        self._finish_patch()
+        record = self._recover_novel()
+        if self.store is not None:
+            if record is not None and "slot" in record:
+                self.store.truncate(record["slot"] + 1)
+            elif record is None and self._novel_size() == 0:
+                self.store.truncate(0)
+        return record
+
+    def _novel_size(self):
+        return os.path.getsize(self.filepath) if os.path.exists(self.filepath) else 0
+
+    def _recover_novel(self):
+        records = []
+        record = self._read_journal(records=records)
+        if record is None:
+            if self.state is not None and self._novel_size() == 0:
+                self.state.restore_written([], written_before=0)
+            return None
+
+        size = self._novel_size()
+        if size < record["offset"]:
+            # 小说文件比日志记录的短，说明文件被外部修改过，无法信任日志
+            logger.warning(f"⚠️ {self.filepath} 短于断点日志记录的长度，忽略断点日志")
+            return None
+        if size > record["offset"]:
+            logger.warning(
+                f"🩹 {self.filepath} 末尾有 {size - record['offset']} 字节未记入断点日志，"
+                f"截断到最后一致位置（{record.get('url') or '本次写入之前'} 之后）"
+            )
+            with open(self.filepath, "r+b") as f:
+                f.truncate(record["offset"])
+        if self.state is not None:
+            self.state.restore_written(records, written_before=record.get("time"))
+
+        # 只保留最后一条记录，避免日志随追更无限增长
+        tmp_path = self.checkpoint_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            _fsync(f)
+        os.replace(tmp_path, self.checkpoint_file)
+        return record
+
+    def _open(self):
+        if self._novel is None:
+            os.makedirs(NOVELS_DIR, exist_ok=True)
+            os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+            self._novel = open(self.filepath, "ab")
+            self._offset = self._novel.seek(0, os.SEEK_END)
+            new_journal = not os.path.exists(self.checkpoint_file)
+            self._journal = open(self.checkpoint_file, "a", encoding="utf-8")
+            if new_journal:
+                base = {"offset": self._offset, "time": time.time()}
+                if self.store is not None:
+                    base["slot"] = len(self.store) - 1
+                self._journal.write(json.dumps(base) + "\n")
+                _fsync(self._journal)
+                self._last_record = self._last_record or base
+
+    def append_chapter(self, index, chapter):
+        """写入一章并记入日志；达到批量阈值时落盘。"""
+        self._open()
+        data = f"{chapter['title']}\n\n{chapter['content']}\n\n\n".encode("utf-8")
+        self._novel.write(data)
+        self._offset += len(data)
+        now = time.time()
+        self._last_record = {"index": index, "offset": self._offset, "url": chapter["url"], "time": now}
+        if chapter.get("failed"):
+            self._last_record["failed"] = True
+        if self.store is not None:
+            self._last_record["slot"] = self.store.append(chapter)
+        self._journal.write(json.dumps(self._last_record, ensure_ascii=False) + "\n")
+        if self.state is not None:
+            self.state.mark_written(chapter["url"], now)
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+        else:
+            self.flush_if_due()
 
     def write_chapters(self, chapters):
-        with open(self.filepath, 'a', encoding='utf-8') as f:
-            for ch in chapters:
-                f.write(f"{ch['title']}\n\n")
-                f.write(ch['content'])
-                f.write("\n\n\n")
+        """兼容旧接口：按序追加多章，序号接着上一条日志记录递增。"""
+        index = self._last_record.get("index", -1) if self._last_record else -1
+        for ch in chapters:
+            index += 1
+            self.append_chapter(index, ch)
+
+    def flush_delay(self):
+        """距离下一次按时间落盘的秒数；没有未落盘的章节时返回 None。"""
+        if not self._unflushed:
+            return None
+        return max(0.0, self._last_flush + self.flush_interval - time.monotonic())
+
+    def flush_if_due(self):
+        if self._unflushed and self.flush_delay() == 0:
+            self.flush()
 
-    def save_checkpoint(self, chapter_url):
-        with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
-            f.write(chapter_url)
+    def flush(self):
+        if self._novel is None or not self._unflushed:
+            return
+        if self.store is not None:
+            self.store.flush()
+        _fsync(self._novel)
+        _fsync(self._journal)
+        if self.state is not None:
+            self.state.commit()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def _close_files(self):
+        if self._novel is not None:
+            self.flush()
+            self._novel.close()
+            self._journal.close()
+            self._novel = self._journal = None
+
+    def close(self):
+        self._close_files()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def load_checkpoint(self):
-        if os.path.exists(self.checkpoint_file):
-            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+        """
+        返回最后一个已持久化章节的 URL。本书没有日志时兼容旧版按域名记录的断点，
+        调用方只在该 URL 出现在本书目录中时才使用它。
+        """
+        if self._last_record:
+            return self._last_record.get("url")
+        journal_file, last_url_file = self.legacy_checkpoint_files
+        if journal_file != self.checkpoint_file:
+            record = self._read_journal(journal_file)
+            if record:
+                return record.get("url")
+        if os.path.exists(last_url_file):
+            with open(last_url_file, 'r', encoding='utf-8') as f:
                 return f.read().strip()
         return None
+
+    def record_failure(self, index, chapter, reason):
+        """将最终失败的章节追加到失败清单（JSON Lines），便于事后补抓。"""
+        record = {
+            "index": index,
+            "title": chapter["title"],
+            "url": chapter["url"],
+            "reason": reason,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+        with open(self.failures_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self.state is not None:
+            self.state.mark_failed(chapter["url"], reason)
+
+    def load_failures(self):
+        """读取失败清单，返回 {url: 最后一条记录}（按首次出现的顺序）。"""
+        failures = {}
+        try:
+            with open(self.failures_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    failures[record["url"]] = record
+        except FileNotFoundError:
+            pass
+        return failures
+
+    def _rewrite_failures(self, resolved):
+        """从失败清单中去掉已补抓成功的章节，每个 URL 只保留最后一条记录。"""
+        remaining = [r for url, r in self.load_failures().items() if url not in resolved]
+        if not remaining:
+            if os.path.exists(self.failures_file):
+                os.remove(self.failures_file)
+            return
+        tmp_path = self.failures_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in remaining:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.failures_file)
+
+    def patch_chapters(self, chapters):
+        """
+        把小说文件中失败章节的占位行替换为补抓到的正文，chapters 为 {url: chapter}；
+        返回实际替换的 URL 集合。新的小说文件与日志（最后一条记录的 offset 随之改变）
+        写好并落盘后，创建提交标记再替换，崩溃时由 _finish_patch 完成或丢弃。
+        找不到占位的章节说明上次替换后未来得及提交状态，同样记为已写入。
+        日志最后一条记录的时间改为替换时间，写入时间不晚于它，恢复时才不会被撤销。
+        启用章节库时先修补库中的占位章节并落盘，小说文件替换完成后再压缩章节库回收旧记录。
+        """
+        if not chapters or not os.path.exists(self.filepath):
+            return set()
+        self._close_files()
+        store_patched = self._patch_store(chapters) if self.store is not None else 0
+        now = time.time()
+        patched = self._patch_novel(chapters, now)
+        if not patched:
+            now = (self._last_record or {}).get("time", now)
+        if self.state is not None:
+            for url in chapters:
+                self.state.mark_written(url, now)
+            self.state.commit()
+        self._rewrite_failures(chapters)
+        if store_patched:
+            self.store.compact()
+        return patched
+
+    def _patch_store(self, chapters):
+        """把章节库中仍是失败占位的章节改写为补抓到的正文（put 原地改写索引），返回改写的章数。"""
+        slots = [
+            (slot, chapters[record["url"]]) for slot, record in enumerate(self.store)
+            if record["url"] in chapters and record["content"] == FAILED_PLACEHOLDER.format(url=record["url"])
+        ]
+        for slot, chapter in slots:
+            self.store.put(slot, chapter)
+        if slots:
+            self.store.flush()
+        return len(slots)
+
+    def _patch_novel(self, chapters, now):
+        """替换小说文件中的占位行并同步日志，返回替换的 URL 集合。"""
+        placeholders = {FAILED_PLACEHOLDER.format(url=url): ch for url, ch in chapters.items()}
+        marker, ((tmp_novel, _), (tmp_journal, _)) = self._patch_files()
+
+        patched = set()
+        with open(self.filepath, "r", encoding="utf-8", newline="") as src, \
+                open(tmp_novel, "w", encoding="utf-8", newline="") as dst:
+            for line in src:
+                chapter = placeholders.get(line.rstrip("\n"))
+                if chapter is None:
+                    dst.write(line)
+                else:
+                    dst.write(chapter["content"] + "\n")
+                    patched.add(chapter["url"])
+            _fsync(dst)
+        if not patched:
+            os.remove(tmp_novel)
+            return patched
+
+        record = dict(self._last_record or {}, offset=os.path.getsize(tmp_novel), time=now)
+        if record.get("url") in patched:
+            record.pop("failed", None)
+        with open(tmp_journal, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            _fsync(f)
+        with open(marker, "wb") as f:
+            _fsync(f)
+        self._finish_patch()
+        self._last_record = record
+        self._offset = record["offset"]
+        return patched
+
+
+class ChapterPatcher:
+    """
+    补抓失败章节时代替 ChapterWriter 交给下载流水线：收集补抓成功的正文，
+    close() 时由 ChapterWriter.patch_chapters 原地替换占位；仍然失败的章节只记入失败清单，占位保持不变。
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.domain = writer.domain
+        self.novel_title = writer.novel_title
+        self.state = writer.state
+        self.failures_file = writer.failures_file
+        self.chapters = {}
+
+    def append_chapter(self, index, chapter):
+        if not chapter.get("failed"):
+            self.chapters[chapter["url"]] = chapter
+
+    def record_failure(self, index, chapter, reason):
+        self.writer.record_failure(index, chapter, reason)
+
+    def flush_delay(self):
+        return None
+
+    def flush_if_due(self):
+        pass
+
+    def close(self):
+        patched = self.writer.patch_chapters(self.chapters)
+        if patched:
+            logger.info(f"🩹 {self.novel_title}：{len(patched)} 个失败章节补抓成功，已替换占位")
@@ -1,4 +1,17 @@
 # novel_crawler/cleaner.py
+"""
+正文清洗。
+
+全局清洗规则（CLEAN_RULES）与书源中的 ## 规则合并为一个 CleaningEngine，
+每段文本最多只做一次正则扫描：
+- 以固定文字开头的规则先用子串查找预筛（str 的 in 远快于正则逐位置匹配），
+  文本中不含其开头文字的规则不可能匹配，直接略过；
+- 剩下可能匹配的规则（连同无法预筛的规则）合并成一个交替正则，一次替换完成；
+  各种组合的合并正则按需编译并缓存。
+绝大多数章节不含广告，只需几次子串查找即可返回。
+含全局内联标志（如开头的 (?i)）、命名分组或反向引用的规则放进交替正则后会报错或改变含义，
+这类规则单独编译，在合并正则之后逐条替换；构建时就编译全部规则的合并正则，确保不会在抓取时才出错。
+"""
 import re
 
 CLEAN_RULES = [
@@ -8,7 +21,108 @@ CLEAN_RULES = [
     r'未完待续.*'
 ]
 
-def clean_content(text):
-    for rule in CLEAN_RULES:
-        text = re.sub(rule, '', text)
+COMPILED_RULES = [re.compile(rule) for rule in CLEAN_RULES]
+
+_META_CHARS = set(".^$*+?{}[]\\|()")
+_QUANTIFIERS = set("*+?{")
+# 全局内联标志 (?i)、命名分组 (?P<name>…)/(?P=name)、条件分组 (?(1)…) 与 \1 式反向引用
+_UNMERGEABLE = re.compile(r"\(\?[aiLmsux]+\)|\(\?P[<=]|\(\?\(|(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+def _mergeable(pattern):
+    """规则能否放进交替正则：不含全局标志、命名分组与反向引用。"""
+    return not _UNMERGEABLE.search(pattern)
+
+
+def _literal_prefix(pattern):
+    """规则开头的固定文字；规则以元字符开头或含有 | 时返回空串。"""
+    if "|" in pattern:
+        return ""
+    prefix = []
+    for ch in pattern:
+        if ch in _META_CHARS:
+            if ch in _QUANTIFIERS and prefix:
+                prefix.pop()  # 被量词修饰的最后一个字可能不出现
+            break
+        prefix.append(ch)
+    return "".join(prefix)
+
+
+class CleaningEngine:
+    """多条清洗正则的合并结果，一次扫描完成全部替换。"""
+
+    def __init__(self, patterns):
+        patterns = list(patterns)
+        self.patterns = [p for p in patterns if _mergeable(p)]
+        self._merged = {}
+        try:
+            # 合并正则的任意子集都只是少了几个分支，全集能编译，按需编译的各种组合也都能编译
+            self.regex
+        except re.error:
+            self.patterns = []
+            self._merged = {}
+        # 不能合并的规则，在合并正则之后逐条替换
+        self.separate = [re.compile(p) for p in patterns if p not in self.patterns]
+        self.prefixed = []      # [(开头文字, 规则序号)]
+        self.always = []        # 无法预筛、每次都要参与的规则序号
+        for idx, pattern in enumerate(self.patterns):
+            literal = _literal_prefix(pattern)
+            if literal:
+                self.prefixed.append((literal, idx))
+            else:
+                self.always.append(idx)
+
+    def _regex(self, indexes):
+        regex = self._merged.get(indexes)
+        if regex is None:
+            # 保持规则原有顺序，同一位置多条规则都能匹配时与全部合并的结果相同
+            regex = re.compile("|".join(f"(?:{self.patterns[i]})" for i in indexes))
+            self._merged[indexes] = regex
+        return regex
+
+    def _candidates(self, text):
+        """可能在 text 中匹配的规则序号；为空表示无需正则扫描。"""
+        hits = [idx for literal, idx in self.prefixed if literal in text]
+        if not hits:
+            return tuple(self.always)
+        return tuple(sorted(hits + self.always))
+
+    def sub(self, text):
+        """删除所有规则匹配到的内容（不去首尾空白）。"""
+        indexes = self._candidates(text)
+        if indexes:
+            text = self._regex(indexes).sub("", text)
+        for regex in self.separate:
+            text = regex.sub("", text)
+        return text
+
+    @property
+    def regex(self):
+        """全部可合并规则组成的交替正则（不含 separate 中的规则）；没有时为 None。"""
+        return self._regex(tuple(range(len(self.patterns)))) if self.patterns else None
+
+    def clean(self, text):
+        return self.sub(text).strip()
+
+    def clean_batch(self, texts):
+        """
+        一次清洗多段文本。每段只需几次子串预筛，拼接成一个大文本反而会让整批都用上
+        所有命中规则的合并正则，实测更慢，因此逐段处理。
+        """
+        return [self.clean(t) for t in texts]
+
+
+DEFAULT_ENGINE = CleaningEngine(CLEAN_RULES)
+
+
+def clean_content(text, rules=DEFAULT_ENGINE):
+    """rules 可以是 CleaningEngine，也可以是旧式的已编译正则列表（逐条替换）。"""
+    if isinstance(rules, CleaningEngine):
+        return rules.clean(text)
+    for rule in rules:
+        text = rule.sub('', text)
     return text.strip()
+
+
+def clean_batch(texts, engine=DEFAULT_ENGINE):
+    return engine.clean_batch(texts)
@@ -0,0 +1,125 @@
+# novel_crawler/compiled_source.py
+import re
+
+from cleaner import CLEAN_RULES, CleaningEngine
+from html_parser import compile_selector
+from logger import logger
+
+NEXT_LINK_TEXTS = ["下一页", "Next", "next"]
+
+# 以 #id 开头、不含选择器列表与兄弟组合符的章节列表选择器，可以只解析该 id 的子树
+_SCOPE_ID = re.compile(r"^#(-?[A-Za-z_][\w-]*)(?=[\s>.\[:]|$)")
+_ATTR_NAME = re.compile(r"^[A-Za-z_][\w-]*$")
+
+
+def parse_booksource_selector(selector: str):
+    main_part, *filters = selector.split("##")
+    if "@textNodes" in main_part:
+        css_selector = main_part.replace("@textNodes", "")
+        filter_type = "textNodes"
+    elif "@text" in main_part:
+        css_selector = main_part.replace("@text", "")
+        filter_type = "text"
+    else:
+        css_selector = main_part
+        filter_type = "text"
+    return css_selector.strip(), filter_type, filters
+
+
+def parse_next_toc_rule(rule):
+    """
+    解析 ruleToc.nextTocUrl，返回 (CSS 选择器, 取地址的属性)，如 "#pages option@value"；
+    未写属性时取 href。JS 规则不支持，返回 (None, None)。
+    """
+    rule = (rule or "").strip()
+    if not rule or rule.startswith("<js>") or "@js:" in rule or "{{" in rule:
+        return None, None
+    css, sep, attr = rule.rpartition("@")
+    if sep and _ATTR_NAME.match(attr):
+        return css.strip() or None, attr
+    return rule, "href"
+
+
+def compile_filters(filters, base_rules=CLEAN_RULES):
+    """
+    将书源中的多个 ## 清洗规则与全局 CLEAN_RULES 合并为一个 CleaningEngine，一次扫描完成替换。
+    无法编译的规则会被跳过并记录警告；能单独编译但不能放进交替正则的规则由 CleaningEngine 逐条替换。
+    """
+    valid = []
+    for f in filters:
+        if not f:
+            continue
+        try:
+            re.compile(f)
+        except re.error as e:
+            logger.warning(f"⚠️ 忽略无效的清洗规则 {f!r}: {e}")
+            continue
+        valid.append(f)
+    return CleaningEngine(valid + list(base_rules))
+
+
+class CompiledBookSource:
+    """
+    书源规则的编译结果：每个书源只构建一次，在所有章节与分页之间复用。
+    保存预编译的 CSS 选择器（含章节列表可限定的子树 id 与目录分页规则）、合并了 ## 规则与全局清洗规则的 CleaningEngine 与“下一页”匹配器。
+    """
+
+    def __init__(self, book_source: dict):
+        self.source = book_source
+
+        rule_content = book_source.get("ruleContent", {}).get("content", "")
+        css, self.content_type, filters = parse_booksource_selector(rule_content)
+        self.content_css = css
+        self.content_selector = compile_selector(css) if css else None
+        self.cleaner = compile_filters(filters)
+
+        rule_toc = book_source.get("ruleToc", {})
+        chapter_list = rule_toc.get("chapterList")
+        self.chapter_list_css = chapter_list
+        self.chapter_list_selector = compile_selector(chapter_list) if chapter_list else None
+        scope = _SCOPE_ID.match(chapter_list or "")
+        self.chapter_list_scope = (
+            scope.group(1) if scope and not any(c in chapter_list for c in ",+~") else None
+        )
+        self.chapter_name = rule_toc.get("chapterName", "text")
+        self.chapter_url = rule_toc.get("chapterUrl", "href")
+        self.chapter_name_selector = (
+            compile_selector(self.chapter_name) if self.chapter_name != "text" else None
+        )
+        self.chapter_url_selector = (
+            compile_selector(self.chapter_url) if self.chapter_url != "href" else None
+        )
+        self.next_toc_css, self.next_toc_attr = parse_next_toc_rule(rule_toc.get("nextTocUrl"))
+        self.next_toc_selector = (
+            compile_selector(self.next_toc_css) if self.next_toc_css else None
+        )
+
+        self.next_link_patterns = [
+            re.compile(r"^\s*" + re.escape(text) + r"\s*$") for text in NEXT_LINK_TEXTS
+        ]
+
+    @property
+    def name(self):
+        return self.source.get("bookSourceName")
+
+    def get(self, key, default=None):
+        return self.source.get(key, default)
+
+    def filter_content(self, text):
+        """对单个分页的正文一次性应用全部清洗规则（全局规则只作用于行内，逐页处理与整章处理结果相同）。"""
+        return self.cleaner.sub(text)
+
+    def clean(self, text):
+        """拼接后的整章正文：各分页已在 filter_content 中清洗，这里只去掉首尾空白。"""
+        return text.strip()
+
+    def clean_batch(self, texts):
+        """一次清洗多段未经 filter_content 处理的正文。"""
+        return self.cleaner.clean_batch(texts)
+
+
+def compile_book_source(book_source):
+    """接受原始书源字典或已编译对象，始终返回 CompiledBookSource。"""
+    if isinstance(book_source, CompiledBookSource):
+        return book_source
+    return CompiledBookSource(book_source)
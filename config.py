@@ -1,8 +1,8 @@
 # novel_crawler/config.py
 
 import os
+import threading
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # 加载 .env
 load_dotenv()
@@ -12,18 +12,47 @@ LLM_API_KEY = os.getenv("LLM_API_KEY")
 LLM_BASE_URL = os.getenv("LLM_BASE_URL")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
 
-if not LLM_API_KEY or not LLM_BASE_URL:
-    raise ValueError("❌ 请设置 LLM_API_KEY 和 LLM_BASE_URL")
+# 并行生成多套候选规则时轮流使用的模型与温度（逗号分隔）
+LLM_CANDIDATE_MODELS = [
+    m.strip() for m in os.getenv("LLM_CANDIDATE_MODELS", "").split(",") if m.strip()
+] or [LLM_MODEL]
+LLM_CANDIDATE_TEMPERATURES = [
+    float(t) for t in os.getenv("LLM_CANDIDATE_TEMPERATURES", "0.7,0.2,1.0").split(",") if t.strip()
+] or [0.7]
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    首次调用 AI 时才导入 openai 并创建客户端（支持 OpenAI、DashScope、Moonshot 等兼容平台），
+    书源已存在、无需 AI 的抓取不要求配置 LLM_API_KEY，也不必承担导入 openai 的耗时。
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if not LLM_API_KEY or not LLM_BASE_URL:
+                raise ValueError("❌ 请设置 LLM_API_KEY 和 LLM_BASE_URL")
+            from openai import OpenAI
+
+            _client = OpenAI(
+                api_key=LLM_API_KEY,
+                base_url=LLM_BASE_URL.rstrip("/")
+            )
+        return _client
+
+
+def __getattr__(name):
+    # 兼容旧代码中的 config.client
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# 创建 OpenAI 客户端实例（支持 OpenAI、DashScope、Moonshot 等兼容平台）
-client = OpenAI(
-    api_key=LLM_API_KEY,
-    base_url=LLM_BASE_URL.rstrip("/")
-)
 
 def get_chat_completion(messages, model=None, temperature=0.7):
     """封装统一的 chat.completions 接口"""
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model or LLM_MODEL,
         messages=messages,
         temperature=temperature
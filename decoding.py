@@ -0,0 +1,128 @@
+# novel_crawler/decoding.py
+"""
+页面编码识别的快速路径。
+
+按可信度依次尝试，只有前面都无法确定时才做整页字符集检测（charset_normalizer）：
+1. HTTP 响应头 Content-Type 中的 charset；
+2. 页面开头 <meta charset> / <meta http-equiv="Content-Type"> 中声明的编码；
+3. 同一站点上一页识别出的编码（按域名记忆）；
+4. 能按 UTF-8 解码即为 UTF-8。
+每一步得到的编码都先解码验证：允许个别损坏字节（很多站点页面里夹着少量坏字），
+替换字符超过 MAX_BAD_RATIO 时认为声明与实际不符，继续往下尝试。
+gb2312 / gbk 统一按其超集 gb18030 解码，避免生僻字被替换为乱码。
+
+iso-8859-1、windows-1252 等单字节编码能“解码”任意字节，验证对它们没有意义，
+而中文站点把 GBK / UTF-8 页面误声明为这类编码很常见：声明为单字节编码时改为严格验证
+UTF-8 与 gb18030，都不成立则交给整页检测；单字节编码也不会被记为站点编码。
+"""
+import codecs
+import re
+import threading
+
+META_SNIFF_BYTES = 4096
+MAX_BAD_RATIO = 0.001       # 可容忍的替换字符比例
+MIN_BAD_ALLOWED = 8
+
+_HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I)
+_META_CHARSET = re.compile(
+    rb"<meta[^>]+?charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I
+)
+_SUPERSETS = {"gb2312": "gb18030", "gbk": "gb18030"}
+_SINGLE_BYTE_PREFIXES = ("iso8859-", "cp125", "mac-", "koi8-")
+_SINGLE_BYTE_ALTERNATIVES = ("utf-8", "gb18030")
+
+_domain_encodings = {}
+_lock = threading.Lock()
+
+
+def normalize_encoding(name):
+    """规范化编码名；Python 不认识的编码返回 None。"""
+    if not name:
+        return None
+    try:
+        name = codecs.lookup(name.strip().lower()).name
+    except LookupError:
+        return None
+    return _SUPERSETS.get(name, name)
+
+
+def header_encoding(content_type):
+    match = _HEADER_CHARSET.search(content_type or "")
+    return normalize_encoding(match.group(1)) if match else None
+
+
+def meta_encoding(body):
+    match = _META_CHARSET.search(body[:META_SNIFF_BYTES])
+    return normalize_encoding(match.group(1).decode("ascii", "ignore")) if match else None
+
+
+def is_single_byte(encoding):
+    """编码名（已规范化）是否为能解码任意字节的单字节编码。"""
+    return encoding.startswith(_SINGLE_BYTE_PREFIXES)
+
+
+def _decodes(body, encoding, strict=False):
+    try:
+        body.decode(encoding)
+        return True
+    except UnicodeDecodeError:
+        if strict:
+            return False
+    except LookupError:
+        return False
+    text = body.decode(encoding, errors="replace")
+    return text.count("\ufffd") <= max(MIN_BAD_ALLOWED, len(text) * MAX_BAD_RATIO)
+
+
+def remember_encoding(domain, encoding):
+    if is_single_byte(encoding):
+        return
+    with _lock:
+        _domain_encodings[domain] = encoding
+
+
+def remembered_encoding(domain):
+    return _domain_encodings.get(domain)
+
+
+def full_detect(body):
+    """整页字符集检测，与原先 requests 的 apparent_encoding 相同。"""
+    from charset_normalizer import detect  # 只在快速路径失败时需要，按需导入
+
+    return normalize_encoding(detect(body).get("encoding")) or "utf-8"
+
+
+def sniff_encoding(body, content_type=None, domain=None):
+    """
+    只走快速路径（响应头、meta、站点记忆、UTF-8），无法确定时返回 None。
+    确定后记住该站点的编码。声明为单字节编码时只接受严格解码成功的 UTF-8 或 gb18030，
+    否则返回 None，由整页检测决定。
+    """
+    candidates = (
+        header_encoding(content_type),
+        meta_encoding(body),
+        remembered_encoding(domain) if domain else None,
+        "utf-8",
+    )
+    for encoding in candidates:
+        if not encoding:
+            continue
+        if is_single_byte(encoding):
+            encoding = next((e for e in _SINGLE_BYTE_ALTERNATIVES if _decodes(body, e, strict=True)), None)
+            if encoding is None:
+                return None
+        if _decodes(body, encoding):
+            if domain:
+                remember_encoding(domain, encoding)
+            return encoding
+    return None
+
+
+def detect_encoding(body, content_type=None, domain=None):
+    """快速路径失败时退回整页检测，总是返回一个编码。"""
+    encoding = sniff_encoding(body, content_type, domain)
+    if encoding is None:
+        encoding = full_detect(body)
+        if domain:
+            remember_encoding(domain, encoding)
+    return encoding
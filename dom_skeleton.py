@@ -0,0 +1,201 @@
+# novel_crawler/dom_skeleton.py
+"""
+DOM 骨架压缩，用于缩短发给 LLM 的 HTML。
+
+- 只保留 id、class、href、title 属性；
+- 连续重复的同构兄弟节点（如目录中的上千个 <dd><a>）只保留前几个与最后一个，
+  中间替换为 <!-- 省略 N 个相同结构 --> 占位；正文中“文字 + <br>”交替的段落同样折叠；
+- 过长的文本节点截断为开头若干字并注明总字数。
+
+structural_fingerprint() 去掉全部文本与 href，只按标签、id、class 与折叠后的结构
+计算哈希：同一模板生成的页面（同站点的不同书、不同章节）得到相同的指纹。
+
+节点树由 html_parser.parse_html() 的解析结果转换而来，与正文抽取使用同一个解析引擎，
+推断出的选择器（selector_inference）对应的正是抽取时看到的树结构。
+"""
+import hashlib
+import re
+
+from html_parser import parse_html
+
+KEEP_ATTRS = ("id", "class", "href", "title")
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+KEEP_HEAD = 3       # 重复节点保留前几个
+KEEP_TAIL = 1       # 以及最后几个
+MAX_TEXT = 30       # 文本节点超过这么多字时截断
+MAX_PERIOD = 4      # 识别的最长重复周期（如 文字 <br> <br>）
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "text", "parent")
+
+    def __init__(self, tag, attrs=(), text=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.text = text
+        self.parent = parent
+
+    def get(self, name, default=None):
+        for key, value in self.attrs:
+            if key == name:
+                return value
+        return default
+
+    def elements(self):
+        """子元素（不含文本节点）。"""
+        return [c for c in self.children if c.tag is not None]
+
+    def iter(self):
+        """深度优先遍历自身及所有后代元素。"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.tag is not None:
+                yield node
+                stack.extend(reversed(node.children))
+
+    def text_content(self):
+        return "".join(n.text for n in self._text_nodes())
+
+    def _text_nodes(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.tag is None:
+                yield node
+            else:
+                stack.extend(reversed(node.children))
+
+    def signature(self):
+        """用于判断兄弟节点是否“同构”：标签 + class + 子节点的标签序列。"""
+        if self.tag is None:
+            return "#text"
+        classes = dict(self.attrs).get("class", "")
+        return (self.tag, classes, tuple(c.tag for c in self.children))
+
+
+def parse_tree(html):
+    """把解析引擎构建的文档转换为轻量节点树（只保留 KEEP_ATTRS 属性，跳过脚本与样式）。"""
+    root = _Node("#root")
+    stack = [root]
+    skipping = 0
+    for kind, value, attrs in parse_html(html).events():
+        if kind == "start":
+            if skipping or value in SKIP_TAGS:
+                skipping += 1
+                continue
+            node = _Node(
+                value, tuple((k, v) for k, v in attrs.items() if k in KEEP_ATTRS), parent=stack[-1]
+            )
+            stack[-1].children.append(node)
+            stack.append(node)
+        elif kind == "end":
+            if skipping:
+                skipping -= 1
+            else:
+                stack.pop()
+        elif not skipping:
+            text = _WHITESPACE.sub(" ", value).strip()
+            if text:
+                stack[-1].children.append(_Node(None, text=text, parent=stack[-1]))
+    return root
+
+
+def _collapse_runs(children):
+    """
+    把连续重复的兄弟节点折叠为 (节点列表, 省略数) 片段。
+    同时识别周期为 1（<dd><dd><dd>）到 MAX_PERIOD（文字 <br><br> 文字 <br><br>）的重复。
+    """
+    signatures = [c.signature() for c in children]
+    segments = []
+    i = 0
+    n = len(children)
+    while i < n:
+        best_period, best_repeats = 1, 1
+        for period in range(1, MAX_PERIOD + 1):
+            repeats = 1
+            while (
+                i + (repeats + 1) * period <= n
+                and signatures[i + repeats * period:i + (repeats + 1) * period]
+                == signatures[i:i + period]
+            ):
+                repeats += 1
+            if repeats * period > best_repeats * best_period:
+                best_period, best_repeats = period, repeats
+        span = best_period * best_repeats
+        if best_repeats > KEEP_HEAD + KEEP_TAIL:
+            head = children[i:i + KEEP_HEAD * best_period]
+            tail = children[i + span - KEEP_TAIL * best_period:i + span]
+            omitted = best_repeats - KEEP_HEAD - KEEP_TAIL
+            segments.append((head, tail, omitted))
+        else:
+            segments.append((children[i:i + span], [], 0))
+        i += span
+    return segments
+
+
+def _attrs(node, with_href=True):
+    parts = []
+    for key, value in node.attrs:
+        if key == "href" and not with_href:
+            continue
+        parts.append(f' {key}="{value.replace(chr(34), "&quot;")}"')
+    return "".join(parts)
+
+
+def _render(node, out, fingerprint):
+    if node.tag is None:
+        if fingerprint:
+            return
+        text = node.text
+        if len(text) > MAX_TEXT:
+            text = f"{text[:MAX_TEXT]}…（共{len(text)}字）"
+        out.append(text)
+        return
+
+    if node.tag != "#root":
+        out.append(f"<{node.tag}{_attrs(node, with_href=not fingerprint)}>")
+    for head, tail, omitted in _collapse_runs(node.children):
+        for child in head:
+            _render(child, out, fingerprint)
+        if omitted:
+            # 指纹中不记录省略数量，章节多少不影响指纹
+            out.append("<!--…-->" if fingerprint else f"<!-- 省略 {omitted} 个相同结构 -->")
+        for child in tail:
+            _render(child, out, fingerprint)
+    if node.tag != "#root" and node.tag not in VOID_TAGS:
+        out.append(f"</{node.tag}>")
+
+
+def _fingerprint(root):
+    out = []
+    _render(root, out, fingerprint=True)
+    return hashlib.sha256("".join(out).encode("utf-8")).hexdigest()
+
+
+def skeleton(html):
+    """返回折叠重复节点、截断长文本后的 HTML 骨架。"""
+    out = []
+    _render(parse_tree(html), out, fingerprint=False)
+    return "".join(out)
+
+
+def structural_fingerprint(html):
+    """只依赖页面模板结构（标签、id、class）的哈希。"""
+    return _fingerprint(parse_tree(html))
+
+
+def skeleton_and_fingerprint(html):
+    """只解析一次，同时返回骨架与结构指纹。"""
+    root = parse_tree(html)
+    out = []
+    _render(root, out, fingerprint=False)
+    return "".join(out), _fingerprint(root)
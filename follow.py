@@ -0,0 +1,177 @@
+# novel_crawler/follow.py
+"""
+追更模式：只抓取目录中新出现的章节。
+
+每本书在 checkpoints/follow/ 下保存一份目录指纹：目录页原文的哈希与已知章节 URL 列表。
+再次运行时先以条件请求获取目录页，原文哈希未变、目录没有分页且没有待补抓的失败章节时直接跳过（不解析）；
+否则解析全部目录分页，与已知 URL 集合做差集，只下载新增章节并追加到小说文件末尾。
+之前失败的章节每次都先重新抓取并原地替换占位。
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+from booksource_loader import find_book_source
+from chapter_writer import CHECKPOINTS_DIR
+from compiled_source import compile_book_source
+from logger import logger
+from pipeline import RetryQueue, refill_failed, run_download
+from state_store import book_key, failed_chapters, open_book
+from utils import extract_novel_title, fetch_html, get_domain, parse_toc
+
+FOLLOW_DIR = os.path.join(CHECKPOINTS_DIR, "follow")
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _state_path(toc_url):
+    return os.path.join(FOLLOW_DIR, f"{book_key(toc_url)}.json")
+
+
+def load_follow_state(toc_url):
+    try:
+        with open(_state_path(toc_url), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_follow_state(toc_url, state):
+    os.makedirs(FOLLOW_DIR, exist_ok=True)
+    path = _state_path(toc_url)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _bootstrap_known_urls(chapters, writer):
+    """首次进入追更模式时，用章节状态（或旧的 last_url 断点）推断已下载的章节。"""
+    written = writer.state.written_urls()
+    if written:
+        return written
+    last_url = writer.load_checkpoint()
+    if not last_url:
+        return set()
+    for idx, ch in enumerate(chapters):
+        if ch["url"] == last_url:
+            return {c["url"] for c in chapters[:idx + 1]}
+    return set()
+
+
+def follow_book(toc_url, **download_options):
+    """
+    检查一本书的目录并下载新增章节，返回新增章节数；无法处理时返回 None。
+    download_options 透传给 pipeline.run_download（engine、concurrency 等）。
+    """
+    domain = get_domain(toc_url)
+    book_source = find_book_source(toc_url)
+    if not book_source:
+        logger.error(f"❌ 追更模式需要已有书源，请先完整抓取一次：{toc_url}")
+        return None
+
+    state = load_follow_state(toc_url)
+
+    # ttl=0：每次都向服务器确认，缓存仅用于条件请求
+    toc_html = fetch_html(toc_url, cache_ttl=0)
+    if not toc_html:
+        logger.error(f"❌ 无法获取目录页：{toc_url}")
+        return None
+
+    rules = compile_book_source(book_source)
+    toc_hash = _digest(toc_html)
+    novel_title = (state or {}).get("novel_title") or extract_novel_title(toc_html, domain)
+    writer = None
+    # 只哈希了第一页：目录有分页时新章节可能只出现在后面的分页，不能据此跳过
+    if state and state.get("toc_hash") == toc_hash and rules.next_toc_selector is None:
+        writer = open_book(toc_url, novel_title)
+        if not failed_chapters(writer, []):
+            writer.close()
+            logger.info(f"💤 目录未变化，跳过：{novel_title}")
+            return 0
+
+    chapters = parse_toc(toc_url, rules, html=toc_html, cache_ttl=0)
+    if not chapters:
+        logger.error(f"❌ 未能提取到章节列表：{toc_url}")
+        if writer is not None:
+            writer.close()
+        return None
+
+    writer = writer or open_book(toc_url, novel_title)
+    writer.state.register(chapters)
+
+    urls = [ch["url"] for ch in chapters]
+    fingerprint = _digest("\n".join(urls))
+    if state is not None:
+        known = set(state.get("urls", []))
+    else:
+        known = _bootstrap_known_urls(chapters, writer)
+
+    new_chapters = [ch for ch in chapters if ch["url"] not in known]
+    removed = len(known - set(urls))
+    if removed:
+        logger.info(f"ℹ️ 目录中有 {removed} 个已知章节被删除或改名，不影响追更")
+
+    # 上次下载中途中断时，部分新章节已经写入
+    written = writer.state.written_urls()
+    pending = [ch for ch in new_chapters if ch["url"] not in written]
+
+    chapter_retries = download_options.pop("chapter_retries", 3)
+    failed = failed_chapters(writer, chapters)
+    if failed:
+        refill_failed(failed, rules, writer, retries=RetryQueue(max_retries=chapter_retries), **download_options)
+    if pending:
+        logger.info(f"🆕 {novel_title}：发现 {len(pending)} 个新章节")
+        run_download(
+            pending, 0, rules, writer,
+            retries=RetryQueue(max_retries=chapter_retries),
+            **download_options,
+        )
+    elif state and state.get("fingerprint") == fingerprint:
+        logger.info(f"💤 {novel_title}：章节列表未变化")
+    writer.close()
+
+    save_follow_state(toc_url, {
+        "toc_url": toc_url,
+        "novel_title": novel_title,
+        "toc_hash": toc_hash,
+        "fingerprint": fingerprint,
+        "urls": sorted(known | set(urls)),
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    return len(pending)
+
+
+def read_book_list(path):
+    """读取书单文件：每行一个目录页 URL，忽略空行与 # 注释；path 为 - 时读取标准输入。"""
+    if path == "-":
+        return _parse_book_list(sys.stdin)
+    with open(path, "r", encoding="utf-8") as f:
+        return _parse_book_list(f)
+
+
+def _parse_book_list(lines):
+    return [
+        line.strip() for line in lines
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+
+def watch_books(list_path, interval=3600, once=False, **download_options):
+    """按 interval（秒）轮询书单中的每本书；once=True 时只检查一轮。"""
+    while True:
+        started = time.monotonic()
+        total = 0
+        for toc_url in read_book_list(list_path):
+            try:
+                total += follow_book(toc_url, **dict(download_options)) or 0
+            except Exception:
+                logger.exception(f"❌ 追更失败：{toc_url}")
+        logger.info(f"📬 本轮追更完成，新增 {total} 章")
+        if once:
+            return
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
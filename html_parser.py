@@ -0,0 +1,321 @@
+# novel_crawler/html_parser.py
+"""
+可插拔的 HTML 解析层。
+
+抓取流程只通过 parse_html() 与 Node 接口访问 DOM：
+- bs4：BeautifulSoup + html.parser，纯 Python 实现，作为参考实现保留；
+- lxml：libxml2 解析 + cssselect 编译 CSS 选择器，速度快一个数量级。
+
+两者对书源中使用的 CSS 选择器与 @text/@textNodes 取文本语义保持一致，
+可用 benchmarks/check_parser_equivalence.py 在样本页面上对比。
+"""
+import re
+from functools import lru_cache
+
+from logger import logger
+
+try:
+    import lxml.html
+    from lxml import etree
+    from cssselect import HTMLTranslator
+except ImportError:  # lxml 引擎为可选依赖
+    lxml = None
+
+# bs4 的 get_text() 默认不返回这些标签内的文本
+_NON_TEXT_TAGS = {"script", "style", "template"}
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
+class Selector:
+    """
+    预编译的 CSS 选择器。各引擎的编译结果按需生成并缓存，
+    切换引擎后同一个 Selector 仍可复用。
+    """
+    __slots__ = ("css", "_bs4", "_xpath")
+
+    def __init__(self, css):
+        self.css = css
+        self._bs4 = None
+        self._xpath = None
+
+    @property
+    def bs4(self):
+        if self._bs4 is None:
+            import soupsieve  # 只在使用 bs4 引擎时导入
+
+            self._bs4 = soupsieve.compile(self.css)
+        return self._bs4
+
+    @property
+    def xpath(self):
+        if self._xpath is None:
+            self._xpath = _compile_css(self.css)
+        return self._xpath
+
+    def __repr__(self):
+        return f"Selector({self.css!r})"
+
+
+def compile_selector(css):
+    return css if isinstance(css, Selector) else Selector(css)
+
+
+class Bs4Node:
+    __slots__ = ("el",)
+
+    def __init__(self, el):
+        self.el = el
+
+    def select(self, css):
+        if isinstance(css, Selector):
+            return [Bs4Node(el) for el in css.bs4.select(self.el)]
+        return [Bs4Node(el) for el in self.el.select(css)]
+
+    def select_one(self, css):
+        if isinstance(css, Selector):
+            el = css.bs4.select_one(self.el)
+        else:
+            el = self.el.select_one(css)
+        return Bs4Node(el) if el is not None else None
+
+    def text(self, separator="", strip=False):
+        return self.el.get_text(separator=separator, strip=strip)
+
+    def get(self, attr):
+        value = self.el.get(attr)
+        if isinstance(value, list):  # class/rel 等多值属性
+            return " ".join(value)
+        return value
+
+    def links(self):
+        return [Bs4Node(a) for a in self.el.find_all("a", href=True)]
+
+    def find_link(self, pattern):
+        """返回第一个自身文本（bs4 的 .string）匹配 pattern 的 <a>。"""
+        el = self.el.find("a", string=pattern)
+        return Bs4Node(el) if el is not None else None
+
+    def parent(self):
+        parent = self.el.parent
+        return Bs4Node(parent) if parent is not None else None
+
+    def events(self):
+        """
+        按文档顺序产出 ("start", 标签, 属性) / ("text", 文本, None) / ("end", 标签, None)，
+        包含节点自身（文档根除外）；注释等非文本节点不产出。
+        """
+        from bs4.element import NavigableString, Tag
+
+        names = []
+        if self.el.name != "[document]":
+            yield "start", self.el.name, _bs4_attrs(self.el)
+            names.append(self.el.name)
+        stack = [iter(self.el.children)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                if names:
+                    yield "end", names.pop(), None
+            elif isinstance(child, Tag):
+                yield "start", child.name, _bs4_attrs(child)
+                names.append(child.name)
+                stack.append(iter(child.children))
+            elif type(child) is NavigableString:
+                yield "text", str(child), None
+
+    def title(self):
+        title = self.el.title
+        return title.string if title is not None else None
+
+    def remove_tags(self, names):
+        for tag in self.el(names):
+            tag.decompose()
+
+    def body(self):
+        body = self.el.find("body")
+        return Bs4Node(body) if body is not None else None
+
+    def html(self):
+        return str(self.el)
+
+
+def _bs4_attrs(el):
+    return {
+        key: " ".join(value) if isinstance(value, list) else value or ""
+        for key, value in el.attrs.items()
+    }
+
+
+class Bs4Engine:
+    name = "bs4"
+
+    def __init__(self):
+        # bs4 与 soupsieve 导入约需 0.1 秒，使用 lxml 引擎时不导入
+        from bs4 import BeautifulSoup
+
+        self._soup = BeautifulSoup
+
+    def parse(self, html, scope_id=None):
+        if scope_id:
+            # 只构建 id 为 scope_id 的子树，其余节点在解析时直接丢弃
+            from bs4 import SoupStrainer
+
+            return Bs4Node(self._soup(html, "html.parser", parse_only=SoupStrainer(id=scope_id)))
+        return Bs4Node(self._soup(html, "html.parser"))
+
+
+@lru_cache(maxsize=512)
+def _compile_css(css):
+    return etree.XPath(HTMLTranslator().css_to_xpath(css))
+
+
+def _iter_strings(el):
+    """按文档顺序产出元素内的文本节点，规则与 bs4 get_text() 一致。"""
+    if isinstance(el.tag, str) and el.tag not in _NON_TEXT_TAGS:
+        if el.text:
+            yield el.text
+        for child in el:
+            yield from _iter_strings(child)
+            if child.tail:
+                yield child.tail
+
+
+def _single_string(el):
+    """与 bs4 的 Tag.string 相同：仅有唯一子节点时向下取文本，否则为 None。"""
+    while True:
+        children = len(el)
+        if children == 0:
+            return el.text
+        if children > 1 or el.text or el[0].tail:
+            return None
+        el = el[0]
+        if not isinstance(el.tag, str):
+            return el.text
+
+
+class LxmlNode:
+    __slots__ = ("el",)
+
+    def __init__(self, el):
+        self.el = el
+
+    def select(self, css):
+        xpath = css.xpath if isinstance(css, Selector) else _compile_css(css)
+        return [LxmlNode(el) for el in xpath(self.el)]
+
+    def select_one(self, css):
+        xpath = css.xpath if isinstance(css, Selector) else _compile_css(css)
+        found = xpath(self.el)
+        return LxmlNode(found[0]) if found else None
+
+    def text(self, separator="", strip=False):
+        strings = _iter_strings(self.el)
+        if strip:
+            strings = (s.strip() for s in strings)
+            strings = (s for s in strings if s)
+        return separator.join(strings)
+
+    def get(self, attr):
+        return self.el.get(attr)
+
+    def links(self):
+        return [LxmlNode(a) for a in self.el.iter("a") if a.get("href") is not None]
+
+    def find_link(self, pattern):
+        for a in self.el.iter("a"):
+            string = _single_string(a)
+            if string is not None and pattern.search(string):
+                return LxmlNode(a)
+        return None
+
+    def parent(self):
+        parent = self.el.getparent()
+        return LxmlNode(parent) if parent is not None else None
+
+    def events(self):
+        """与 Bs4Node.events 相同的事件序列。"""
+        stack = [("element", self.el)]
+        while stack:
+            kind, item = stack.pop()
+            if kind != "element":
+                yield kind, item, None
+                continue
+            if not isinstance(item.tag, str):  # 注释与处理指令
+                continue
+            yield "start", item.tag, {key: value or "" for key, value in item.attrib.items()}
+            stack.append(("end", item.tag))
+            for child in reversed(item):
+                if child.tail:
+                    stack.append(("text", child.tail))
+                stack.append(("element", child))
+            if item.text:
+                stack.append(("text", item.text))
+
+    def title(self):
+        title = self.el.find(".//title")
+        return _single_string(title) if title is not None else None
+
+    def remove_tags(self, names):
+        for el in list(self.el.iter(*names)):
+            el.drop_tree()
+
+    def body(self):
+        body = self.el.find(".//body")
+        return LxmlNode(body) if body is not None else None
+
+    def html(self):
+        return lxml.html.tostring(self.el, encoding="unicode")
+
+
+class LxmlEngine:
+    name = "lxml"
+
+    def parse(self, html, scope_id=None):
+        # lxml 不接受带编码声明的 str，且空文档会抛错
+        html = _XML_DECLARATION.sub("", html)
+        if not html.strip():
+            html = "<html></html>"
+        doc = lxml.html.document_fromstring(html)
+        if scope_id:
+            # libxml2 解析整页很快，之后的选择只在该子树内进行
+            el = doc.get_element_by_id(scope_id, None)
+            if el is not None:
+                return LxmlNode(el)
+        return LxmlNode(doc)
+
+
+ENGINES = {"bs4": Bs4Engine, "lxml": LxmlEngine}
+
+_engine = None
+
+
+def set_parser(name="auto"):
+    """
+    选择全局解析引擎：bs4、lxml 或 auto（已安装 lxml 时使用 lxml）。
+    """
+    global _engine
+    if name == "auto":
+        name = "lxml" if lxml is not None else "bs4"
+    if name not in ENGINES:
+        raise ValueError(f"未知的解析引擎: {name}")
+    if name == "lxml" and lxml is None:
+        raise ImportError("❌ lxml 引擎需要 lxml 与 cssselect，请先执行 pip install lxml cssselect")
+    _engine = ENGINES[name]()
+    logger.info(f"🧩 HTML 解析引擎：{name}")
+    return _engine
+
+
+def get_parser():
+    global _engine
+    if _engine is None:
+        _engine = Bs4Engine()
+    return _engine
+
+
+def parse_html(html, scope_id=None):
+    """
+    解析页面。scope_id 不为空时只需要 id 为 scope_id 的子树（以 #scope_id 开头的选择器仍可匹配）：
+    bs4 引擎只构建该子树，lxml 引擎返回该元素。
+    """
+    return (_engine or get_parser()).parse(html, scope_id)
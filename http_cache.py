@@ -0,0 +1,242 @@
+# novel_crawler/http_cache.py
+"""
+持久化的 HTTP 响应磁盘缓存。
+
+以 URL 的 sha256 为键，每条记录保存正文字节、解码所用编码以及 ETag/Last-Modified。
+不同资源使用不同的有效期：目录页很快过期，章节页一周后过期；
+过期但带校验头的记录通过条件请求（If-None-Match / If-Modified-Since）重新验证。
+响应在解析前就已写入，正文规则匹配不到的页面（反爬验证页、截断的页面等）由抓取方调用 discard() 删除，
+重试时重新请求，不会把坏页面一直留在缓存里。
+总大小超过上限时按最近使用时间（文件 mtime）淘汰。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from decoding import detect_encoding
+from logger import logger
+
+CACHE_DIR = os.path.join("cache", "http")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 各类资源的有效期（秒），None 表示永不过期
+TOC_TTL = 10 * 60
+CHAPTER_TTL = 7 * 24 * 3600
+
+
+def decode_body(body, encoding=None):
+    """按记录的编码解码正文；编码未知（None）时先识别（decoding.detect_encoding）。"""
+    if not encoding:
+        encoding = detect_encoding(body)
+    return body.decode(encoding, errors="replace")
+
+
+class CacheEntry:
+    __slots__ = ("cache", "key", "meta")
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+
+    def is_fresh(self, ttl):
+        if ttl is None:
+            return True
+        return time.time() - self.meta["stored_at"] < ttl
+
+    def validators(self):
+        """用于条件请求的请求头。"""
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+    def body(self):
+        try:
+            with open(self.cache._path(self.key, ".body"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def text(self):
+        body = self.body()
+        if body is None:
+            return None
+        return decode_body(body, self.meta.get("encoding"))
+
+
+class HttpCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None  # 首次写入时扫描目录得到
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, url):
+        key = self._key(url)
+        meta_path = self._path(key, ".json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        self._touch(meta_path)
+        return CacheEntry(self, key, meta)
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _atomic_write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, url, body, encoding, headers=None):
+        headers = headers or {}
+        key = self._key(url)
+        meta = {
+            "url": url,
+            "encoding": encoding,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "size": len(body),
+        }
+        body_path = self._path(key, ".body")
+        try:
+            old_size = os.path.getsize(body_path)
+        except OSError:
+            old_size = 0
+        # 先写正文再写元数据，读取方只认元数据存在的记录
+        self._atomic_write(body_path, body)
+        self._atomic_write(
+            self._path(key, ".json"),
+            json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        )
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            else:
+                self._total += len(body) - old_size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def discard(self, url):
+        """删除 url 的缓存记录（不存在时什么都不做）。"""
+        key = self._key(url)
+        size = 0
+        for suffix in (".json", ".body"):
+            path = self._path(key, suffix)
+            try:
+                if suffix == ".body":
+                    size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                pass
+        if size:
+            with self._lock:
+                if self._total is not None:
+                    self._total -= size
+
+    def refresh(self, entry, headers=None):
+        """304 Not Modified 后刷新存储时间与校验头。"""
+        headers = headers or {}
+        entry.meta["stored_at"] = time.time()
+        if headers.get("ETag"):
+            entry.meta["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            entry.meta["last_modified"] = headers["Last-Modified"]
+        self._atomic_write(
+            self._path(entry.key, ".json"),
+            json.dumps(entry.meta, ensure_ascii=False).encode("utf-8"),
+        )
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if item.name.endswith(".body"):
+                    yield item
+
+    def _scan_total(self):
+        return sum(item.stat().st_size for item in self._iter_entries())
+
+    def _evict(self):
+        """按元数据文件的 mtime（最近访问时间）淘汰，直到降到上限的 90%。"""
+        entries = []
+        for item in self._iter_entries():
+            key = item.name[:-len(".body")]
+            meta_path = self._path(key, ".json")
+            try:
+                used = os.stat(meta_path).st_mtime
+            except OSError:
+                used = 0
+            entries.append((used, key, item.stat().st_size))
+        entries.sort()
+
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, key, size in entries:
+            if self._total <= target:
+                break
+            for suffix in (".json", ".body"):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+            self._total -= size
+            removed += 1
+        logger.info(f"🧹 HTTP 缓存淘汰 {removed} 条记录，当前 {self._total / 1024 / 1024:.1f} MB")
+
+
+_cache = None
+_cache_enabled = True
+_cache_options = {"directory": CACHE_DIR, "max_bytes": DEFAULT_MAX_BYTES}
+_cache_lock = threading.Lock()
+
+
+def configure_cache(enabled=True, directory=None, max_bytes=None):
+    global _cache, _cache_enabled
+    with _cache_lock:
+        _cache_enabled = enabled
+        if directory is not None:
+            _cache_options["directory"] = directory
+        if max_bytes is not None:
+            _cache_options["max_bytes"] = max_bytes
+        _cache = None
+
+
+def get_cache():
+    """返回全局缓存实例；禁用缓存时返回 None。"""
+    global _cache
+    if not _cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache(**_cache_options)
+        return _cache
@@ -0,0 +1,102 @@
+# novel_crawler/link_classifier.py
+"""
+目录页链接分类：只遍历一次全部链接，为每个链接解析一次 URL 并打分，返回按可能性排序的章节候选。
+
+打分依据（与原先的两轮猜测一致，合并为一次遍历）：
+- 位于目录页路径之下的站内链接（原策略 1）；
+- 链接文字形如“第 N 章”、“Chapter N”或纯数字（原策略 2）；
+两者都满足的链接排在最前，同分时保持页面顺序。
+导航、登录、排行等黑名单链接直接丢弃。
+"""
+import re
+from urllib.parse import urljoin, urlsplit
+
+from html_parser import parse_html
+
+BLACKLIST_KEYWORDS = (
+    "login", "register", "home", "index", "top", "paihang", "rank",
+    "user", "profile", "javascript:", "mailto:", "about", "contact", "faq",
+)
+
+UNDER_TOC = 2       # 位于目录页路径之下
+CHAPTER_TEXT = 1    # 链接文字像章节标题
+
+_BLACKLIST = re.compile("|".join(re.escape(kw) for kw in BLACKLIST_KEYWORDS), re.I)
+_CHAPTER_TEXT = re.compile(r"第.*[章节]|chapter|^\d+$", re.I)
+_PATH_END = re.compile(r"[?#]")
+
+
+class ChapterLink:
+    """一个章节候选：绝对 URL、链接文字、得分与在页面中的位置。"""
+
+    __slots__ = ("url", "title", "score", "position")
+
+    def __init__(self, url, title, score, position):
+        self.url = url
+        self.title = title
+        self.score = score
+        self.position = position
+
+    @property
+    def under_toc(self):
+        return bool(self.score & UNDER_TOC)
+
+    @property
+    def chapter_text(self):
+        return bool(self.score & CHAPTER_TEXT)
+
+    def __repr__(self):
+        return f"ChapterLink({self.url!r}, {self.title!r}, score={self.score})"
+
+
+def _toc_base(toc_url):
+    parsed = urlsplit(toc_url)
+    path = parsed.path if parsed.path.endswith("/") else parsed.path + "/"
+    return parsed, path
+
+
+def _resolve(toc_url, origin, href):
+    """返回 (绝对 URL, netloc, path)。站内绝对路径（最常见的写法）直接拼接，免去 urljoin。"""
+    if href.startswith("/") and not href.startswith("//") and "/." not in href:
+        return origin + href, None, _PATH_END.split(href, 1)[0]
+    url = urljoin(toc_url, href)
+    parsed = urlsplit(url)
+    return url, parsed.netloc, parsed.path
+
+
+def classify_links(links, toc_url):
+    """
+    对 html_parser 节点的链接列表打分，返回按得分降序、页面顺序升序排列的 ChapterLink 列表。
+    同一 URL 只保留得分最高（同分取最先出现）的一条。
+    """
+    base, toc_path = _toc_base(toc_url)
+    domain = base.netloc
+    origin = f"{base.scheme}://{domain}"
+    best = {}
+    for position, link in enumerate(links):
+        href = (link.get("href") or "").strip()
+        if not href or href in ("#", "/") or _BLACKLIST.search(href):
+            continue
+        url, netloc, path = _resolve(toc_url, origin, href)
+        if (netloc is not None and netloc != domain) or url == toc_url or path in ("/", ""):
+            continue
+
+        score = 0
+        if path.startswith(toc_path) and path != toc_path:
+            score |= UNDER_TOC
+        title = link.text(strip=True)
+        if _CHAPTER_TEXT.search(title):
+            score |= CHAPTER_TEXT
+        if not score:
+            continue
+
+        current = best.get(url)
+        if current is None or score > current.score:
+            best[url] = ChapterLink(url, title, score, position)
+    return sorted(best.values(), key=lambda c: (-c.score, c.position))
+
+
+def chapter_candidates(toc_html, toc_url, limit=None):
+    """解析目录页 HTML 并返回排序后的章节候选；limit 限制返回数量。"""
+    candidates = classify_links(parse_html(toc_html).links(), toc_url)
+    return candidates[:limit] if limit else candidates
@@ -1,260 +1,423 @@
 # novel_crawler/main.py
 import os
 import argparse
-import re
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+
 from utils import (
-    get_domain, parse_toc, scrape_chapter,
-    fetch_html, verify_content_rule, sanitize_filename
+    configure_http_pool, get_domain, iter_toc_pages, fetch_html, extract_novel_title
 )
-from booksource_loader import find_book_source, append_book_source
-from ai_analyzer import AIAnalyzer
-from chapter_writer import ChapterWriter
+from html_parser import set_parser
+from compiled_source import compile_book_source
+from pipeline import BookJob, RetryQueue, refill_failed, refill_job, run_download, run_jobs
+from rate_limiter import DEFAULT_LIMITS, configure_limits
+from http_cache import TOC_TTL, configure_cache
+from parse_pool import configure_parse_workers
+from follow import follow_book, read_book_list, watch_books
+from booksource_loader import find_book_source, append_book_source, remove_book_source
+from ai_analyzer import AIAnalyzer, configure_ai_candidates, get_ai_candidates
+from selector_inference import infer_book_source, is_inferred
+from link_classifier import chapter_candidates
+from state_store import book_key, failed_chapters, open_book
+from chapter_store import configure_chapter_store, export_book
+from metrics import DEFAULT_PROGRESS_INTERVAL, configure_metrics, reporting
+from profiling import PROFILE_MODES, profiled
 from logger import logger
 
+SAMPLE_CANDIDATES = 3  # 获取样本章节页时最多尝试的候选数
+
+
+def analyze_with_ai(toc_url, toc_html, chapter_html, domain):
+    """
+    调用 AI 生成书源并验证，最多 3 轮。每轮并行请求 --ai-candidates 套规则（不同模型/温度），
+    用已下载的目录页与章节页同时验证，取得分最高的一套；整轮失败时带上最接近成功的规则与原因进入修正模式。
+    成功返回 (book_source, chapters)。
+    """
+    analyzer = AIAnalyzer()
+    count = get_ai_candidates()
+    MAX_RETRIES = 3
+    last_error = None
+    last_failed_rules = None
+
+    for attempt in range(MAX_RETRIES):
+        logger.info(
+            f"🚀 AI 分析启动... (尝试 {attempt + 1}/{MAX_RETRIES}，并行 {count} 套候选)"
+        )
+        results = analyzer.analyze_candidates(
+            toc_html, chapter_html, toc_url, domain, count,
+            last_failed_rules, # 传入失败的规则
+            last_error,      # 传入失败的原因
+        )
+
+        best = results[0] if results else None
+        if best is not None and best.ok:
+            logger.info(
+                f"👍 AI 规则在第 {attempt + 1} 次尝试验证通过！"
+                f" (候选: {best.label}, 目录: {len(best.chapters)} 章, 正文: OK)"
+            )
+            analyzer.remember(toc_html, chapter_html, best.book_source)
+            return best.book_source, best.chapters
 
-def main(toc_url):
+        if best is None or best.book_source is None:
+            last_error = best.error if best is not None else "AI 未能生成有效的 JSON"
+            last_failed_rules = None
+        else:
+            last_error = best.error
+            last_failed_rules = best.book_source
+        logger.warning(f"🧪 AI 尝试 {attempt + 1} 失败: {last_error}")
+
+    logger.error(f"❌ AI 在 {MAX_RETRIES} 次尝试后仍失败，任务终止。")
+    logger.error(f"❌ 最终失败原因: {last_error}")
+    return None
+
+
+def _register_pages(writer, first, pages):
+    """逐页登记并产出章节，后续目录分页在抓取过程中才解析。"""
+    offset = 0
+    for page in chain([first], pages):
+        writer.state.register(page, start=offset)
+        offset += len(page)
+        yield from page
+
+
+def _format_counts(counts):
+    return "，".join(f"{status} {count}" for status, count in sorted(counts.items()))
+
+
+def prepare_book(toc_url, stream=False):
+    """
+    解析目录并定位断点，返回 (rules, chapters, writer, start_index, failed)；
+    无法处理时返回 None。单本与批量抓取共用。
+    续爬按 state_store 的章节状态进行：chapters 只包含尚未写入小说文件的章节，
+    目录中间新增的章节也会补上；只有旧版断点（状态库中没有记录）时才按 URL 在目录中定位。
+    failed 为之前重试耗尽、写入了占位的章节，应先用 pipeline.refill_failed 补抓。
+    stream=True 且没有断点时，已有书源的目录以生成器返回：第一页解析完即可开始抓取，
+    其余目录分页边抓边解析（此时 chapters 不支持 len()）。
+    """
     domain = get_domain(toc_url)
     logger.info(f"[🌐] 目标站点：{domain}")
 
     book_source = find_book_source(toc_url)
     chapters = []  # 初始化
+    pages = None   # 已有书源时，第一页之后的目录分页
 
     if not book_source:
-        logger.info("📡 未找到书源，启动 AI 分析结构...")
-        toc_html = fetch_html(toc_url)
+        logger.info("📡 未找到书源，启动结构分析...")
+        toc_html = fetch_html(toc_url, cache_ttl=TOC_TTL)
         if not toc_html:
             logger.error(f"❌ 无法获取目录页 HTML: {toc_url}，终止")
-            return
-
-        logger.info("🕵️ 正在猜测第一章 URL 以便 AI 分析...")
-        toc_soup = BeautifulSoup(toc_html, "html.parser")
-        all_links = toc_soup.find_all("a", href=True)
-        first_chapter_url = None
-
-        toc_path = urlparse(toc_url).path
-        if not toc_path.endswith("/"):
-            toc_path += "/"
-
-        blacklist_keywords = [
-            "login",
-            "register",
-            "home",
-            "index",
-            "top",
-            "paihang",
-            "rank",
-            "user",
-            "profile",
-            "javascript:",
-            "mailto:",
-            "about",
-            "contact",
-            "faq",
-        ]
-
-        # 策略1
-        for link in all_links:
-            href = link.get("href")
-            if not href or not href.strip() or href.strip() in ["#", "/"]:
-                continue
-            if any(kw in href.lower() for kw in blacklist_keywords):
-                continue
-            abs_url = urljoin(toc_url, href)
-            link_path = urlparse(abs_url).path
-            if (
-                get_domain(abs_url) == domain
-                and link_path.startswith(toc_path)
-                and link_path != toc_path
-            ):
-                first_chapter_url = abs_url
-                logger.info(
-                    f"👍 AI分析：(策略1) 猜测第一章 URL 为: {first_chapter_url}"
-                )
-                break
+            return None
 
-        # 策略2
-        if not first_chapter_url:
-            for link in all_links:
-                href = link.get("href")
-                if not href or not href.strip() or href.strip() in ["#", "/"]:
-                    continue
-                if any(kw in href.lower() for kw in blacklist_keywords):
-                    continue
-                abs_url = urljoin(toc_url, href)
-                if (
-                    get_domain(abs_url) == domain
-                    and abs_url != toc_url
-                    and get_domain(abs_url) == domain
-                    and urlparse(abs_url).path not in ["/", ""]
-                ):
-                    link_text = link.get_text(strip=True)
-                    if (
-                        re.search(r"第.*[章章节]", link_text)
-                        or re.search(r"chapter", link_text, re.I)
-                        or re.search(r"^\d+$", link_text)
-                    ):
-                        first_chapter_url = abs_url
-                        logger.info(
-                            f"👍 AI分析：(策略2-回退) 猜测第一章 URL 为: {first_chapter_url}"
-                        )
-                        break
-
-        if not first_chapter_url:
+        logger.info("🕵️ 正在猜测第一章 URL 以便结构分析...")
+        candidates = chapter_candidates(toc_html, toc_url)
+        if not candidates:
             logger.error("❌ AI分析：未能在目录页猜到任何有效章节链接，终止")
-            return
+            return None
 
-        chapter_html = fetch_html(first_chapter_url)
-        if not chapter_html:
-            logger.error(
-                f"❌ AI分析：无法获取猜测的章节页 HTML: {first_chapter_url}，终止"
-            )
-            return
-
-        analyzer = AIAnalyzer()
-        MAX_RETRIES = 3
-        last_error = None
-        last_failed_rules = None
-        chapters_test = []
-
-        for attempt in range(MAX_RETRIES):
-            logger.info(f"🚀 AI 分析启动... (尝试 {attempt + 1}/{MAX_RETRIES})")
-
-            book_source = analyzer.analyze_selectors(
-                toc_html,
-                chapter_html,
-                domain,
-                last_failed_rules, # 传入失败的规则
-                last_error,      # 传入失败的原因
+        # 按得分依次尝试，前几个候选都取不到时才放弃
+        chapter_html = chapter_url = None
+        for candidate in candidates[:SAMPLE_CANDIDATES]:
+            logger.info(
+                f"👍 结构分析：猜测第一章 URL 为: {candidate.url}（得分 {candidate.score}）"
             )
+            chapter_html = fetch_html(candidate.url)
+            if chapter_html:
+                chapter_url = candidate.url
+                break
+            logger.warning(f"⚠️ 无法获取猜测的章节页 HTML: {candidate.url}")
+        if not chapter_html:
+            logger.error("❌ AI分析：猜测的章节页均无法获取，终止")
+            return None
 
-            if not book_source:
-                last_error = "AI 未能生成有效的 JSON"
-                last_failed_rules = None
-                logger.warning(f"🧪 AI 尝试 {attempt + 1} 失败: {last_error}")
-                continue
-
-            logger.info(f"🕵️ 正在验证 AI 尝试 {attempt + 1} 的规则...")
-
-            chapters_test = parse_toc(toc_url, book_source)
-            if not chapters_test:
-                last_error = f"验证失败: 'ruleToc' ({book_source.get('ruleToc', {}).get('chapterList')}) 无法提取任何章节。"
-                last_failed_rules = book_source
-                logger.warning(f"🧪 AI 尝试 {attempt + 1} {last_error}")
-                continue
-
-            if not verify_content_rule(chapter_html, book_source):
-                last_error = f"验证失败: 'ruleContent' ({book_source.get('ruleContent', {}).get('content')}) 无法在样本页面提取到正文。"
-                last_failed_rules = book_source
-                logger.warning(f"🧪 AI 尝试 {attempt + 1} {last_error}")
-                continue
-
-            logger.info(f"👍 AI 规则在第 {attempt + 1} 次尝试验证通过！ (目录: {len(chapters_test)} 章, 正文: OK)")
-            last_error = None
-            break
-
-        if last_error:
-            logger.error(f"❌ AI 在 {MAX_RETRIES} 次尝试后仍失败，任务终止。")
-            logger.error(f"❌ 最终失败原因: {last_error}")
-            return
+        inferred = infer_book_source(toc_html, toc_url, chapter_html, domain, chapter_url)
+        if inferred is None:
+            inferred = analyze_with_ai(toc_url, toc_html, chapter_html, domain)
+            if inferred is None:
+                return None
+        book_source, chapters = inferred
 
         append_book_source(book_source)
-        logger.info("📥 AI生成结构已保存至 shuyuan.json")
-        chapters = chapters_test
+        logger.info("📥 自动生成的书源已保存至 shuyuan.json")
 
     else:
         logger.info(f"📚 命中书源：{book_source.get('bookSourceName')}")
-        chapters = parse_toc(toc_url, book_source)
+        toc_html = fetch_html(toc_url, cache_ttl=TOC_TTL)
+        pages = iter_toc_pages(toc_url, book_source, html=toc_html) if toc_html else iter(())
+        chapters = next(pages, [])
 
     if not chapters:
         logger.error("❌ 未能提取到章节列表")
-        return
-
-    try:
-        if "toc_html" not in locals():
-            toc_html = fetch_html(toc_url)
+        _drop_inferred_source(book_source)
+        return None
 
-        if toc_html:
-            soup = BeautifulSoup(toc_html, "html.parser")
-            title_text = soup.title.string or ""  # 获取 title，或空字符串
+    novel_title = extract_novel_title(toc_html, domain)
 
-            title_parts = re.split(r'[_,|\-，]', title_text)
-            novel_title = title_parts[0].strip()
+    writer = open_book(toc_url, novel_title)
+    written = writer.state.written_urls()
+    last_url = None if written else writer.load_checkpoint()
+    start_index = 0
 
-            novel_title = novel_title.replace("目录", "").replace("最新章节列表", "").strip()
+    if pages is not None and not written and not last_url and stream:
+        logger.info("📖 目录第一页已解析，其余目录分页边抓取边解析")
+        return compile_book_source(book_source), _register_pages(writer, chapters, pages), writer, 0, []
 
-            if not novel_title:
-                novel_title = domain
-        else:
-            novel_title = domain
-    except Exception as e:
-        logger.warning(f"⚠️ 提取小说标题失败: {e}，将使用域名作为标题。")
-        novel_title = domain
+    if pages is not None:
+        chapters = chapters + [ch for page in pages for ch in page]
+    writer.state.register(chapters)
+    failed = failed_chapters(writer, chapters)
 
-    novel_title = sanitize_filename(novel_title)
-    if not novel_title:
-        novel_title = sanitize_filename(domain)
+    if written:
+        logger.info(f"📊 章节状态：{_format_counts(writer.state.counts())}")
+        total = len(chapters)
+        chapters = [ch for ch in chapters if ch["url"] not in written]
+        logger.info(f"📖 准备爬取 {len(chapters)} 章（目录共 {total} 章，已写入 {total - len(chapters)} 章）")
+    else:
+        if last_url:
+            for idx, ch in enumerate(chapters):
+                if ch["url"] == last_url:
+                    start_index = idx + 1
+                    break
+        logger.info(
+            f"📖 准备爬取 {len(chapters) - start_index} 章（从第 {start_index + 1} 章开始）"
+        )
 
-    writer = ChapterWriter(domain, novel_title)
-    last_url = writer.load_checkpoint()
-    start_index = 0
+    if failed:
+        logger.info(f"🔁 {len(failed)} 个之前失败的章节将先重新抓取，成功后原地替换占位")
 
-    if last_url:
-        for idx, ch in enumerate(chapters):
-            if ch["url"] == last_url:
-                start_index = idx + 1
-                break
+    # 书源规则只编译一次，所有章节与分页共用
+    return compile_book_source(book_source), chapters, writer, start_index, failed
 
-    logger.info(
-        f"📖 准备爬取 {len(chapters) - start_index} 章（从第 {start_index + 1} 章开始）"
-    )
 
-    results_buffer = {}
-    current_write_index = start_index
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {
-            executor.submit(scrape_chapter, ch["url"], book_source, ch["title"]): i
-            for i, ch in enumerate(chapters[start_index:], start=start_index)
-        }
-
-        for future in as_completed(futures):
-            idx = futures[future]
-            ch = chapters[idx]
-            try:
-                result = future.result()
-                if not result:
-                    logger.error(f"❌ 抓取失败：{ch['title']}，终止任务。")
-                    break
+def _drop_inferred_source(book_source):
+    """自动识别的书源不再适用时从书源文件中删除，下次运行重新分析。"""
+    if is_inferred(book_source) and remove_book_source(book_source):
+        logger.warning(f"🗑️ 自动识别的书源 {book_source.get('bookSourceName')} 未能通过实际抓取，已删除，下次运行将重新分析")
 
-                logger.info(f"✅ (已抓取) {ch['title']} (Index: {idx})")
 
-                results_buffer[idx] = result
+def _check_inferred_source(rules, writer):
+    """自动识别的书源抓取后失败章节多于成功章节时删除。"""
+    counts = writer.state.counts()
+    if is_inferred(rules.source) and counts.get("failed", 0) > counts.get("written", 0):
+        _drop_inferred_source(rules.source)
 
-                while current_write_index in results_buffer:
-                    chapter_to_write = results_buffer.pop(current_write_index)
 
-                    writer.write_chapters([chapter_to_write])
-                    writer.save_checkpoint(chapter_to_write["url"])
+def _default_concurrency(engine):
+    return 200 if engine == "async" else DEFAULT_LIMITS["max_window"]
 
-                    logger.info(
-                        f"💾 (已写入) {chapter_to_write['title']} (Index: {current_write_index})"
-                    )
 
-                    current_write_index += 1
+def main(
+    toc_url, engine="thread", concurrency=None, pagination="auto", max_buffer=None,
+    chapter_retries=3,
+):
+    if concurrency is None:
+        concurrency = _default_concurrency(engine)
 
-            except Exception as e:
-                logger.error(f"❌ 抓取异常：{ch['title']} - {e}")
-                logger.exception(f"详细错误 (Index: {idx}):")
-                break
+    # async 引擎在事件循环中取章节，目录分页的同步抓取会阻塞循环，因此只有线程引擎边抓边解析
+    prepared = prepare_book(toc_url, stream=engine != "async")
+    if prepared is None:
+        return
+    rules, chapters, writer, start_index, failed = prepared
+
+    if failed:
+        refill_failed(
+            failed, rules, writer, engine=engine, concurrency=concurrency,
+            pagination=pagination, max_buffer=max_buffer,
+            retries=RetryQueue(max_retries=chapter_retries),
+        )
+    run_download(
+        chapters, start_index, rules, writer, engine=engine, concurrency=concurrency,
+        pagination=pagination, max_buffer=max_buffer,
+        retries=RetryQueue(max_retries=chapter_retries),
+    )
+    _check_inferred_source(rules, writer)
 
     logger.info("📘 抓取流程完成")
 
 
+def main_batch(
+    toc_urls, engine="thread", concurrency=None, pagination="auto", max_buffer=None,
+    chapter_retries=3,
+):
+    """
+    批量抓取多本书：先逐本解析目录，再把所有章节交给同一个调度器，
+    各书轮流提交、共享工作池，每个域名的在途章节数受其限速窗口约束。
+    各书之前失败的章节先在同一个工作池中补抓，再抓取新章节。
+    """
+    if concurrency is None:
+        concurrency = _default_concurrency(engine)
+
+    jobs = []
+    refills = []
+    claimed = set()
+    for toc_url in dict.fromkeys(toc_urls):
+        try:
+            prepared = prepare_book(toc_url)
+        except Exception:
+            logger.exception(f"❌ 目录解析失败：{toc_url}")
+            continue
+        if prepared is None:
+            continue
+        rules, chapters, writer, start_index, failed = prepared
+        # 断点按书区分，但输出文件按书名命名，同名的两本书不能同时写入
+        if writer.filepath in claimed:
+            logger.warning(f"⚠️ {toc_url} 与本批次中的其他书同名（{writer.filepath}），请单独运行")
+            writer.close()
+            continue
+        claimed.add(writer.filepath)
+        if start_index >= len(chapters) and not failed:
+            logger.info(f"💤 {writer.novel_title} 已全部下载，跳过")
+            writer.close()
+            continue
+        if failed:
+            refills.append(refill_job(
+                failed, rules, writer, pagination, max_buffer or concurrency * 2,
+                RetryQueue(max_retries=chapter_retries),
+            ))
+        jobs.append(BookJob(
+            chapters, start_index, rules, writer, pagination,
+            max_buffer or concurrency * 2, RetryQueue(max_retries=chapter_retries),
+        ))
+
+    if not jobs:
+        logger.info("📭 没有需要下载的书")
+        return
+    if refills:
+        run_jobs(refills, engine=engine, concurrency=concurrency)
+    logger.info(f"📚 批量抓取 {len(jobs)} 本书")
+    run_jobs(jobs, engine=engine, concurrency=concurrency)
+    for job in jobs:
+        _check_inferred_source(job.book_source, job.buffer.writer)
+    logger.info("📘 批量抓取完成")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("url", help="小说目录页 URL")
+    parser.add_argument("url", nargs="?", help="小说目录页 URL")
+    parser.add_argument(
+        "--follow", action="store_true",
+        help="追更模式：只抓取目录中新出现的章节，目录未变化时直接跳过",
+    )
+    parser.add_argument(
+        "--watch", metavar="FILE",
+        help="按书单文件（每行一个目录页 URL）定时追更",
+    )
+    parser.add_argument(
+        "--batch", metavar="FILE",
+        help="批量抓取书单中的所有书（每行一个目录页 URL，- 表示从标准输入读取），共享同一个工作池",
+    )
+    parser.add_argument(
+        "--interval", type=int, default=3600,
+        help="--watch 的轮询间隔（秒），默认 3600",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="--watch 只检查一轮后退出",
+    )
+    parser.add_argument(
+        "--engine", choices=["thread", "async"], default="thread",
+        help="抓取引擎：thread 使用 cloudscraper 线程池；async 使用 aiohttp 连接池（不支持 Cloudflare 验证）",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=None,
+        help="并发上限（默认 thread=64，async=200）；实际并发由每个域名的自适应窗口决定",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=None,
+        help="每个域名的初始请求速率（次/秒），之后按响应情况自适应调整",
+    )
+    parser.add_argument(
+        "--max-rate", type=float, default=None,
+        help="每个域名的最高请求速率（次/秒）",
+    )
+    parser.add_argument(
+        "--pagination", choices=["auto", "sequential"], default="auto",
+        help="章节分页策略：auto 识别 _2.html 等分页规律后并行抓取，识别失败回退逐页；sequential 始终逐页跟随",
+    )
+    parser.add_argument(
+        "--parser", choices=["auto", "bs4", "lxml"], default="auto",
+        help="HTML 解析引擎：auto 在安装了 lxml 时使用 lxml，否则使用 bs4（参考实现）",
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, default=0,
+        help="解析进程数：抓取线程只下载原始字节，解码/解析/清洗在子进程中完成；0 表示不启用，-1 使用全部 CPU 核心",
+    )
+    parser.add_argument(
+        "--buffer", type=int, default=None,
+        help="已抓取但等待按序写入的章节数上限（默认并发上限的 2 倍），写入落后时暂停提交新任务",
+    )
+    parser.add_argument(
+        "--chapter-retries", type=int, default=3,
+        help="单章失败后的重试次数（指数退避），仍失败则写入占位并记录到失败清单",
+    )
+    parser.add_argument(
+        "--store", action="store_true",
+        help="同时把章节写入 library/ 下按章压缩、带偏移索引的章节库，可随机读取并导出",
+    )
+    parser.add_argument(
+        "--ai-candidates", type=int, default=1,
+        help="未知站点 AI 分析时每轮并行请求的候选规则套数（按 LLM_CANDIDATE_MODELS/TEMPERATURES 轮换），验证后取最优",
+    )
+    parser.add_argument(
+        "--export", choices=["txt", "epub"],
+        help="不抓取，把该书的章节库流式导出为 TXT 或 EPUB（保存到 exports/）",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="禁用 cache/http 下的磁盘响应缓存（目录页缓存 10 分钟，章节页缓存 7 天）",
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=None,
+        help="磁盘响应缓存的上限（MB），超出后按最近使用时间淘汰，默认 512",
+    )
+    parser.add_argument(
+        "--progress-interval", type=float, default=DEFAULT_PROGRESS_INTERVAL,
+        help="每隔多少秒输出一行进度摘要（章/秒、请求失败数、抓取延迟分位数），代替逐章日志；0 表示恢复逐章日志",
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="FILE",
+        help="把按域名统计的计数与耗时直方图写成 JSON 快照（每次进度摘要与退出时更新）",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None,
+        help="在 127.0.0.1 的该端口提供 Prometheus 文本格式指标（/metrics）与 JSON 快照（/metrics.json）",
+    )
+    parser.add_argument(
+        "--profile", choices=PROFILE_MODES, default=None,
+        help="性能剖析：cprofile 统计主线程（适合 async 引擎）；sample 定时采样所有线程的调用栈（适合线程引擎）",
+    )
+    parser.add_argument(
+        "--profile-out", metavar="FILE",
+        help="剖析结果文件（默认 novel_crawler.prof / novel_crawler.folded）",
+    )
     args = parser.parse_args()
-    main(args.url)
\ No newline at end of file
+    set_parser(args.parser)
+    configure_parse_workers(args.parse_workers)
+    configure_chapter_store(args.store)
+    configure_ai_candidates(args.ai_candidates)
+    configure_cache(
+        enabled=not args.no_cache,
+        max_bytes=args.cache_size * 1024 * 1024 if args.cache_size else None,
+    )
+    configure_limits(rate=args.rate, max_rate=args.max_rate)
+    configure_http_pool(args.concurrency or _default_concurrency(args.engine))
+    download_options = dict(
+        engine=args.engine, concurrency=args.concurrency,
+        pagination=args.pagination, max_buffer=args.buffer,
+        chapter_retries=args.chapter_retries,
+    )
+    configure_metrics(
+        progress_interval=args.progress_interval,
+        snapshot_file=args.metrics_file,
+        port=args.metrics_port,
+    )
+    if not (args.batch or args.watch or args.url):
+        parser.error("请提供小说目录页 URL，或使用 --batch / --watch 指定书单")
+    with profiled(args.profile, args.profile_out), reporting():
+        if args.batch:
+            main_batch(read_book_list(args.batch), **download_options)
+        elif args.watch:
+            watch_books(args.watch, args.interval, args.once, **download_options)
+        elif args.export:
+            export_book(book_key(args.url), args.export)
+        elif args.follow:
+            follow_book(args.url, **download_options)
+        else:
+            main(args.url, **download_options)
@@ -0,0 +1,366 @@
+# novel_crawler/metrics.py
+"""
+抓取指标：按 (阶段, 域名) 统计次数、失败数与耗时直方图，另有按域名的事件计数。
+
+阶段：
+- fetch：单次 HTTP 请求（不含限速器排队时间，命中缓存的请求不计入）；
+- parse：一个章节分页的解码与解析（启用解析进程池时含进程间传输）；
+- clean：整章拼接与清洗；
+- write：写入小说文件与断点日志；
+- ai：一次 LLM 调用。
+事件：cache_hit、not_modified、bytes、chapter_fetched、chapter_retry、chapter_failed、chapter_written。
+
+每次记录只在锁内更新几个整数，开销远小于逐章写日志。汇总结果的出口：
+- ProgressReporter 定期输出一行进度摘要，代替逐章日志（--progress-interval 0 恢复逐章日志）；
+- JSON 快照文件（--metrics-file），每次摘要时与退出时原子替换；
+- Prometheus 文本格式（--metrics-port），GET /metrics；/metrics.json 返回同样的 JSON 快照。
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from logger import logger
+
+STAGES = ("fetch", "parse", "clean", "write", "ai")
+# 直方图桶上界（秒），与 Prometheus 的 le 语义相同，最后还有一个 +Inf 桶
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+
+class Histogram:
+    """固定桶的耗时直方图，分位数按桶内线性插值估算。"""
+
+    __slots__ = ("counts", "count", "sum", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, ok=True):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if not ok:
+            self.errors += 1
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.errors += other.errors
+
+    def quantile(self, q):
+        """估算分位数（秒）；没有样本时返回 None。落在 +Inf 桶中的按最大桶上界计。"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                lower = BUCKETS[i - 1] if i else 0.0
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    def to_dict(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum_seconds": round(self.sum, 6),
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], self.counts)),
+        }
+
+
+class Metrics:
+    """线程安全的指标表：histograms[(阶段, 域名)]、counters[(事件, 域名)]。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, stage, domain, seconds, ok=True):
+        key = (stage, domain or "-")
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds, ok)
+
+    def inc(self, name, domain, amount=1):
+        key = (name, domain or "-")
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def timed(self, stage, domain):
+        """记录 with 块的耗时；块内抛出异常时计为失败。"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(stage, domain, time.perf_counter() - start, ok)
+
+    def domains(self):
+        with self._lock:
+            return sorted({d for _, d in self.histograms} | {d for _, d in self.counters})
+
+    def stage(self, stage, domain=None):
+        """某阶段的直方图（domain 为 None 时合并所有域名）。"""
+        merged = Histogram()
+        with self._lock:
+            for (name, d), histogram in self.histograms.items():
+                if name == stage and (domain is None or d == domain):
+                    merged.merge(histogram)
+        return merged
+
+    def count(self, name, domain=None):
+        with self._lock:
+            return sum(
+                n for (event, d), n in self.counters.items()
+                if event == name and (domain is None or d == domain)
+            )
+
+    def snapshot(self):
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        stages = {}
+        for (stage, domain), histogram in sorted(histograms):
+            stages.setdefault(stage, {})[domain] = histogram.to_dict()
+        events = {}
+        for (name, domain), n in sorted(counters):
+            events.setdefault(name, {})[domain] = n
+        return {
+            "started": self.started,
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "stages": stages,
+            "events": events,
+        }
+
+    def prometheus_text(self):
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = [
+            "# HELP novel_crawler_stage_seconds 各阶段耗时（秒）",
+            "# TYPE novel_crawler_stage_seconds histogram",
+        ]
+        for (stage, domain), histogram in histograms:
+            labels = f'stage="{stage}",domain="{_escape(domain)}"'
+            cumulative = 0
+            for bound, n in zip([*map(str, BUCKETS), "+Inf"], histogram.counts):
+                cumulative += n
+                lines.append(f'novel_crawler_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"novel_crawler_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"novel_crawler_stage_seconds_count{{{labels}}} {histogram.count}")
+        lines += [
+            "# HELP novel_crawler_stage_errors_total 各阶段失败次数",
+            "# TYPE novel_crawler_stage_errors_total counter",
+        ]
+        for (stage, domain), histogram in histograms:
+            lines.append(
+                f'novel_crawler_stage_errors_total{{stage="{stage}",domain="{_escape(domain)}"}} '
+                f"{histogram.errors}"
+            )
+        lines += [
+            "# HELP novel_crawler_events_total 按域名的事件计数",
+            "# TYPE novel_crawler_events_total counter",
+        ]
+        for (name, domain), n in counters:
+            lines.append(f'novel_crawler_events_total{{event="{name}",domain="{_escape(domain)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _ms(seconds):
+    if seconds is None:
+        return "-"
+    ms = seconds * 1000
+    return f"{ms:.1f}" if ms < 10 else f"{ms:.0f}"
+
+
+class ProgressReporter:
+    """后台线程：每 interval 秒输出一行进度摘要并刷新 JSON 快照；没有新进展时不输出。"""
+
+    def __init__(self, metrics, interval, snapshot_file=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.snapshot_file = snapshot_file
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = (time.monotonic(), 0, 0)
+
+    def start(self):
+        if self.interval:
+            self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+            self._thread.start()
+            _set_reporter_running(1)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def report(self):
+        metrics = self.metrics
+        now = time.monotonic()
+        written = metrics.count("chapter_written")
+        fetch = metrics.stage("fetch")
+        last_time, last_written, last_requests = self._last
+        if written == last_written and fetch.count == last_requests:
+            return
+        self._last = (now, written, fetch.count)
+        rate = (written - last_written) / max(now - last_time, 1e-9)
+        parse = metrics.stage("parse")
+        logger.info(
+            f"📊 已写入 {written} 章（{rate:.1f} 章/秒），重试 {metrics.count('chapter_retry')}、"
+            f"失败 {metrics.count('chapter_failed')}；请求 {fetch.count} 次（失败 {fetch.errors}，"
+            f"缓存命中 {metrics.count('cache_hit')}），抓取 p50 {_ms(fetch.quantile(0.5))} ms / "
+            f"p99 {_ms(fetch.quantile(0.99))} ms，解析 p50 {_ms(parse.quantile(0.5))} ms"
+        )
+        self._write_snapshot()
+
+    def _write_snapshot(self):
+        if self.snapshot_file:
+            try:
+                self.metrics.write_snapshot(self.snapshot_file)
+            except OSError as e:
+                logger.warning(f"⚠️ 指标快照写入失败：{e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            _set_reporter_running(-1)
+        self._write_snapshot()
+
+    def log_summary(self):
+        """按域名输出各阶段的次数、失败数与分位数。"""
+        metrics = self.metrics
+        for domain in metrics.domains():
+            parts = []
+            for stage in STAGES:
+                histogram = metrics.stage(stage, domain)
+                if histogram.count:
+                    parts.append(
+                        f"{stage} {histogram.count} 次/失败 {histogram.errors}"
+                        f"/p50 {_ms(histogram.quantile(0.5))}/p99 {_ms(histogram.quantile(0.99))} ms"
+                    )
+            if parts:
+                logger.info(f"📊 {domain}：" + "，".join(parts))
+
+
+def _start_http_server(metrics, port):
+    """在后台线程中提供 /metrics（Prometheus 文本格式）与 /metrics.json。"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = metrics.prometheus_text().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 指标端点：http://127.0.0.1:{server.server_port}/metrics")
+    return server
+
+
+_metrics = Metrics()
+_settings = {"interval": DEFAULT_PROGRESS_INTERVAL, "snapshot_file": None, "port": None}
+_running_reporters = 0
+_reporters_lock = threading.Lock()
+
+
+def _set_reporter_running(delta):
+    global _running_reporters
+    with _reporters_lock:
+        _running_reporters += delta
+
+
+def configure_metrics(progress_interval=None, snapshot_file=None, port=None):
+    """
+    progress_interval：进度摘要间隔（秒）；0 表示不输出摘要，改为逐章记录日志。
+    snapshot_file：JSON 快照文件路径；port：Prometheus 端点端口（只监听 127.0.0.1）。
+    """
+    if progress_interval is not None:
+        _settings["interval"] = max(0.0, progress_interval)
+    _settings["snapshot_file"] = snapshot_file
+    _settings["port"] = port
+
+
+def get_metrics():
+    return _metrics
+
+
+def log_chapter(message):
+    """逐章日志：有进度摘要线程在运行时降为 DEBUG，避免每章一行的日志 I/O；没有摘要输出时照常记为 INFO。"""
+    if _running_reporters:
+        logger.debug(message)
+    else:
+        logger.info(message)
+
+
+@contextmanager
+def reporting():
+    """在 with 块运行期间输出进度摘要、提供指标端点，结束时输出按域名的汇总并写入快照。"""
+    reporter = ProgressReporter(_metrics, _settings["interval"], _settings["snapshot_file"]).start()
+    server = _start_http_server(_metrics, _settings["port"]) if _settings["port"] else None
+    try:
+        yield _metrics
+    finally:
+        reporter.stop()
+        if _settings["interval"]:
+            reporter.report()
+            reporter.log_summary()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
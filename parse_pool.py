@@ -0,0 +1,82 @@
+# novel_crawler/parse_pool.py
+"""
+可选的多进程解析池。
+
+默认情况下，章节的下载、HTML 解析、正文提取与清洗都在同一个工作线程里完成，
+CPU 密集的部分受 GIL 限制，整个进程大约只能用满一个核。
+启用解析池后，I/O 线程只下载原始字节，解码、解析与清洗交给子进程：
+每个任务只传递正文字节、编码与书源字典，子进程按书源缓存编译后的规则。
+"""
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from compiled_source import compile_book_source
+from html_parser import get_parser, set_parser
+from logger import logger
+
+_pool = None
+_processes = 0
+_pool_lock = threading.Lock()
+
+
+def configure_parse_workers(processes):
+    """
+    设置解析进程数：0 或 None 表示不启用（在抓取线程中解析），
+    -1 表示使用全部 CPU 核心。已存在的进程池会被关闭，下次使用时按新设置重建。
+    """
+    global _processes
+    if processes is not None and processes < 0:
+        processes = os.cpu_count() or 1
+    shutdown_parse_pool()
+    _processes = processes or 0
+
+
+def get_parse_pool():
+    """返回全局解析进程池；未启用时返回 None。"""
+    global _pool
+    if not _processes:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # 首次使用时抓取线程已经在运行，fork 会复制其持有的锁，因此使用 spawn
+            _pool = ProcessPoolExecutor(
+                max_workers=_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(get_parser().name,),
+            )
+            logger.info(f"🧮 解析进程池已启动：{_processes} 个进程")
+        return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            if sys.version_info >= (3, 9):
+                _pool.shutdown(cancel_futures=True)
+            else:  # cancel_futures 需要 Python 3.9+；3.8 上等待已提交的任务完成
+                _pool.shutdown()
+            _pool = None
+
+
+# —— 以下在子进程中执行 ——
+
+_worker_rules = {}
+
+
+def _init_worker(parser_name):
+    set_parser(parser_name)
+
+
+def worker_rules(book_source):
+    """子进程内按书源内容缓存 CompiledBookSource，避免每个任务重新编译选择器与正则。"""
+    key = json.dumps(book_source, sort_keys=True, ensure_ascii=False)
+    rules = _worker_rules.get(key)
+    if rules is None:
+        rules = _worker_rules[key] = compile_book_source(book_source)
+    return rules
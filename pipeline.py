@@ -0,0 +1,391 @@
+# novel_crawler/pipeline.py
+"""
+流式章节下载流水线。
+
+任务按章节序号依次提交，但同时在途的任务数不超过并发上限，
+且已完成、等待按序写入的章节数不超过 max_buffer：
+写入端落后时生产端停止提交，内存占用与书的总章节数无关。
+
+单章失败不会终止整本书：失败章节进入重试队列，按指数退避 + 抖动重新提交；
+重试耗尽后写入占位章节并记录到失败清单，写入端继续按序输出后续章节。
+下次运行时 refill_failed 重新抓取这些章节，成功的在小说文件中原地替换占位。
+
+单本书与批量抓取共用 ChapterScheduler：多本书的章节轮流进入同一个工作池，
+每个域名同时调度的章节数不超过该域名限速器当前的并发窗口。
+"""
+import heapq
+import random
+import time
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from chapter_writer import FAILED_PLACEHOLDER, ChapterPatcher
+from logger import logger
+from metrics import get_metrics, log_chapter
+from rate_limiter import get_limiter
+from utils import discard_cached, scrape_chapter
+
+
+class ReorderBuffer:
+    """乱序完成的章节在这里暂存，并按序号连续写出。"""
+
+    def __init__(self, writer, start_index):
+        self.writer = writer
+        self.next_index = start_index
+        self.pending = {}
+        self.failed = 0
+        self.metrics = get_metrics()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, idx, chapter):
+        self.pending[idx] = chapter
+        while self.next_index in self.pending:
+            chapter_to_write = self.pending.pop(self.next_index)
+
+            # 写入与断点记录由 writer 的预写日志保证一致，并批量落盘
+            with self.metrics.timed("write", self.writer.domain):
+                self.writer.append_chapter(self.next_index, chapter_to_write)
+            self.metrics.inc("chapter_written", self.writer.domain)
+
+            log_chapter(f"💾 (已写入) {chapter_to_write['title']} (Index: {self.next_index})")
+
+            self.next_index += 1
+
+
+class RetryQueue:
+    """失败章节的重试队列：按就绪时间排序，退避时间指数增长并带随机抖动。"""
+
+    def __init__(self, max_retries=3, base_delay=5.0, max_delay=120.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = {}
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, idx, ch):
+        """安排一次重试；重试次数已用尽时返回 False。"""
+        attempt = self.attempts.get(idx, 0)
+        if attempt >= self.max_retries:
+            return False
+        self.attempts[idx] = attempt + 1
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)
+        heapq.heappush(self.heap, (time.monotonic() + delay, idx, ch))
+        logger.warning(
+            f"🔁 {ch['title']} 将在 {delay:.1f}s 后重试（第 {attempt + 1}/{self.max_retries} 次）"
+        )
+        return True
+
+    def pop_ready(self):
+        if self.heap and self.heap[0][0] <= time.monotonic():
+            _, idx, ch = heapq.heappop(self.heap)
+            return idx, ch
+        return None
+
+    def next_delay(self):
+        """距离下一个重试就绪的秒数；队列为空时返回 None。"""
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.monotonic())
+
+
+def failed_placeholder(ch):
+    return {
+        "title": ch["title"],
+        "content": FAILED_PLACEHOLDER.format(url=ch["url"]),
+        "url": ch["url"],
+        "failed": True,
+    }
+
+
+class BookJob:
+    """一本书的下载状态：待提交章节、重排缓冲与重试队列。"""
+
+    def __init__(
+        self, chapters, start_index, book_source, writer,
+        pagination="auto", max_buffer=128, retries=None, name=None,
+    ):
+        self.book_source = book_source
+        self.pagination = pagination
+        self.max_buffer = max_buffer
+        self.buffer = ReorderBuffer(writer, start_index)
+        self.retries = retries if retries is not None else RetryQueue()
+        self.name = name or writer.novel_title
+        self.domain = writer.domain
+        self.state = writer.state
+        self.tasks = enumerate(islice(chapters, start_index, None), start=start_index)
+        self.next_task = next(self.tasks, None)
+        self.in_flight = 0
+
+    @property
+    def finished(self):
+        return self.next_task is None and not self.in_flight and not self.retries
+
+    def take(self):
+        """取出下一个可以提交的章节；重试任务序号最小、正阻塞着写入端，优先提交。"""
+        ready = self.retries.pop_ready()
+        if ready is not None:
+            return ready
+        # 序号超出“写入位置 + max_buffer”的章节暂不提交，避免重排缓冲无限增长
+        if self.next_task is not None and self.next_task[0] - self.buffer.next_index < self.max_buffer:
+            task = self.next_task
+            self.next_task = next(self.tasks, None)
+            return task
+        return None
+
+    def complete(self, idx, ch, result, error=None):
+        if error is not None:
+            self._fail(idx, ch, repr(error))
+        elif not result:
+            self._fail(idx, ch, "未能获取或解析正文")
+        else:
+            log_chapter(f"✅ (已抓取) {ch['title']} (Index: {idx})")
+            get_metrics().inc("chapter_fetched", self.domain)
+            if self.state is not None:
+                self.state.mark_fetched(ch["url"], result["content"])
+            self.buffer.put(idx, result)
+
+    def _fail(self, idx, ch, reason):
+        # 缓存的可能正是导致失败的页面（反爬页、占位页），重试与下次运行都要重新请求
+        discard_cached(ch["url"])
+        if self.retries.schedule(idx, ch):
+            get_metrics().inc("chapter_retry", self.domain)
+            if self.state is not None:
+                self.state.mark_retry(ch["url"], reason)
+            return
+        logger.error(f"❌ 抓取失败（重试已用尽）：{ch['title']} - {reason}，写入占位章节")
+        get_metrics().inc("chapter_failed", self.domain)
+        self.buffer.writer.record_failure(idx, ch, reason)
+        self.buffer.failed += 1
+        self.buffer.put(idx, failed_placeholder(ch))
+
+    def flush_delay(self):
+        return self.buffer.writer.flush_delay()
+
+    def close(self):
+        self.buffer.writer.close()
+
+    def log_summary(self):
+        if self.buffer.failed:
+            logger.warning(
+                f"⚠️ {self.name}：共 {self.buffer.failed} 章抓取失败，"
+                f"已写入占位并记录到 {self.buffer.writer.failures_file}"
+            )
+
+
+class ChapterScheduler:
+    """
+    全局章节调度器：在一个工作池中轮流为各本书提交章节，
+    并按域名限制同时调度的章节数，慢站点不会占满所有工作线程。
+    """
+
+    def __init__(self, jobs, concurrency):
+        self.jobs = list(jobs)
+        self.concurrency = concurrency
+        self.in_flight = {}
+        self.domain_load = {}
+        self._cursor = 0
+
+    def _domain_has_room(self, domain):
+        window = max(1, int(get_limiter(domain).window.window))
+        return self.domain_load.get(domain, 0) < window
+
+    def _pick(self):
+        """按轮询顺序从下一本可提交的书中取一个章节。"""
+        jobs = self.jobs
+        for offset in range(len(jobs)):
+            job = jobs[(self._cursor + offset) % len(jobs)]
+            if not self._domain_has_room(job.domain):
+                continue
+            task = job.take()
+            if task is not None:
+                self._cursor = (self._cursor + offset + 1) % len(jobs)
+                return job, task
+        return None
+
+    def _fill(self, submit):
+        while len(self.in_flight) < self.concurrency:
+            picked = self._pick()
+            if picked is None:
+                return
+            job, (idx, ch) = picked
+            handle = submit(job, ch)
+            self.in_flight[handle] = (job, idx, ch)
+            job.in_flight += 1
+            self.domain_load[job.domain] = self.domain_load.get(job.domain, 0) + 1
+
+    def _complete(self, handle, result, error):
+        job, idx, ch = self.in_flight.pop(handle)
+        job.in_flight -= 1
+        self.domain_load[job.domain] -= 1
+        if error is not None and not isinstance(error, Exception):
+            raise error
+        job.complete(idx, ch, result, error)
+
+    def _next_wakeup(self):
+        """距离最近一个重试就绪或日志按时落盘的秒数；都没有时返回 None。"""
+        delays = [job.retries.next_delay() for job in self.jobs if job.retries]
+        delays += [d for d in (job.flush_delay() for job in self.jobs) if d is not None]
+        return min(delays) if delays else None
+
+    def _flush_due(self):
+        for job in self.jobs:
+            job.buffer.writer.flush_if_due()
+
+    def _finish(self):
+        for job in self.jobs:
+            job.close()
+            job.log_summary()
+
+    def _unfinished(self):
+        return any(not job.finished for job in self.jobs)
+
+    def run_threaded(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def submit(job, ch):
+                return executor.submit(
+                    scrape_chapter, ch["url"], job.book_source, ch["title"], job.pagination
+                )
+
+            try:
+                while self._unfinished():
+                    self._fill(submit)
+                    self._flush_due()
+                    if not self.in_flight:
+                        time.sleep(min(self._next_wakeup() or 0.1, 1.0))
+                        continue
+
+                    done, _ = wait(
+                        self.in_flight, timeout=self._next_wakeup(),
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        error = future.exception()
+                        if error is not None:
+                            job, idx, ch = self.in_flight[future]
+                            logger.error(
+                                f"❌ 抓取异常：{ch['title']} (Index: {idx})",
+                                exc_info=error,
+                            )
+                        self._complete(future, None if error else future.result(), error)
+            finally:
+                for future in self.in_flight:
+                    future.cancel()
+                self._finish()
+
+    async def run_async(self):
+        import asyncio
+        from async_fetcher import AsyncFetcher, async_scrape_chapter
+
+        async with AsyncFetcher(limit=self.concurrency) as fetcher:
+            def submit(job, ch):
+                return asyncio.create_task(async_scrape_chapter(
+                    fetcher, ch["url"], job.book_source, ch["title"], job.pagination
+                ))
+
+            try:
+                while self._unfinished():
+                    self._fill(submit)
+                    self._flush_due()
+                    if not self.in_flight:
+                        await asyncio.sleep(min(self._next_wakeup() or 0.1, 1.0))
+                        continue
+
+                    done, _ = await asyncio.wait(
+                        self.in_flight, timeout=self._next_wakeup(),
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    for task in done:
+                        error = task.exception()
+                        if error is not None:
+                            ch = self.in_flight[task][2]
+                            logger.error(f"❌ 抓取异常：{ch['title']} - {error!r}")
+                        self._complete(task, None if error else task.result(), error)
+            finally:
+                for task in self.in_flight:
+                    task.cancel()
+                await asyncio.gather(*self.in_flight, return_exceptions=True)
+                self._finish()
+
+
+def download_chapters(
+    chapters, start_index, book_source, writer,
+    max_workers=64, pagination="auto", max_buffer=None, retries=None,
+):
+    """
+    线程池版本的章节下载。max_workers 只是线程数上限，
+    实际并发由 rate_limiter 中按域名自适应的 AIMD 窗口决定。
+    """
+    job = BookJob(
+        chapters, start_index, book_source, writer,
+        pagination, max_buffer or max_workers * 2, retries,
+    )
+    ChapterScheduler([job], max_workers).run_threaded()
+
+
+async def download_chapters_async(
+    chapters, start_index, book_source, writer,
+    concurrency=200, pagination="auto", max_buffer=None, retries=None,
+):
+    """
+    asyncio 版本的章节下载：单个事件循环驱动所有请求，
+    在途协程数上限为 concurrency，而不是为每章预先创建任务。
+    """
+    job = BookJob(
+        chapters, start_index, book_source, writer,
+        pagination, max_buffer or concurrency * 2, retries,
+    )
+    await ChapterScheduler([job], concurrency).run_async()
+
+
+def refill_job(chapters, book_source, writer, pagination="auto", max_buffer=128, retries=None):
+    """补抓已写入占位的失败章节的任务：写入端为 ChapterPatcher，结束时原地替换占位。"""
+    logger.info(f"🔁 {writer.novel_title}：重新抓取 {len(chapters)} 个之前失败的章节")
+    return BookJob(
+        chapters, 0, book_source, ChapterPatcher(writer), pagination, max_buffer, retries,
+    )
+
+
+def refill_failed(
+    chapters, book_source, writer, engine="thread",
+    concurrency=None, pagination="auto", max_buffer=None, retries=None,
+):
+    """按所选引擎补抓失败章节（见 refill_job），writer 保持打开，之后可以继续追加新章节。"""
+    if concurrency is None:
+        concurrency = 200 if engine == "async" else 64
+    job = refill_job(chapters, book_source, writer, pagination, max_buffer or concurrency * 2, retries)
+    run_jobs([job], engine=engine, concurrency=concurrency)
+
+
+def run_jobs(jobs, engine="thread", concurrency=None):
+    """在同一个工作池中调度多本书的章节。"""
+    if engine == "async":
+        import asyncio  # 线程引擎不需要 asyncio 与 aiohttp，按需导入以缩短启动时间
+
+        asyncio.run(ChapterScheduler(jobs, concurrency or 200).run_async())
+    else:
+        ChapterScheduler(jobs, concurrency or 64).run_threaded()
+
+
+def run_download(
+    chapters, start_index, book_source, writer, engine="thread",
+    concurrency=None, pagination="auto", max_buffer=None, retries=None,
+):
+    """按所选引擎下载 chapters[start_index:] 并按序写入 writer。"""
+    if engine == "async":
+        import asyncio
+
+        asyncio.run(download_chapters_async(
+            chapters, start_index, book_source, writer, concurrency or 200,
+            pagination, max_buffer, retries,
+        ))
+    else:
+        download_chapters(
+            chapters, start_index, book_source, writer, concurrency or 64,
+            pagination, max_buffer, retries,
+        )
@@ -0,0 +1,124 @@
+# novel_crawler/profiling.py
+"""
+--profile 的实现，包裹整次运行：
+- cprofile：确定性统计，但 cProfile 只记录启动它的线程，适合 async 引擎（抓取都在主线程的事件循环里）
+  与目录解析、AI 分析等主线程阶段；结果存为 .prof，可用 pstats / snakeviz 查看；
+- sample：后台线程按固定间隔采样所有线程的调用栈（sys._current_frames），线程引擎下也能看到
+  工作线程的耗时分布；结果存为 collapsed stack 文本，可直接交给 flamegraph.pl 或 speedscope。
+两种模式结束时都会在日志中列出最耗时的函数。
+"""
+import io
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from logger import logger
+
+PROFILE_MODES = ("cprofile", "sample")
+DEFAULT_OUTPUT = {"cprofile": "novel_crawler.prof", "sample": "novel_crawler.folded"}
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 20
+
+# 叶子帧位于这些模块时线程只是在等待任务或 I/O，不计入“活跃”样本
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", os.path.join("concurrent", "futures", "thread.py"))
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """按 interval 秒采样除自身以外所有线程的调用栈，累计 collapsed stack 计数。"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit=TOP_FUNCTIONS):
+        """按自身（叶子帧）与累计（出现在栈中）样本数排序的函数。"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        return own.most_common(limit), total.most_common(limit)
+
+
+@contextmanager
+def profiled(mode, output=None):
+    """mode 为 None 时什么都不做；否则在 with 块运行期间收集性能数据并写入 output。"""
+    if not mode:
+        yield
+        return
+    output = output or DEFAULT_OUTPUT[mode]
+    started = time.perf_counter()
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(output)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            logger.info(
+                f"⏱️ cProfile 结果（{time.perf_counter() - started:.1f}s）已保存到 {output}\n"
+                f"{stream.getvalue()}"
+            )
+        return
+
+    sampler = StackSampler().start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        sampler.write(output)
+        own, total = sampler.top()
+        active = sum(sampler.stacks.values())
+        logger.info(
+            f"⏱️ 采样 {sampler.samples} 次（{time.perf_counter() - started:.1f}s），"
+            f"活跃线程栈 {active} 个，collapsed stack 已保存到 {output}\n"
+            "自身样本最多的函数：\n" + "\n".join(f"{n:>8}  {label}" for label, n in own) +
+            "\n累计样本最多的函数：\n" + "\n".join(f"{n:>8}  {label}" for label, n in total)
+        )
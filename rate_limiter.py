@@ -0,0 +1,213 @@
+# novel_crawler/rate_limiter.py
+import random
+import threading
+import time
+
+from logger import logger
+
+# 默认参数：每个域名独立计算
+DEFAULT_LIMITS = {
+    "rate": 10.0,          # 初始每秒请求数
+    "min_rate": 0.5,
+    "max_rate": 100.0,
+    "burst": 10,           # 令牌桶容量
+    "window": 8,           # 初始并发窗口
+    "min_window": 1,
+    "max_window": 64,
+    "latency_factor": 2.0,  # 近期延迟超过基线的倍数即视为拥塞
+    "latency_slack": 0.25,  # 且至少高出基线这么多秒，避免毫秒级抖动误判
+    "backoff_base": 1.0,   # 重试退避基数（秒）
+    "backoff_max": 60.0,
+}
+
+THROTTLE_STATUS = {429, 503}
+
+
+class TokenBucket:
+    """
+    预约式令牌桶：reserve() 立即扣除一个令牌并返回需要等待的秒数，
+    因此同步线程与协程都可以用各自的 sleep 来等待，无需轮询。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class AIMDWindow:
+    """
+    加性增、乘性减的并发窗口。
+    每收到一个“快速且成功”的响应，窗口增加 1/window（约每轮往返 +1）；
+    遇到限流状态码、超时或延迟明显上升时窗口减半。
+    """
+
+    def __init__(self, window, min_window, max_window, latency_factor, latency_slack):
+        self.window = float(window)
+        self.min_window = min_window
+        self.max_window = max_window
+        self.latency_factor = latency_factor
+        self.latency_slack = latency_slack
+        self.in_flight = 0
+        self.baseline = None   # 慢速 EWMA：站点“正常”延迟
+        self.recent = None     # 快速 EWMA：近期延迟
+        self.last_decrease = 0.0
+
+    def try_enter(self):
+        if self.in_flight < int(self.window):
+            self.in_flight += 1
+            return True
+        return False
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def observe_latency(self, latency):
+        if self.baseline is None:
+            self.baseline = self.recent = latency
+            return False
+        self.recent = 0.7 * self.recent + 0.3 * latency
+        self.baseline = 0.95 * self.baseline + 0.05 * min(latency, self.recent)
+        threshold = max(self.baseline * self.latency_factor, self.baseline + self.latency_slack)
+        return self.recent > threshold
+
+    def increase(self):
+        self.window = min(self.max_window, self.window + 1.0 / self.window)
+
+    def decrease(self, now):
+        # 同一轮拥塞只减一次，避免并发失败把窗口瞬间压到最小
+        if now - self.last_decrease < max(self.recent or 0.0, 0.5):
+            return False
+        self.window = max(self.min_window, self.window / 2)
+        self.last_decrease = now
+        return True
+
+
+class DomainLimiter:
+    """
+    单个域名的限速器：令牌桶控制请求速率，AIMD 窗口控制在途请求数。
+    同一进程内的所有线程与协程共享同一个实例。
+    """
+
+    def __init__(self, domain, limits):
+        self.domain = domain
+        self.limits = limits
+        self.bucket = TokenBucket(limits["rate"], limits["burst"])
+        self.window = AIMDWindow(
+            limits["window"], limits["min_window"],
+            limits["max_window"], limits["latency_factor"], limits["latency_slack"],
+        )
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+
+    def _try_enter(self):
+        """尝试占用一个窗口名额，成功时返回需要等待的秒数，否则返回 None。"""
+        with self.cond:
+            if not self.window.try_enter():
+                return None
+            pause = max(0.0, self.paused_until - time.monotonic())
+            return max(pause, self.bucket.reserve())
+
+    def acquire(self):
+        while True:
+            wait = self._try_enter()
+            if wait is not None:
+                break
+            with self.cond:
+                self.cond.wait(0.5)
+        if wait:
+            time.sleep(wait)
+        return time.monotonic()
+
+    async def acquire_async(self):
+        import asyncio  # 只有 async 引擎会调用，避免线程引擎启动时导入
+
+        while True:
+            wait = self._try_enter()
+            if wait is not None:
+                break
+            await asyncio.sleep(0.05)
+        if wait:
+            await asyncio.sleep(wait)
+        return time.monotonic()
+
+    def release(self, started, status=None, retry_after=None):
+        """
+        请求结束后调用。status 为 HTTP 状态码，网络异常/超时传 None。
+        """
+        now = time.monotonic()
+        latency = now - started
+        limits = self.limits
+        with self.cond:
+            self.window.leave()
+            throttled = status is None or status in THROTTLE_STATUS
+            if not throttled and status < 400:
+                congested = self.window.observe_latency(latency)
+            else:
+                congested = False
+
+            if throttled or congested:
+                if self.window.decrease(now):
+                    self.bucket.rate = max(limits["min_rate"], self.bucket.rate / 2)
+                    logger.info(
+                        f"🐢 {self.domain} 降速：窗口 {self.window.window:.1f}，"
+                        f"速率 {self.bucket.rate:.1f}/s（状态 {status}，延迟 {latency:.2f}s）"
+                    )
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            elif status < 400:
+                self.window.increase()
+                self.bucket.rate = min(
+                    limits["max_rate"], self.bucket.rate + 1.0 / max(self.bucket.rate, 1.0)
+                )
+            self.cond.notify_all()
+
+    def retry_delay(self, attempt):
+        """指数退避 + 抖动，并遵守服务端 Retry-After。"""
+        base = min(self.limits["backoff_max"], self.limits["backoff_base"] * (2 ** attempt))
+        delay = random.uniform(base / 2, base)
+        return max(delay, self.paused_until - time.monotonic())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_limits = dict(DEFAULT_LIMITS)
+
+
+def configure_limits(**overrides):
+    """修改之后新建的域名限速器参数（如 rate、max_window）。"""
+    for key, value in overrides.items():
+        if value is None:
+            continue
+        if key not in _limits:
+            raise ValueError(f"未知的限速参数: {key}")
+        _limits[key] = value
+
+
+def get_limiter(domain) -> DomainLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(domain)
+        if limiter is None:
+            limiter = _limiters[domain] = DomainLimiter(domain, dict(_limits))
+        return limiter
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（仅支持秒数形式），无法解析时返回 None。"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,215 @@
+# novel_crawler/selector_inference.py
+"""
+本地结构分析：在调用 LLM 之前，先用启发式规则推断书源选择器。
+
+- 目录：在每个父节点下，把同标签同 class 的子节点分组，取各组中指向同一 URL 目录前缀的
+  站内链接数量作为得分，得分最高的几组即为章节列表候选；
+- 正文：按节点“直接文字量”（自身文本节点与 <p> 子节点的文字，不含链接文字）打分，
+  取文字最密集的几个节点作为正文候选。
+
+候选选择器用 extract_toc 与 extract_chapter_page 逐一检验：目录至少 MIN_CHAPTERS 章，
+正文在至少 MIN_VERIFIED_PAGES 个不同章节上都能取到 MIN_CONTENT_CHARS 字以上，全部失败时才交给 AIAnalyzer。
+推断出的书源带 bookSourceGroup = INFERRED_GROUP 标记，之后抓取失败时由 main 从书源文件中删除。
+"""
+import posixpath
+import re
+from urllib.parse import urljoin, urlparse
+
+from compiled_source import compile_book_source
+from dom_skeleton import parse_tree
+from logger import logger
+from utils import extract_chapter_page, extract_toc, fetch_html
+
+MIN_CHAPTERS = 20           # 目录候选至少包含这么多章
+MIN_CONTENT_CHARS = 300     # 正文候选至少包含这么多字
+MIN_VERIFIED_PAGES = 2      # 正文规则至少在这么多个不同章节上验证通过
+SAMPLE_ATTEMPTS = 3         # 额外样本章节最多尝试抓取的次数
+MAX_CANDIDATES = 3
+INFERRED_GROUP = "自动识别"
+
+_CSS_IDENT = re.compile(r"^-?[A-Za-z_][\w-]*$")
+
+
+def _classes(node):
+    return [c for c in (node.get("class") or "").split() if _CSS_IDENT.match(c)]
+
+
+def _step(node):
+    """单个节点的选择器片段：有 id 用 #id，否则 tag.class。"""
+    node_id = node.get("id")
+    if node_id and _CSS_IDENT.match(node_id):
+        return f"#{node_id}"
+    return node.tag + "".join(f".{c}" for c in _classes(node))
+
+
+def css_path(node):
+    """从最近的带 id 的祖先（或 body）开始，用子代组合符拼出节点的选择器。"""
+    steps = []
+    while node is not None and node.tag not in ("#root", "html"):
+        step = _step(node)
+        steps.append(step)
+        if step.startswith("#") or node.tag == "body":
+            break
+        node = node.parent
+    return " > ".join(reversed(steps))
+
+
+def _first_link(node):
+    if node.tag == "a":
+        return node
+    for el in node.iter():
+        if el.tag == "a" and el.get("href"):
+            return el
+    return None
+
+
+def _url_prefix(url):
+    path = urlparse(url).path
+    return posixpath.dirname(path.rstrip("/")) if not path.endswith("/") else path
+
+
+def toc_candidates(tree, toc_url):
+    """返回 [(得分, chapterList 选择器)]，按得分从高到低。"""
+    domain = urlparse(toc_url).netloc
+    scored = {}
+    for parent in tree.iter():
+        groups = {}
+        for child in parent.elements():
+            groups.setdefault((child.tag, tuple(_classes(child))), []).append(child)
+        for (tag, _), children in groups.items():
+            if len(children) < MIN_CHAPTERS:
+                continue
+            prefixes = {}
+            for child in children:
+                link = _first_link(child)
+                if link is None:
+                    continue
+                href = link.get("href", "").strip()
+                if not href or href.startswith(("javascript:", "#", "mailto:")):
+                    continue
+                url = urljoin(toc_url, href)
+                if urlparse(url).netloc != domain:
+                    continue
+                prefix = _url_prefix(url)
+                prefixes[prefix] = prefixes.get(prefix, 0) + 1
+            if not prefixes:
+                continue
+            score = max(prefixes.values())
+            if score < MIN_CHAPTERS:
+                continue
+            child_step = tag + "".join(f".{c}" for c in _classes(children[0]))
+            selector = f"{css_path(parent)} > {child_step}"
+            if tag != "a":
+                selector += " a"
+            scored[selector] = max(scored.get(selector, 0), score)
+    return sorted(((s, sel) for sel, s in scored.items()), reverse=True)[:MAX_CANDIDATES]
+
+
+def _direct_text(node):
+    """节点自身的文本节点与 <p>/<span> 子节点中的文字（不含链接）。"""
+    total = 0
+    for child in node.children:
+        if child.tag is None:
+            total += len(child.text)
+        elif child.tag in ("p", "span", "font"):
+            total += sum(len(t.text) for t in child.children if t.tag is None)
+    return total
+
+
+def content_candidates(tree):
+    """返回 [(文字量, content 选择器)]，按文字量从高到低。"""
+    scored = []
+    for node in tree.iter():
+        if node.tag in ("#root", "html", "body", "a", "p", "span", "font", "li", "dd"):
+            continue
+        chars = _direct_text(node)
+        if chars >= MIN_CONTENT_CHARS:
+            scored.append((chars, css_path(node)))
+    scored.sort(reverse=True)
+    seen = []
+    for chars, selector in scored:
+        if selector not in (s for _, s in seen):
+            seen.append((chars, selector))
+        if len(seen) >= MAX_CANDIDATES:
+            break
+    return seen
+
+
+def is_inferred(book_source):
+    """书源是否由本地结构分析自动生成（未经 AI 或人工确认）。"""
+    return bool(book_source) and book_source.get("bookSourceGroup") == INFERRED_GROUP
+
+
+def _sample_pages(chapters, chapter_url, chapter_html):
+    """
+    已下载的样本章节页之外，再从目录中均匀取几章抓取，凑够 MIN_VERIFIED_PAGES 个不同章节的页面。
+    返回 [(url, html)]，不够时返回 None。
+    """
+    pages = [(chapter_url, chapter_html)]
+    urls = [ch["url"] for ch in chapters if ch["url"] != chapter_url]
+    picks = dict.fromkeys(urls[len(urls) * k // (SAMPLE_ATTEMPTS + 1)] for k in range(1, SAMPLE_ATTEMPTS + 1))
+    for url in picks:
+        if len(pages) >= MIN_VERIFIED_PAGES:
+            break
+        html = fetch_html(url)
+        if html:
+            pages.append((url, html))
+    return pages if len(pages) >= MIN_VERIFIED_PAGES else None
+
+
+def _content_ok(pages, book_source):
+    rules = compile_book_source(book_source)
+    for url, html in pages:
+        content = extract_chapter_page(html, url, rules)[0]
+        if not content or len(content) < MIN_CONTENT_CHARS:
+            return False
+    return True
+
+
+def infer_book_source(toc_html, toc_url, chapter_html, domain, chapter_url):
+    """
+    推断并验证书源规则，成功时返回 (book_source, chapters)，否则返回 None。
+    目录与第一个正文样本使用已下载的页面；另外再抓取至少一章验证正文规则。
+    """
+    toc_options = toc_candidates(parse_tree(toc_html), toc_url)
+    content_options = content_candidates(parse_tree(chapter_html))
+    if not toc_options or not content_options:
+        logger.info("🧭 本地结构分析：未找到候选规则")
+        return None
+
+    book_source = {
+        "bookSourceName": f"{domain}（自动识别）",
+        "bookSourceGroup": INFERRED_GROUP,
+        "bookSourceUrl": f"https://{domain}",
+        "enabled": True,
+        "bookSourceType": 0,
+        "ruleToc": {"chapterList": "", "chapterName": "text", "chapterUrl": "href"},
+        "ruleContent": {"content": ""},
+    }
+
+    chapters = None
+    for score, selector in toc_options:
+        book_source["ruleToc"]["chapterList"] = selector
+        chapters = extract_toc(toc_html, toc_url, book_source)
+        if len(chapters) >= MIN_CHAPTERS:
+            break
+        chapters = None
+    if not chapters:
+        logger.info("🧭 本地结构分析：目录候选均未通过验证")
+        return None
+
+    pages = _sample_pages(chapters, chapter_url, chapter_html)
+    if pages is None:
+        logger.info("🧭 本地结构分析：无法获取更多样本章节，不使用本地规则")
+        return None
+
+    for chars, selector in content_options:
+        book_source["ruleContent"]["content"] = selector
+        if _content_ok(pages, book_source):
+            logger.info(
+                f"🧭 本地结构分析通过：目录 {book_source['ruleToc']['chapterList']}"
+                f"（{len(chapters)} 章），正文 {selector}（{len(pages)} 章验证）"
+            )
+            return book_source, chapters
+    logger.info("🧭 本地结构分析：正文候选均未通过验证")
+    return None
@@ -0,0 +1,264 @@
+# novel_crawler/state_store.py
+"""
+按书记录抓取状态的 SQLite 数据库（checkpoints/state.sqlite3）。
+
+每本书以 book_key（域名 + 目录页 URL 哈希）区分，同一站点的多本书互不干扰。
+chapters 表以 (book_key, url) 为主键，记录每章在目录中的位置、状态
+（pending / fetched / written / failed）、正文哈希、重试次数与各阶段时间戳，
+并按 (book_key, status) 与 (book_key, idx) 建立索引。
+
+写入在内存事务中累积，由 ChapterWriter 落盘时一并提交，避免每章一次 fsync。
+续爬时以本表为准：written_at 为空的章节（pending / fetched，以及尚未写入的 failed）重新调度；
+状态事务在断点日志之后提交，崩溃时少记的最后一批由 restore_written 按日志补记。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from chapter_store import open_store
+from chapter_writer import CHECKPOINTS_DIR, ChapterWriter
+
+STATE_DB = os.path.join(CHECKPOINTS_DIR, "state.sqlite3")
+
+PENDING = "pending"
+FETCHED = "fetched"
+WRITTEN = "written"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book_key   TEXT PRIMARY KEY,
+    toc_url    TEXT NOT NULL,
+    domain     TEXT NOT NULL,
+    title      TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    book_key     TEXT NOT NULL,
+    url          TEXT NOT NULL,
+    idx          INTEGER NOT NULL,
+    title        TEXT,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    content_hash TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    fetched_at   REAL,
+    written_at   REAL,
+    updated_at   REAL NOT NULL,
+    PRIMARY KEY (book_key, url)
+);
+CREATE INDEX IF NOT EXISTS chapters_status ON chapters (book_key, status);
+CREATE INDEX IF NOT EXISTS chapters_idx ON chapters (book_key, idx);
+"""
+
+
+def book_key(toc_url):
+    """每本书的稳定标识：域名 + 目录页 URL 哈希前 16 位。"""
+    digest = hashlib.sha256(toc_url.encode("utf-8")).hexdigest()[:16]
+    return f"{urlparse(toc_url).netloc}-{digest}"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def executemany(self, sql, rows):
+        with self._lock:
+            self._conn.executemany(sql, rows)
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def book(self, key, toc_url, title=None):
+        now = time.time()
+        self.execute(
+            "INSERT INTO books (book_key, toc_url, domain, title, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(book_key) DO UPDATE SET title = excluded.title, updated_at = excluded.updated_at",
+            (key, toc_url, urlparse(toc_url).netloc, title, now, now),
+        )
+        self.commit()
+        return BookState(self, key)
+
+
+class BookState:
+    """单本书的章节状态读写。"""
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def register(self, chapters, start=0):
+        """
+        登记目录中的章节；已存在的章节只更新位置与标题，保留状态。
+        目录分页逐页登记时，start 为本页第一章在整份目录中的序号。
+        """
+        now = time.time()
+        self.store.executemany(
+            "INSERT INTO chapters (book_key, url, idx, title, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(book_key, url) DO UPDATE SET idx = excluded.idx, title = excluded.title",
+            [(self.key, ch["url"], idx, ch["title"], now) for idx, ch in enumerate(chapters, start)],
+        )
+        self.store.commit()
+
+    def mark_fetched(self, url, content):
+        now = time.time()
+        self.store.execute(
+            "UPDATE chapters SET status = ?, content_hash = ?, error = NULL, "
+            "fetched_at = ?, updated_at = ? WHERE book_key = ? AND url = ?",
+            (FETCHED, content_hash(content), now, now, self.key, url),
+        )
+
+    def mark_retry(self, url, reason):
+        self.store.execute(
+            "UPDATE chapters SET attempts = attempts + 1, error = ?, updated_at = ? "
+            "WHERE book_key = ? AND url = ?",
+            (reason, time.time(), self.key, url),
+        )
+
+    def mark_failed(self, url, reason):
+        self.store.execute(
+            "UPDATE chapters SET status = ?, error = ?, updated_at = ? WHERE book_key = ? AND url = ?",
+            (FAILED, reason, time.time(), self.key, url),
+        )
+
+    def mark_written(self, url, now=None):
+        """章节已写入小说文件；写入的是失败占位时保留 failed 状态。now 与断点日志记录的时间一致。"""
+        now = now or time.time()
+        self.store.execute(
+            "UPDATE chapters SET status = CASE WHEN status = ? THEN status ELSE ? END, "
+            "written_at = ?, updated_at = ? WHERE book_key = ? AND url = ?",
+            (FAILED, WRITTEN, now, now, self.key, url),
+        )
+
+    def restore_written(self, records, written_before=None):
+        """
+        按断点日志对齐写入状态。records 中的章节补记为已写入：带 failed 标记的是失败占位，
+        记为 failed（之后已补抓成功的保持 written）。同一数据库中其他事务的提交可能把
+        日志尚未落盘的章节一并提交，written_at 晚于 written_before 的章节因此撤销写入标记。
+        """
+        now = time.time()
+        if written_before is not None:
+            self.store.execute(
+                "UPDATE chapters SET status = CASE WHEN status = ? THEN ? ELSE status END, "
+                "written_at = NULL, updated_at = ? WHERE book_key = ? AND written_at > ?",
+                (WRITTEN, FETCHED, now, self.key, written_before),
+            )
+        self.store.executemany(
+            "UPDATE chapters SET status = CASE WHEN status = ? OR NOT ? THEN ? ELSE ? END, "
+            "written_at = COALESCE(written_at, ?), updated_at = ? WHERE book_key = ? AND url = ?",
+            [
+                (WRITTEN, bool(r.get("failed")), WRITTEN, FAILED, r.get("time", now), now, self.key, r["url"])
+                for r in records if r.get("url")
+            ],
+        )
+        self.store.commit()
+
+    def written_urls(self):
+        """已写入小说文件的章节 URL（含失败占位）。"""
+        return {row["url"] for row in self.chapters() if row["written_at"] is not None}
+
+    def commit(self):
+        self.store.commit()
+
+    def counts(self):
+        """各状态的章节数。"""
+        rows = self.store.query(
+            "SELECT status, COUNT(*) FROM chapters WHERE book_key = ? GROUP BY status",
+            (self.key,),
+        )
+        return dict(rows)
+
+    def chapters(self, status=None):
+        """按目录顺序返回章节记录（dict），可按状态过滤。"""
+        sql = (
+            "SELECT url, idx, title, status, content_hash, attempts, error, fetched_at, written_at "
+            "FROM chapters WHERE book_key = ?"
+        )
+        params = [self.key]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        columns = (
+            "url", "idx", "title", "status", "content_hash",
+            "attempts", "error", "fetched_at", "written_at",
+        )
+        return [
+            dict(zip(columns, row))
+            for row in self.store.query(sql + " ORDER BY idx", params)
+        ]
+
+
+def failed_chapters(writer, chapters):
+    """
+    需要补抓的章节：已写入小说文件、但写入的是失败占位的章节（状态库中 written_at 不为空而状态不是 written），
+    以及失败清单中状态库没有记录的章节。按目录顺序返回，已不在目录中的排在最后。
+    """
+    rows = {row["url"]: row for row in writer.state.chapters()} if writer.state is not None else {}
+    failures = writer.load_failures()
+    wanted = {
+        url for url, row in rows.items()
+        if row["written_at"] is not None and row["status"] != WRITTEN
+    }
+    wanted.update(url for url in failures if url not in rows)
+    result = [ch for ch in chapters if ch["url"] in wanted]
+    listed = {ch["url"] for ch in result}
+    for url in sorted(wanted - listed, key=lambda u: rows[u]["idx"] if u in rows else failures[u]["index"]):
+        title = rows[url]["title"] if url in rows else failures[url]["title"]
+        result.append({"title": title, "url": url})
+    return result
+
+
+def open_book(toc_url, novel_title):
+    """
+    为一本书创建按 book_key 记录断点与状态的 ChapterWriter；
+    启用章节库（chapter_store.configure_chapter_store）时同时写入 library/{book_key}/。
+    """
+    key = book_key(toc_url)
+    state = get_state_store().book(key, toc_url, novel_title)
+    store = open_store(key)
+    if store is not None:
+        store.save_meta(book_key=key, toc_url=toc_url, title=novel_title)
+    return ChapterWriter(
+        urlparse(toc_url).netloc, novel_title, book_key=key, state=state, store=store,
+    )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StateStore(STATE_DB)
+        return _store
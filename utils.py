@@ -1,15 +1,49 @@
 # novel_crawler/utils.py
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
-import cloudscraper
 from logger import logger
-from cleaner import clean_content
-
-scraper = cloudscraper.create_scraper(
-    browser={"browser": "chrome", "platform": "windows", "mobile": False}, delay=10
-)
+from html_parser import parse_html
+from compiled_source import compile_book_source, parse_booksource_selector  # noqa: F401
+from rate_limiter import DEFAULT_LIMITS, get_limiter, parse_retry_after
+from http_cache import CHAPTER_TTL, TOC_TTL, decode_body, get_cache
+from decoding import detect_encoding, sniff_encoding
+from parse_pool import get_parse_pool, worker_rules
+from metrics import get_metrics
+
+_scraper = None
+_scraper_lock = threading.Lock()
+_pool_size = DEFAULT_LIMITS["max_window"]
+
+
+def configure_http_pool(size):
+    """设置每个域名保留的 HTTP 连接数，应不小于下载线程数；需在首次请求前调用。"""
+    global _pool_size
+    if size:
+        _pool_size = max(int(size), 1)
+
+
+def get_scraper():
+    """首次请求时才导入 cloudscraper 并创建会话；全部命中缓存或使用 async 引擎时不会创建。"""
+    global _scraper
+    with _scraper_lock:
+        if _scraper is None:
+            import cloudscraper
+
+            _scraper = cloudscraper.create_scraper(
+                browser={"browser": "chrome", "platform": "windows", "mobile": False}, delay=10
+            )
+            # urllib3 默认每个域名只保留 10 个连接，线程数更多时会反复丢弃重连；
+            # https:// 上是 cloudscraper 自带的 TLS 适配器，只重建连接池而不替换
+            for prefix in ("http://", "https://"):
+                adapter = _scraper.get_adapter(prefix)
+                adapter._pool_maxsize = _pool_size
+                adapter.init_poolmanager(
+                    adapter._pool_connections, _pool_size, block=adapter._pool_block
+                )
+        return _scraper
 
 DEFAULT_HEADERS = {
     "User-Agent": (
@@ -23,36 +57,270 @@ def get_domain(url):
     return urlparse(url).netloc
 
 
-def fetch_html(url, retries=3, delay=2):
+def fetch_html(url, retries=3, cache_ttl=CHAPTER_TTL):
+    """
+    抓取页面并返回解码后的 HTML。命中未过期的磁盘缓存时不发请求；
+    缓存过期但带 ETag/Last-Modified 时发送条件请求，304 直接复用缓存。
+    cache_ttl 为缓存有效期（秒），None 表示永不过期。
+    """
+    page = _fetch(url, retries, cache_ttl, detect=True)
+    if page is None:
+        return None
+    return decode_body(*page)
+
+
+def fetch_raw(url, retries=3, cache_ttl=CHAPTER_TTL):
+    """
+    与 fetch_html 相同的缓存与重试语义，但返回 (正文字节, 编码) 而不解码；
+    抓取线程只走编码快速路径（响应头、meta、站点记忆），仍无法确定时为 None，
+    由解析进程做整页检测。
+    """
+    return _fetch(url, retries, cache_ttl, detect=False)
+
+
+def _fetch(url, retries, cache_ttl, detect):
+    domain = get_domain(url)
+    metrics = get_metrics()
+    cache = get_cache()
+    entry = cache.get(url) if cache else None
+    if entry and entry.is_fresh(cache_ttl):
+        body = entry.body()
+        if body is not None:
+            metrics.inc("cache_hit", domain)
+            return body, entry.meta.get("encoding")
+        entry = None
+
+    headers = dict(DEFAULT_HEADERS)
+    if entry:
+        headers.update(entry.validators())
+
+    limiter = get_limiter(domain)
+    scraper = get_scraper()
     for attempt in range(retries):
+        started = limiter.acquire()
+        begin = time.perf_counter()  # 不计限速器排队时间
+        status = None
+        retry_after = None
+        ok = False
         try:
-            response = scraper.get(url, timeout=15, headers=DEFAULT_HEADERS)
+            response = scraper.get(url, timeout=15, headers=headers)
+            status = response.status_code
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if status == 304 and entry:
+                ok = True
+                metrics.inc("not_modified", domain)
+                cache.refresh(entry, response.headers)
+                body = entry.body()
+                return (body, entry.meta.get("encoding")) if body is not None else None
             response.raise_for_status()
-            response.encoding = response.apparent_encoding or "utf-8"
-            return response.text
+            ok = True
+            metrics.inc("bytes", domain, len(response.content))
+            encoding = (detect_encoding if detect else sniff_encoding)(
+                response.content, response.headers.get("Content-Type"), domain
+            )
+            if cache:
+                cache.put(url, response.content, encoding, response.headers)
+            return response.content, encoding
         except Exception as e:
             logger.warning(f"[retry {attempt + 1}] 请求失败: {e}")
-            time.sleep(delay)
+        finally:
+            limiter.release(started, status, retry_after)
+            metrics.observe("fetch", domain, time.perf_counter() - begin, ok)
+        if attempt + 1 < retries:
+            time.sleep(limiter.retry_delay(attempt))
     logger.error(f"❌ 多次请求失败：{url}")
     return None
 
 
-def parse_booksource_selector(selector: str):
-    main_part, *filters = selector.split("##")
-    if "@textNodes" in main_part:
-        css_selector = main_part.replace("@textNodes", "")
-        filter_type = "textNodes"
-    elif "@text" in main_part:
-        css_selector = main_part.replace("@text", "")
-        filter_type = "text"
+# 分页章节：形如 123_2.html / 123-2.html 的子页地址
+PAGE_URL_PATTERN = re.compile(r"^(?P<stem>.+?)(?P<sep>[_-])(?P<page>\d+)(?P<ext>\.s?html?)$")
+# 页数提示，如“第1/3页”“(1/3)”；只在正文与翻页栏内查找，避免误匹配页面其他位置的“(1/3)”
+PAGE_COUNT_PATTERN = re.compile(r"第\s*\d+\s*/\s*(\d+)\s*页|[(（]\s*\d+\s*/\s*(\d+)\s*[)）]")
+LAST_PAGE_TEXTS = ("尾页", "末页", "最后一页", "最后页")
+MAX_SUB_PAGES = 50
+
+_page_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="page")
+
+
+def detect_page_urls(doc, page_url, next_url, hint_nodes=()):
+    """
+    根据第一页推断章节的全部剩余分页地址，用于并行预取。
+    要求“下一页”形如 {第一页去扩展名}_2.html。有尾页链接时只以它为准；否则取
+    同前缀分页链接中的最大页码与 hint_nodes（正文、翻页栏）内“第1/3页”文字中的较大者。
+    无法确定时返回 None。
+    """
+    match = PAGE_URL_PATTERN.match(next_url)
+    if not match or match.group("page") != "2":
+        return None
+
+    stem, sep, ext = match.group("stem"), match.group("sep"), match.group("ext")
+    first_path = urlparse(page_url)._replace(query="", fragment="").geturl()
+    if not (first_path == stem + ext or first_path.startswith(stem + sep + "1.")):
+        return None
+
+    last_page = 0
+    for a in doc.links():
+        link_match = PAGE_URL_PATTERN.match(urljoin(page_url, a.get("href")))
+        if not link_match or link_match.group("stem") != stem:
+            continue
+        page = int(link_match.group("page"))
+        if a.text(strip=True) in LAST_PAGE_TEXTS:
+            last_page = page
+            break
+        last_page = max(last_page, page)
     else:
-        css_selector = main_part
-        filter_type = "text"
-    return css_selector.strip(), filter_type, filters
+        for node in hint_nodes:
+            count_match = PAGE_COUNT_PATTERN.search(node.text()) if node is not None else None
+            if count_match:
+                last_page = max(last_page, int(count_match.group(1) or count_match.group(2)))
+                break
+
+    if last_page < 2:
+        return None
+
+    last_page = min(last_page, MAX_SUB_PAGES)
+    return [f"{stem}{sep}{page}{ext}" for page in range(2, last_page + 1)]
+
+
+def extract_chapter_page(html, page_url, rules, detect_pages=False):
+    """
+    按编译后的书源规则解析单个章节分页，返回 (正文, 下一页 URL, 剩余分页 URL 列表)。
+    正文匹配失败时返回 (None, None, None)；detect_pages 为 False 或无法识别分页规律时，
+    剩余分页列表为 None。同步与异步抓取共用此函数，保证两种引擎的解析结果一致。
+    """
+    if rules.content_selector is None:
+        logger.error(f"❌ 书源 {rules.name} 缺少 'ruleContent' 规则")
+        return None, None, None
+
+    doc = parse_html(html)
+
+    content_el = doc.select_one(rules.content_selector)
+    if not content_el or not content_el.text(strip=True):
+        logger.error(f"⚠️ 无法匹配正文：{rules.content_css} @ {page_url}")
+        return None, None, None
+
+    # strip=True 时 <br> 两侧本就按文本节点分行，无需再替换
+    content = content_el.text(separator="\n", strip=True)
+
+    content = rules.filter_content(content)
+
+    next_link = None
+    for pattern in rules.next_link_patterns:
+        next_link = doc.find_link(pattern)
+        if next_link:
+            break
+
+    next_url = None
+    if next_link and next_link.get("href"):
+        next_url = urljoin(page_url, next_link.get("href"))
+        if next_url == page_url or get_domain(next_url) != get_domain(page_url):
+            next_url = None
+
+    page_urls = None
+    if detect_pages and next_url:
+        page_urls = detect_page_urls(doc, page_url, next_url, (content_el, next_link.parent()))
 
-def scrape_chapter(url, book_source, known_title: str):
-    rule_content = book_source.get("ruleContent", {}).get("content", "")
-    selector, ftype, filters = parse_booksource_selector(rule_content)
+    return content, next_url, page_urls
+
+
+def is_later_sub_page(next_url, last_page_url):
+    """判断 next_url 是否仍是同一章节中页码更大的分页（用于页数推断偏少时续走）。"""
+    next_match = PAGE_URL_PATTERN.match(next_url)
+    last_match = PAGE_URL_PATTERN.match(last_page_url)
+    return bool(
+        next_match and last_match
+        and next_match.group("stem") == last_match.group("stem")
+        and int(next_match.group("page")) > int(last_match.group("page"))
+    )
+
+
+def merge_sub_pages(full_content, page_urls, results, next_url):
+    """
+    按页码拼接并行预取的分页，返回之后仍需顺序跟随的下一页 URL（没有则为 None）。
+    某个推断的分页不存在或抓取失败时，丢弃其后的结果，从前一页的“下一页”链接改为顺序跟随；
+    推断的页数偏少时，从最后一页继续顺序跟随。next_url 为第一页的“下一页”链接。
+    """
+    for page_url, (content, page_next) in zip(page_urls, results):
+        if content is None:
+            logger.warning(f"⚠️ 推断的分页获取失败，改为顺序翻页：{page_url}")
+            return next_url
+        full_content.append(content)
+        next_url = page_next
+    if next_url and is_later_sub_page(next_url, page_urls[-1]):
+        return next_url
+    return None
+
+
+def parse_page_worker(body, encoding, page_url, book_source, detect_pages=False):
+    """在解析进程中执行：解码并解析一个章节分页，返回值同 extract_chapter_page。"""
+    return extract_chapter_page(
+        decode_body(body, encoding), page_url, worker_rules(book_source), detect_pages
+    )
+
+
+def clean_worker(parts, book_source):
+    """在解析进程中执行：拼接各分页正文并清洗。"""
+    return worker_rules(book_source).clean("\n".join(parts))
+
+
+def discard_cached(url):
+    """删除 url 的响应缓存，下次抓取时重新请求（正文匹配失败或章节进入重试时调用）。"""
+    cache = get_cache()
+    if cache:
+        cache.discard(url)
+
+
+def _load_page(page_url, rules, detect_pages=False):
+    """
+    抓取并解析一个章节分页，返回 (正文, 下一页 URL, 剩余分页 URL 列表)；页面获取失败时返回 None。
+    启用解析进程池时，当前线程只下载原始字节，解码与解析在子进程中完成。
+    正文匹配失败的页面从缓存中删除。
+    """
+    pool = get_parse_pool()
+    if pool is None:
+        html = fetch_html(page_url)
+        if not html:
+            return None
+        begin = time.perf_counter()
+        page = extract_chapter_page(html, page_url, rules, detect_pages)
+    else:
+        raw = fetch_raw(page_url)
+        if raw is None:
+            return None
+        body, encoding = raw
+        begin = time.perf_counter()
+        page = pool.submit(
+            parse_page_worker, body, encoding, page_url, rules.source, detect_pages
+        ).result()
+    get_metrics().observe("parse", get_domain(page_url), time.perf_counter() - begin, page[0] is not None)
+    if page[0] is None:
+        discard_cached(page_url)
+    return page
+
+
+def _clean_chapter(parts, rules, domain=None):
+    with get_metrics().timed("clean", domain):
+        pool = get_parse_pool()
+        if pool is None:
+            return rules.clean("\n".join(parts))
+        return pool.submit(clean_worker, parts, rules.source).result()
+
+
+def _fetch_sub_page(page_url, rules):
+    page = _load_page(page_url, rules)
+    if page is None:
+        return None, None
+    content, next_url, _ = page
+    return content, next_url
+
+
+def scrape_chapter(url, book_source, known_title: str, pagination="auto"):
+    """
+    抓取整章正文。pagination="auto" 时，若第一页能推断出全部分页地址，
+    则并行抓取剩余分页并按页码拼接；否则（或 pagination="sequential"）逐页跟随“下一页”。
+    book_source 可以是书源字典，也可以是已编译的 CompiledBookSource（批量抓取时应复用）。
+    """
+    rules = compile_book_source(book_source)
 
     full_content = []
     current_url = url
@@ -60,118 +328,210 @@ def scrape_chapter(url, book_source, known_title: str):
     title = known_title
 
     while current_url:
-        html = fetch_html(current_url)
-        if not html:
+        page = _load_page(
+            current_url, rules,
+            detect_pages=pagination == "auto" and current_url == url,
+        )
+        if page is None:
             return None
 
-        soup = BeautifulSoup(html, 'html.parser')
-
-        content_el = soup.select_one(selector)
-        if not content_el or not content_el.get_text(strip=True):
-            logger.error(f"⚠️ 无法匹配正文：{selector} @ {current_url}")
+        content, next_url, page_urls = page
+        if content is None:
             return None
 
-        for br in content_el.find_all("br"):
-            br.replace_with("\n")
+        full_content.append(content)
 
-        content = content_el.get_text(separator="\n", strip=True)
+        if page_urls:
+            results = list(_page_executor.map(
+                lambda u: _fetch_sub_page(u, rules), page_urls
+            ))
+            next_url = merge_sub_pages(full_content, page_urls, results, next_url)
 
-        for f in filters:
-            content = re.sub(f, "", content)
+        current_url = next_url
 
-        full_content.append(content)
+    cleaned_content = _clean_chapter(full_content, rules, get_domain(url))
 
-        next_link_texts = ["下一页", "Next", "next"]
-        next_link = None
-        for text in next_link_texts:
-            next_link = soup.find("a", string=re.compile(r"^\s*" + re.escape(text) + r"\s*$"))
-            if next_link:
-                break
+    return {"title": title, "content": cleaned_content, "url": url}
 
-        if next_link and next_link.get("href"):
-            next_url = urljoin(current_url, next_link["href"])
-            if next_url == current_url or get_domain(next_url) != get_domain(
-                current_url
-            ):
-                break
-            current_url = next_url
-            time.sleep(0.5)
-        else:
-            break
 
-    final_content = "\n".join(full_content)
-    cleaned_content = clean_content(final_content)
+MAX_TOC_PAGES = 500
 
-    return {"title": title, "content": cleaned_content, "url": url}
 
+def _url_joiner(page_url):
+    """返回把 href 转成绝对地址的函数；站内绝对路径（最常见的写法）直接拼接，免去 urljoin。"""
+    parsed = urlparse(page_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
 
-def parse_toc(toc_url, book_source):
-    html = fetch_html(toc_url)
-    if not html:
+    def join(href):
+        if href.startswith("/") and not href.startswith("//") and "/." not in href:
+            return origin + href
+        return urljoin(page_url, href)
+
+    return join
+
+
+def iter_toc_nodes(doc, page_url, rules):
+    """
+    从已解析的目录页中逐个产出章节 {"title", "url"}。
+    chapterName / chapterUrl 为选择器时每个节点只求值一次：匹配不到则跳过该节点，
+    匹配到时仍从章节节点本身取文字或属性。
+    """
+    name_sel = rules.chapter_name
+    url_sel = rules.chapter_url
+    join = _url_joiner(page_url)
+    for node in doc.select(rules.chapter_list_selector):
+        if rules.chapter_name_selector is not None and node.select_one(rules.chapter_name_selector) is None:
+            continue
+        if rules.chapter_url_selector is not None and node.select_one(rules.chapter_url_selector) is None:
+            continue
+
+        title = node.text(strip=True) if name_sel == "text" else node.get(name_sel)
+        href = node.get(url_sel)
+        if href:
+            yield {"title": title, "url": join(href.strip())}
+
+
+def toc_page_urls(doc, page_url, rules):
+    """按 nextTocUrl 规则找出目录的其他分页地址（保持页面顺序、去重、不含当前页）。"""
+    if rules.next_toc_selector is None:
         return []
+    try:
+        nodes = doc.select(rules.next_toc_selector)
+    except Exception as e:
+        logger.warning(f"⚠️ 无法使用目录分页规则 {rules.next_toc_css}: {e}")
+        return []
+    urls = []
+    for node in nodes:
+        href = (node.get(rules.next_toc_attr) or "").strip()
+        if not href or href.startswith(("javascript:", "#")):
+            continue
+        url = urljoin(page_url, href)
+        if url != page_url and url not in urls:
+            urls.append(url)
+    return urls
 
-    rule = book_source.get("ruleToc", {})
-    chapter_list_sel = rule.get("chapterList")
-    name_sel = rule.get("chapterName", "text")
-    url_sel = rule.get("chapterUrl", "href")
 
-    if not chapter_list_sel:
-        logger.error(f"❌ 书源 {book_source.get('bookSourceName')} 缺少 'chapterList' 规则")
+def extract_toc_page(html, page_url, rules):
+    """
+    解析一个目录分页，返回 (章节列表, 其他分页地址)。
+    书源没有分页规则且章节列表选择器以 #id 开头时，只解析该 id 的子树。
+    """
+    paginated = rules.next_toc_selector is not None
+    doc = parse_html(html, None if paginated else rules.chapter_list_scope)
+    return list(iter_toc_nodes(doc, page_url, rules)), toc_page_urls(doc, page_url, rules)
+
+
+def extract_toc(html, toc_url, book_source):
+    """
+    按书源 ruleToc 从目录页 HTML 中提取章节列表（只处理这一页，不跟随目录分页）。
+    """
+    rules = compile_book_source(book_source)
+    if rules.chapter_list_selector is None:
+        logger.error(f"❌ 书源 {rules.name} 缺少 'chapterList' 规则")
         return []
 
-    soup = BeautifulSoup(html, 'html.parser')
-    chapter_nodes = soup.select(chapter_list_sel)
+    chapters, _ = extract_toc_page(html, toc_url, rules)
+    if not chapters:
+        logger.warning(f"⚠️ 规则 {rules.chapter_list_css} 未匹配到任何章节节点")
+    return chapters
 
-    if not chapter_nodes:
-        logger.warning(f"⚠️ 规则 {chapter_list_sel} 未匹配到任何章节节点")
 
-    chapters = []
-    for node in chapter_nodes:
-        title_node = node
-        url_node = node
+def _load_toc_page(page_url, rules, cache_ttl=TOC_TTL):
+    html = fetch_html(page_url, cache_ttl=cache_ttl)
+    if not html:
+        return None
+    return extract_toc_page(html, page_url, rules)
 
-        if name_sel != "text" and not node.select_one(name_sel):
-            title_node = node.select_one(name_sel)
-        if url_sel != "href" and not node.select_one(url_sel):
-            url_node = node.select_one(url_sel)
 
-        if not title_node or not url_node:
-            continue
+class TocPages:
+    """
+    目录分页的去重与跟随状态，同步与异步抓取共用：
+    add() 接收一页的解析结果，返回该页中前面各页未出现过的章节；next_batch() 返回下一批待抓取的分页。
+    """
 
-        title = (
-            title_node.get_text(strip=True)
-            if name_sel == "text"
-            else title_node.get(name_sel)
-        )
-        href = url_node.get("href") if url_sel == "href" else url_node.get(url_sel)
+    def __init__(self, toc_url):
+        self.seen_pages = {toc_url}
+        self.seen_chapters = set()
+        self.pending = []
+        self.loaded = 1
 
-        if href:
-            chapters.append({"title": title, "url": urljoin(toc_url, href)})
+    def add(self, chapters, page_urls):
+        fresh = [ch for ch in chapters if ch["url"] not in self.seen_chapters]
+        self.seen_chapters.update(ch["url"] for ch in fresh)
+        for url in page_urls:
+            if url not in self.seen_pages and len(self.seen_pages) < MAX_TOC_PAGES:
+                self.seen_pages.add(url)
+                self.pending.append(url)
+        return fresh
 
-    return chapters
+    def next_batch(self):
+        batch, self.pending = self.pending, []
+        return batch
+
+
+def iter_toc_pages(toc_url, book_source, html=None, cache_ttl=TOC_TTL):
+    """
+    逐页产出目录章节列表（每页一个 list），可以在整份目录解析完之前开始抓取。
+    书源带 nextTocUrl 时，第一页列出的其余分页并发抓取，按页序产出；
+    后面的分页又指向新的分页时继续跟随。某一分页获取失败时停止，只产出它之前的章节，
+    保证章节序号不会错位。cache_ttl 作用于每个目录分页（追更模式传 0，每页都向服务器确认）。
+    """
+    rules = compile_book_source(book_source)
+    if rules.chapter_list_selector is None:
+        logger.error(f"❌ 书源 {rules.name} 缺少 'chapterList' 规则")
+        return
+    if html is None:
+        html = fetch_html(toc_url, cache_ttl=cache_ttl)
+        if not html:
+            return
+
+    pages = TocPages(toc_url)
+    chapters, page_urls = extract_toc_page(html, toc_url, rules)
+    if not chapters:
+        logger.warning(f"⚠️ 规则 {rules.chapter_list_css} 未匹配到任何章节节点")
+    yield pages.add(chapters, page_urls)
+
+    batch = pages.next_batch()
+    while batch:
+        logger.info(f"📑 并发抓取 {len(batch)} 个目录分页")
+        for page_url, page in zip(batch, _page_executor.map(lambda u: _load_toc_page(u, rules, cache_ttl), batch)):
+            if page is None:
+                logger.error(f"❌ 目录分页获取失败：{page_url}，目录只解析到此前的 {pages.loaded} 页")
+                return
+            pages.loaded += 1
+            yield pages.add(*page)
+        batch = pages.next_batch()
+
+
+def iter_toc(toc_url, book_source, html=None, cache_ttl=TOC_TTL):
+    """逐章产出目录（见 iter_toc_pages）。"""
+    for chapters in iter_toc_pages(toc_url, book_source, html, cache_ttl):
+        yield from chapters
+
+
+def parse_toc(toc_url, book_source, html=None, cache_ttl=TOC_TTL):
+    return list(iter_toc(toc_url, book_source, html, cache_ttl))
 
 
 def verify_content_rule(html: str, book_source: dict) -> bool:
     """
     使用提供的 HTML 和书源规则，验证 ruleContent 是否能匹配到内容。
     """
-    rule_content = book_source.get("ruleContent", {}).get("content", "")
-    if not rule_content:
+    if not book_source.get("ruleContent", {}).get("content", ""):
         logger.warning("🧪 AI 验证：ruleContent 为空")
         return False
 
-    selector, ftype, filters = parse_booksource_selector(rule_content)
-    if not selector:
+    rules = compile_book_source(book_source)
+    if rules.content_selector is None:
         logger.warning("🧪 AI 验证：无法解析 ruleContent 的选择器")
         return False
 
-    soup = BeautifulSoup(html, "html.parser")
-    content_el = soup.select_one(selector)
+    content_el = parse_html(html).select_one(rules.content_selector)
 
-    if content_el and content_el.get_text(strip=True):
+    if content_el and content_el.text(strip=True):
         return True
 
-    logger.warning(f"🧪 AI 验证：选择器 {selector} 未匹配到内容")
+    logger.warning(f"🧪 AI 验证：选择器 {rules.content_css} 未匹配到内容")
     return False
 
 def sanitize_filename(filename: str) -> str:
@@ -189,4 +549,31 @@ def sanitize_filename(filename: str) -> str:
     if not sanitized:
         return "Untitled"
 
-    return sanitized
\ No newline at end of file
+    return sanitized
+
+
+def extract_novel_title(toc_html, domain):
+    """
+    从目录页 <title> 中提取书名（去掉站名、“目录”等后缀），失败时使用域名。
+    """
+    try:
+        if toc_html:
+            title_text = parse_html(toc_html).title() or ""  # 获取 title，或空字符串
+
+            title_parts = re.split(r'[_,|\-，]', title_text)
+            novel_title = title_parts[0].strip()
+
+            novel_title = novel_title.replace("目录", "").replace("最新章节列表", "").strip()
+
+            if not novel_title:
+                novel_title = domain
+        else:
+            novel_title = domain
+    except Exception as e:
+        logger.warning(f"⚠️ 提取小说标题失败: {e}，将使用域名作为标题。")
+        novel_title = domain
+
+    novel_title = sanitize_filename(novel_title)
+    if not novel_title:
+        novel_title = sanitize_filename(domain)
+    return novel_title